@@ -0,0 +1,63 @@
+# app/accounts.py
+"""
+Customer của user đăng nhập, resolve 1 lần / request:
+- CustomerBackend: nạp user từ session kèm select_related("customer") -> 1 query thay vì 2
+- CustomerMiddleware: request.customer (lazy, như request.user); tự tạo Customer nếu user chưa có
+  (tài khoản tạo từ admin / createsuperuser — đăng ký qua SignupForm luôn tạo sẵn)
+
+request.customer chỉ dùng sau khi đã kiểm tra đăng nhập (@login_required / is_authenticated):
+với khách chưa đăng nhập nó bọc None.
+"""
+from django.contrib.auth import BACKEND_SESSION_KEY, get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.utils.functional import SimpleLazyObject
+
+from .models import Customer
+
+BACKEND = "app.accounts.CustomerBackend"
+# session đăng nhập trước khi đổi backend vẫn ghi đường dẫn backend mặc định
+LEGACY_BACKEND = "django.contrib.auth.backends.ModelBackend"
+
+
+class CustomerBackend(ModelBackend):
+    def get_user(self, user_id):
+        UserModel = get_user_model()
+        try:
+            user = UserModel._default_manager.select_related("customer").get(pk=user_id)
+        except UserModel.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
+
+
+def get_or_create_customer(user):
+    """Customer liên kết với user, chưa có thì tạo. Không query nếu user đã nạp kèm customer."""
+    try:
+        return user.customer
+    except Customer.DoesNotExist:
+        customer, _ = Customer.objects.get_or_create(
+            user=user,
+            defaults={
+                "name": user.username,
+                "email": user.email,
+            },
+        )
+        return customer
+
+
+def get_customer(request):
+    if not hasattr(request, "_cached_customer"):
+        user = request.user
+        request._cached_customer = get_or_create_customer(user) if user.is_authenticated else None
+    return request._cached_customer
+
+
+class CustomerMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        # phải chạy trước khi request.user được nạp (AuthenticationMiddleware chỉ gắn lazy object)
+        if request.session.get(BACKEND_SESSION_KEY) == LEGACY_BACKEND:
+            request.session[BACKEND_SESSION_KEY] = BACKEND
+        request.customer = SimpleLazyObject(lambda: get_customer(request))
+        return self.get_response(request)
@@ -1,14 +1,28 @@
+from datetime import timedelta
+
 from django import forms
+from django.conf import settings
 from django.contrib import admin
-from django.utils.html import format_html
+from django.contrib import messages
+from django.core.exceptions import PermissionDenied
+from django.http import StreamingHttpResponse
+from django.db import transaction
+from django.db.models import F, Max, Prefetch, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+from django.utils import timezone
+from django.utils.html import format_html, format_html_join
+from django.utils.safestring import mark_safe
 from django.urls import path, reverse
-from django.shortcuts import render
-from django.db.models import Max, Count, Q, OuterRef, Subquery
+from django.shortcuts import render, redirect
 from .models import Contact
+from . import product_io
+from .pagination import EstimatedCountPaginator
+from .services import create_direct_message, is_valid_image
 
 from .models import (
     Customer, Product, ProductImage, ProductVideo, Order, OrderItem,
-    ShippingAddress, Wishlist, Comment, DirectChatMessage, Video
+    ShippingAddress, Wishlist, Comment, ChatMessage, DirectChatMessage, Conversation, Video, SalesDaily,
+    OrdersDaily,
 )
 
 # ====================
@@ -21,6 +35,23 @@ def format_vnd(value):
         return "0 VNĐ"
 
 
+def format_duration(seconds):
+    if seconds is None:
+        return "—"
+    m, s = divmod(int(round(seconds)), 60)
+    return f"{m // 60}:{m % 60:02d}:{s:02d}" if m >= 60 else f"{m}:{s:02d}"
+
+
+def video_poster_html(poster_url, video_url, height):
+    """Ảnh poster tĩnh (bấm để mở video) — không nhúng <video> để trang list không tải video."""
+    if poster_url:
+        return format_html(
+            '<a href="{}" target="_blank"><img src="{}" loading="lazy" style="height:{}px;border-radius:6px;" /></a>',
+            video_url, poster_url, height,
+        )
+    return format_html('<a href="{}" target="_blank">▶ Xem video</a>', video_url)
+
+
 # ====================
 # Product form
 # ====================
@@ -73,7 +104,7 @@ class ProductImageInline(admin.TabularInline):
     @admin.display(description="Xem trước")
     def preview(self, obj):
         if obj.image:
-            return format_html('<img src="{}" style="height:80px;border-radius:6px;" />', obj.image.url)
+            return format_html('<img src="{}" style="height:80px;border-radius:6px;" />', obj.image_url)
         return "—"
 
 
@@ -90,12 +121,10 @@ class ProductVideoInline(admin.TabularInline):
     def preview(self, obj):
         if obj.video:
             return format_html(
-                """
-                <video width="160" height="90" controls>
-                    <source src="{}" type="video/mp4">
-                </video>
-                """,
-                obj.video.url,
+                "{}<br><small>{}{}</small>",
+                video_poster_html(obj.poster_url, obj.video_url, 80),
+                format_duration(obj.duration),
+                f" · {obj.width}×{obj.height}" if obj.width else "",
             )
         return "—"
 
@@ -121,6 +150,9 @@ class ProductAdmin(admin.ModelAdmin):
     search_fields = ("name", "location")
     inlines = [ProductImageInline, ProductVideoInline]
     list_per_page = 20
+    # bảng lớn: không COUNT(*) toàn bảng mỗi lần mở danh sách
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
     fieldsets = (
         ("Thông tin cơ bản", {
@@ -141,6 +173,67 @@ class ProductAdmin(admin.ModelAdmin):
         }),
     )
 
+    change_list_template = "admin/app/product/change_list.html"
+
+    def get_urls(self):
+        custom_urls = [
+            path("import/", self.admin_site.admin_view(self.import_view), name="app_product_import"),
+            path("export/", self.admin_site.admin_view(self.export_view), name="app_product_export"),
+        ]
+        return custom_urls + super().get_urls()
+
+    def import_view(self, request):
+        """
+        POST: lưu file vào staging rồi gửi Celery task import (request không chờ ghi DB),
+        chuyển sang ?job=... để xem kết quả khi task chạy xong.
+        """
+        if not self.has_add_permission(request):
+            raise PermissionDenied
+        url = reverse("admin:app_product_import")
+        if request.method == "POST" and request.FILES.get("file"):
+            from .tasks import import_products_file, run_task
+
+            upload = request.FILES["file"]
+            fmt = request.POST.get("format") or product_io.detect_format(upload.name)
+            job = product_io.stage_import(upload)
+            transaction.on_commit(lambda: run_task(import_products_file, job, fmt, background=True))
+            messages.info(request, f"Đã nhận file {upload.name}, đang import ở nền.")
+            return redirect(f"{url}?job={job}")
+
+        job = request.GET.get("job", "")
+        result = None
+        if product_io.valid_job(job):
+            result = product_io.load_job_result(job)
+            if result and result.get("ok"):
+                if result["created"]:
+                    messages.success(request, f"Đã import {result['created']} sản phẩm.")
+                if result["failed"]:
+                    messages.warning(request, f"{result['failed']} dòng lỗi đã bị bỏ qua.")
+        else:
+            job = ""
+        return render(request, "admin/product_import.html", {
+            **self.admin_site.each_context(request),
+            "title": "Import sản phẩm",
+            "opts": self.model._meta,
+            "job": job,
+            "job_filename": product_io.job_filename(job) if job else "",
+            "result": result,
+            "fields": product_io.PRODUCT_FIELDS,
+        })
+
+    def export_view(self, request):
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        fmt = request.GET.get("format", "csv")
+        if fmt not in product_io.FORMATS:
+            fmt = "csv"
+        response = StreamingHttpResponse(
+            product_io.export_rows(Product.objects.all(), fmt),
+            content_type=product_io.FORMATS[fmt],
+        )
+        response["Content-Disposition"] = f'attachment; filename="products.{fmt}"'
+        return response
+
     @admin.display(description="Tên sản phẩm")
     def ten_san_pham(self, obj):
         return obj.name
@@ -179,7 +272,7 @@ class ProductAdmin(admin.ModelAdmin):
     @admin.display(description="Ảnh chính")
     def anh_chinh(self, obj):
         if obj.image:
-            return format_html('<img src="{}" style="height:60px;border-radius:6px;" />', obj.image.url)
+            return format_html('<img src="{}" style="height:60px;border-radius:6px;" />', obj.image_url)
         return "—"
 
 
@@ -202,7 +295,7 @@ class OrderItemInline(admin.TabularInline):
     @admin.display(description="Ảnh")
     def preview(self, obj):
         if obj.product and obj.product.image:
-            return format_html('<img src="{}" style="height:50px;border-radius:4px;" />', obj.product.image.url)
+            return format_html('<img src="{}" style="height:50px;border-radius:4px;" />', obj.product.image_url)
         return "—"
 
 
@@ -216,12 +309,18 @@ class OrderAdmin(admin.ModelAdmin):
     search_fields = ("transaction_id",)
     inlines = [OrderItemInline]
     list_per_page = 20
+    list_select_related = ("customer",)
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        # tổng tiền tính trong SQL thay vì load chi tiết + sản phẩm cho từng dòng
+        return super().get_queryset(request).with_totals()
 
     @admin.display(description="Hoàn thành")
     def hoan_thanh(self, obj):
         return "✔️" if obj.complete else "❌"
 
-    @admin.display(description="Tổng tiền")
+    @admin.display(description="Tổng tiền", ordering="total_amount")
     def tong_tien(self, obj):
         return format_vnd(obj.tong_tien)
 
@@ -235,6 +334,7 @@ class OrderItemAdmin(admin.ModelAdmin):
     list_filter = ("date_added",)
     search_fields = ("product__name",)
     list_per_page = 20
+    list_select_related = ("product", "order")
 
     @admin.display(description="Thành tiền")
     def thanh_tien(self, obj):
@@ -258,6 +358,19 @@ class ShippingAddressAdmin(admin.ModelAdmin):
     )
     search_fields = ("address", "city", "state", "country", "mobile")
     list_filter = ("city", "state", "country", "created_at")
+    list_select_related = ("customer",)
+
+    def get_queryset(self, request):
+        # đơn hàng -> chi tiết -> sản phẩm lấy sẵn theo lô: số query không tăng theo số dòng
+        items = OrderItem.objects.select_related("product")
+        orders = Order.objects.prefetch_related(Prefetch("orderitem_set", queryset=items))
+        return super().get_queryset(request).prefetch_related(Prefetch("orders", queryset=orders))
+
+    @staticmethod
+    def latest_order(obj):
+        # dùng cache prefetch (orders đã sắp xếp -date_order), tương đương obj.orders.first()
+        orders = obj.orders.all()
+        return orders[0] if orders else None
 
     @admin.display(description="Địa chỉ đầy đủ")
     def dia_chi_day_du(self, obj):
@@ -265,18 +378,22 @@ class ShippingAddressAdmin(admin.ModelAdmin):
 
     @admin.display(description="Sản phẩm đã đặt")
     def san_pham_da_dat(self, obj):
-        order = obj.orders.first()
+        order = self.latest_order(obj)
         if not order:
             return "—"
         items = order.orderitem_set.all()
-        return format_html("<br>".join([
-            f"{item.product.name} x {item.quantity} → <b>{format_vnd(item.thanh_tien)}</b>"
-            for item in items
-        ])) if items else "—"
+        return format_html_join(
+            mark_safe("<br>"),
+            "{} x {} → <b>{}</b>",
+            (
+                (item.product.name if item.product else "—", item.quantity, format_vnd(item.thanh_tien))
+                for item in items
+            ),
+        ) if items else "—"
 
     @admin.display(description="Tổng tiền đơn hàng")
     def tong_tien_don_hang(self, obj):
-        order = obj.orders.first()
+        order = self.latest_order(obj)
         if not order:
             return "0 VNĐ"
         return format_vnd(order.tong_tien)
@@ -302,6 +419,9 @@ class CommentAdmin(admin.ModelAdmin):
     search_fields = ("product__name", "user__name", "content")
     list_filter = ("created_at",)
     list_per_page = 30
+    list_select_related = ("product", "user")
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
     @admin.display(description="Nội dung")
     def short_content(self, obj):
@@ -309,46 +429,72 @@ class CommentAdmin(admin.ModelAdmin):
 
 
 # ====================
-# DirectChatMessage Admin
+# Chat AI Admin
 # ====================
-@admin.register(DirectChatMessage)
-class DirectChatMessageAdmin(admin.ModelAdmin):
-    list_display = ("user_link", "last_message", "unread_count", "total_messages", "last_time")
+@admin.register(ChatMessage)
+class ChatMessageAdmin(admin.ModelAdmin):
+    list_display = ("id", "user", "short_message", "short_response", "created_at")
+    search_fields = ("user__username", "message")
+    list_filter = ("created_at",)
+    list_select_related = ("user",)
+    list_per_page = 30
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    @admin.display(description="Tin nhắn")
+    def short_message(self, obj):
+        return obj.message[:60] + ("..." if len(obj.message) > 60 else "")
+
+    @admin.display(description="Phản hồi AI")
+    def short_response(self, obj):
+        return obj.response[:60] + ("..." if len(obj.response) > 60 else "") if obj.response else "—"
+
+
+# ====================
+# Conversation Admin (hộp thư chat)
+# ====================
+@admin.register(Conversation)
+class ConversationAdmin(admin.ModelAdmin):
+    list_display = ("user_link", "last_message_display", "unread_count", "total_messages", "last_time_display")
     search_fields = ("user__username",)
+    list_select_related = ("user",)
+    ordering = ("-last_time",)
+    list_per_page = 30
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        # dòng hội thoại được tạo tự động khi có tin nhắn
+        return False
 
     @admin.display(description="Người dùng")
     def user_link(self, obj):
-        url = reverse("admin:directchatmessage_detail", args=[obj.user.id])
+        url = reverse("admin:directchatmessage_detail", args=[obj.user_id])
         return format_html('<a href="{}">💬 {}</a>', url, obj.user.username)
 
     @admin.display(description="Tin nhắn gần nhất")
-    def last_message(self, obj):
+    def last_message_display(self, obj):
         return obj.last_message or "—"
 
-    @admin.display(description="Chưa đọc")
-    def unread_count(self, obj):
-        return obj.unread_count
+    @admin.display(description="Thời gian cuối", ordering="last_time")
+    def last_time_display(self, obj):
+        return obj.last_time.strftime("%H:%M %d/%m/%Y") if obj.last_time else "—"
 
-    @admin.display(description="Tổng tin nhắn")
-    def total_messages(self, obj):
-        return obj.total_messages
 
-    @admin.display(description="Thời gian cuối")
-    def last_time(self, obj):
-        return obj.last_time.strftime("%H:%M %d/%m/%Y") if obj.last_time else "—"
+# ====================
+# DirectChatMessage Admin
+# ====================
+@admin.register(DirectChatMessage)
+class DirectChatMessageAdmin(admin.ModelAdmin):
+    list_display = ("user", "sender", "message", "is_read", "created_at")
+    search_fields = ("user__username",)
 
-    def get_queryset(self, request):
-        qs = super().get_queryset(request)
-        last_message_subquery = DirectChatMessage.objects.filter(
-            user=OuterRef("user")
-        ).order_by("-created_at").values("message")[:1]
-
-        return qs.annotate(
-            last_time=Max("created_at"),
-            total_messages=Count("id"),
-            unread_count=Count("id", filter=Q(is_read=False)),
-            last_message=Subquery(last_message_subquery),
-        )
+    def get_model_perms(self, request):
+        # ẩn khỏi trang index, hộp thư dùng ConversationAdmin
+        return {}
+
+    def changelist_view(self, request, extra_context=None):
+        return redirect("admin:app_conversation_changelist")
 
     def get_urls(self):
         urls = super().get_urls()
@@ -369,30 +515,150 @@ class DirectChatMessageAdmin(admin.ModelAdmin):
         if request.method == "POST":
             msg = request.POST.get("message", "").strip()
             img = request.FILES.get("image")
+            if img and not is_valid_image(img):
+                img = None
             if msg or img:
-                DirectChatMessage.objects.create(
-                    user=user,
-                    sender="admin",
-                    message=msg or "",
-                    image=img if img else None
-                )
-
-        messages = DirectChatMessage.objects.filter(user=user).order_by("created_at")
+                create_direct_message(user, "admin", msg, img)
+            return redirect("admin:directchatmessage_detail", user_id=user.id)
+
+        Conversation.mark_read(user)
+        # chỉ render N tin nhắn mới nhất, tin cũ hơn tải qua API cursor (?before=<id>)
+        page_size = getattr(settings, "CHAT_PAGE_SIZE", 50)
+        latest = list(
+            DirectChatMessage.objects.filter(user=user).order_by("-id")[:page_size + 1]
+        )
+        has_older = len(latest) > page_size
+        messages = list(reversed(latest[:page_size]))
         return render(request, "admin/direct_chat_admin.html", {
             "messages": messages,
             "user_chat": user,
+            "has_older": has_older,
+            "oldest_id": messages[0].id if messages else None,
+            "page_size": page_size,
         })
 
 
+# ====================
+# Dashboard doanh thu (đọc bảng tổng hợp SalesDaily)
+# ====================
+@admin.register(SalesDaily)
+class SalesDailyAdmin(admin.ModelAdmin):
+    GROUPS = {
+        "day": ("Ngày", None),
+        "week": ("Tuần", TruncWeek),
+        "month": ("Tháng", TruncMonth),
+    }
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def has_rebuild_permission(self, request):
+        # tính lại toàn bộ lịch sử là việc nặng: chỉ superuser / người có quyền sửa thống kê
+        return request.user.is_superuser or request.user.has_perm("app.change_salesdaily")
+
+    def changelist_view(self, request, extra_context=None):
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        if request.method == "POST" and "rebuild" in request.POST:
+            from .tasks import rollup_sales_daily, run_task
+
+            if not self.has_rebuild_permission(request):
+                raise PermissionDenied
+            # broker lỗi -> chạy ở thread riêng, không giữ request trong lúc quét toàn bộ đơn hàng
+            run_task(rollup_sales_daily, None, True, background=True)
+            messages.success(request, "Đã gửi yêu cầu tính lại toàn bộ thống kê doanh thu.")
+            return redirect("admin:app_salesdaily_changelist")
+
+        group = request.GET.get("group", "week")
+        if group not in self.GROUPS:
+            group = "week"
+        try:
+            days = max(1, min(int(request.GET.get("days", 84)), 3660))
+        except ValueError:
+            days = 84
+        since = timezone.now().date() - timedelta(days=days - 1)
+
+        group_label, trunc = self.GROUPS[group]
+        qs = SalesDaily.objects.filter(date__gte=since).order_by()
+        qs = qs.annotate(period=trunc("date")) if trunc else qs.annotate(period=F("date"))
+        # số đơn lấy từ OrdersDaily (mỗi đơn 1 lần / ngày), cộng các nhóm của SalesDaily sẽ đếm trùng
+        day_orders = OrdersDaily.objects.filter(date__gte=since).order_by()
+        day_orders = day_orders.annotate(period=trunc("date")) if trunc else day_orders.annotate(period=F("date"))
+        orders_by_period = dict(day_orders.values("period").annotate(n=Sum("orders")).values_list("period", "n"))
+
+        series = list(
+            qs.values("period")
+            .annotate(revenue=Sum("revenue"), units=Sum("units"))
+            .order_by("period")
+        )
+        periods = [row["period"] for row in series]
+        peak = max((row["revenue"] for row in series), default=0) or 1
+        for row in series:
+            row["pct"] = int(row["revenue"] * 100 / peak)
+            row["orders"] = orders_by_period.get(row["period"], 0)
+
+        # bảng quận × kỳ
+        cells = {}
+        district_totals = {}
+        for row in qs.values("district", "period").annotate(revenue=Sum("revenue")):
+            cells[(row["district"], row["period"])] = row["revenue"]
+            district_totals[row["district"]] = district_totals.get(row["district"], 0) + row["revenue"]
+        districts = [
+            {
+                "name": d or "—",
+                "values": [cells.get((d, p), 0) for p in periods],
+                "total": total,
+            }
+            for d, total in sorted(district_totals.items(), key=lambda kv: -kv[1])
+        ]
+
+        category_names = dict(Product.CATEGORY_CHOICES)
+        categories = [
+            {**row, "name": category_names.get(row["category"], row["category"] or "—")}
+            for row in qs.values("category")
+            .annotate(revenue=Sum("revenue"), order_lines=Sum("order_lines"), units=Sum("units"))
+            .order_by("-revenue")
+        ]
+
+        context = {
+            **self.admin_site.each_context(request),
+            "title": "Thống kê doanh thu",
+            "opts": self.model._meta,
+            "group": group,
+            "group_label": group_label,
+            "groups": [(k, v[0]) for k, v in self.GROUPS.items()],
+            "days": days,
+            "since": since,
+            "series": series,
+            "periods": periods,
+            "districts": districts,
+            "categories": categories,
+            "totals": {
+                **qs.aggregate(revenue=Sum("revenue"), units=Sum("units")),
+                "orders": sum(orders_by_period.values()),
+            },
+            "last_updated": SalesDaily.objects.aggregate(t=Max("updated_at"))["t"],
+            "can_rebuild": self.has_rebuild_permission(request),
+            **(extra_context or {}),
+        }
+        return render(request, "admin/sales_dashboard.html", context)
+
+
 # ====================
 # Video Admin
 # ====================
 @admin.register(Video)
 class VideoAdmin(admin.ModelAdmin):
-    list_display = ("id", "title", "short_description", "thumbnail_preview", "video_preview", "created_at")
+    list_display = ("id", "title", "short_description", "poster_preview", "thoi_luong", "created_at")
     search_fields = ("title", "description")
     list_filter = ("created_at",)
-    readonly_fields = ("thumbnail_preview", "video_preview", "created_at")
+    readonly_fields = ("thumbnail_preview", "video_preview", "thoi_luong", "kich_thuoc", "created_at")
     list_per_page = 20
     ordering = ["-created_at"]
 
@@ -401,7 +667,7 @@ class VideoAdmin(admin.ModelAdmin):
             "fields": ("title", "description", "created_at")
         }),
         ("Nguồn Video", {
-            "fields": ("file", "url", "video_preview")
+            "fields": ("file", "url", "video_preview", "thoi_luong", "kich_thuoc")
         }),
         ("Ảnh Thumbnail", {
             "fields": ("thumbnail", "thumbnail_preview")
@@ -418,15 +684,31 @@ class VideoAdmin(admin.ModelAdmin):
             return format_html('<img src="{}" style="height:80px;border-radius:6px;" />', obj.thumbnail.url)
         return "—"
 
+    @admin.display(description="Poster")
+    def poster_preview(self, obj):
+        if obj.file:
+            return video_poster_html(obj.poster_url, obj.file.url, 80)
+        if obj.url:
+            return format_html('<a href="{}" target="_blank">▶ Link ngoài</a>', obj.url)
+        return "—"
+
+    @admin.display(description="Thời lượng")
+    def thoi_luong(self, obj):
+        return format_duration(obj.duration)
+
+    @admin.display(description="Kích thước")
+    def kich_thuoc(self, obj):
+        return f"{obj.width}×{obj.height}" if obj.width else "—"
+
     @admin.display(description="Xem trước Video")
     def video_preview(self, obj):
         if obj.file:
             return format_html(
                 """
-                <video width="220" height="140" controls style="border-radius:6px;">
+                <video width="220" height="140" controls preload="none" poster="{}" style="border-radius:6px;">
                     <source src="{}" type="video/mp4">
                 </video>
-                """, obj.file.url
+                """, obj.poster_url or "", obj.file.url
             )
         if obj.url:
             return format_html(
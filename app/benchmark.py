@@ -0,0 +1,171 @@
+# app/benchmark.py
+"""
+Benchmark các view chính bằng django.test.Client (không cần chạy server):
+mỗi kịch bản gọi N lần, ghi lại p50 / p95 / max thời gian phản hồi và số query SQL.
+Kết quả là dict (ghi ra JSON) để so sánh giữa các lần chạy -> phát hiện regression.
+
+Dùng với dữ liệu từ `python manage.py seed_data` (xem lệnh benchmark_views).
+"""
+import json
+import math
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import DirectChatMessage, Order, OrderItem, Product
+from .seed import USERNAME_PREFIX
+
+# p95 chậm hơn baseline quá tỉ lệ này -> đánh dấu regression
+REGRESSION_RATIO = 1.2
+
+
+def percentile(values, pct):
+    """Percentile kiểu nearest-rank trên list đã sắp xếp (values không rỗng)."""
+    index = max(0, min(len(values) - 1, math.ceil(pct / 100 * len(values)) - 1))
+    return values[index]
+
+
+# ====================
+# Kịch bản
+# ====================
+def build_scenarios(user, product):
+    """
+    Danh sách (tên, hàm (i) -> (method, path, kwargs cho client)).
+    update_item xen kẽ add / remove để giỏ hàng không phình ra sau mỗi vòng.
+    """
+    def cart_body(i):
+        return json.dumps({"productId": product.pk, "action": "add" if i % 2 == 0 else "remove"})
+
+    return [
+        ("home", lambda i: ("get", reverse("home"), {})),
+        ("product_page", lambda i: ("get", reverse("product"), {"data": {"page": i % 3 + 1}})),
+        ("product_page_filtered", lambda i: ("get", reverse("product"), {"data": {
+            "district": product.district, "price_range": "2to4", "sort": "price_asc",
+        }})),
+        ("product_detail", lambda i: ("get", reverse("product_detail", args=[product.pk]), {})),
+        ("update_item", lambda i: ("post", reverse("update_item"), {
+            "data": cart_body(i), "content_type": "application/json",
+        })),
+        ("get_direct_messages", lambda i: ("get", reverse("get_direct_messages"), {})),
+    ]
+
+
+def pick_fixtures(username=None):
+    """User đăng nhập (ưu tiên user seed có giỏ hàng + tin nhắn) và sản phẩm dùng để đo."""
+    users = User.objects.filter(is_active=True, customer__isnull=False)
+    if username:
+        user = users.filter(username=username).first()
+    else:
+        seeded = users.filter(username__startswith=USERNAME_PREFIX)
+        user = (
+            seeded.filter(
+                customer__order__complete=False,
+                pk__in=DirectChatMessage.objects.values("user_id"),
+            ).order_by("pk").first()
+            or seeded.order_by("pk").first()
+            or users.order_by("pk").first()
+        )
+    # sản phẩm xem nhiều nhất: trang chi tiết thường được mở nhất
+    product = Product.objects.order_by("-views", "-id").first()
+    return user, product
+
+
+def run_benchmark(requests=30, warmup=3, username=None, only=None):
+    """Chạy toàn bộ kịch bản, trả về report (dict JSON được)."""
+    user, product = pick_fixtures(username)
+    if user is None or product is None:
+        raise ValueError("Chưa có dữ liệu: chạy `python manage.py seed_data` trước.")
+
+    # update_item sửa giỏ hàng thật của user -> lưu lại để trả về như cũ sau khi đo
+    cart_items = OrderItem.objects.filter(order__customer__user=user, order__complete=False, product=product)
+    before = {item.order_id: item.quantity for item in cart_items}
+
+    client = Client()
+    client.force_login(user)
+    results = {}
+    try:
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"]):
+            for name, make_request in build_scenarios(user, product):
+                if only and name not in only:
+                    continue
+                results[name] = _run_scenario(client, make_request, requests, warmup)
+    finally:
+        cart_items.exclude(order_id__in=before).delete()
+        for order_id, quantity in before.items():
+            OrderItem.objects.update_or_create(order_id=order_id, product=product, defaults={"quantity": quantity})
+
+    return {
+        "generated_at": timezone.now().isoformat(timespec="seconds"),
+        "database": connection.vendor,
+        "debug": settings.DEBUG,
+        "requests_per_scenario": requests,
+        "user": user.username,
+        "product_id": product.pk,
+        "data": {
+            "products": Product.objects.count(),
+            "users": User.objects.count(),
+            "orders": Order.objects.count(),
+            "direct_messages": DirectChatMessage.objects.count(),
+        },
+        "results": results,
+    }
+
+
+def _run_scenario(client, make_request, requests, warmup):
+    for i in range(warmup):
+        method, path, kwargs = make_request(i)
+        getattr(client, method)(path, **kwargs)
+
+    timings, queries, statuses = [], [], set()
+    for i in range(requests):
+        method, path, kwargs = make_request(i)
+        with CaptureQueriesContext(connection) as ctx:
+            started = time.perf_counter()
+            response = getattr(client, method)(path, **kwargs)
+            timings.append((time.perf_counter() - started) * 1000)
+        queries.append(len(ctx.captured_queries))
+        statuses.add(response.status_code)
+
+    timings.sort()
+    return {
+        "path": path,
+        "method": method.upper(),
+        "status": sorted(statuses),
+        "p50_ms": round(percentile(timings, 50), 2),
+        "p95_ms": round(percentile(timings, 95), 2),
+        "max_ms": round(timings[-1], 2),
+        "mean_ms": round(sum(timings) / len(timings), 2),
+        "queries_min": min(queries),
+        "queries_max": max(queries),
+    }
+
+
+# ====================
+# So sánh với report cũ
+# ====================
+def compare(report, baseline, ratio=REGRESSION_RATIO):
+    """
+    Trả về list (tên, dòng mô tả, có regression không) cho các kịch bản có trong cả 2 report.
+    Regression: số query tăng, hoặc p95 chậm hơn baseline quá `ratio` lần.
+    """
+    rows = []
+    for name, new in report["results"].items():
+        old = baseline.get("results", {}).get(name)
+        if not old:
+            continue
+        slower = new["p95_ms"] > old["p95_ms"] * ratio
+        more_queries = new["queries_max"] > old["queries_max"]
+        change = (new["p95_ms"] - old["p95_ms"]) / old["p95_ms"] * 100 if old["p95_ms"] else 0
+        rows.append((
+            name,
+            f"p95 {old['p95_ms']} -> {new['p95_ms']} ms ({change:+.0f}%), "
+            f"queries {old['queries_max']} -> {new['queries_max']}",
+            slower or more_queries,
+        ))
+    return rows
@@ -1,67 +1,207 @@
 # app/consumers.py
+import asyncio
 import json
+import time
 from datetime import datetime
 from asgiref.sync import sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from .metrics import websocket_connections, websocket_connections_active, websocket_messages
 from .models import DirectChatMessage
+from .presence import get_presence_store
+from .ratelimit import Throttle, TokenBucket
 
 User = get_user_model()
 
+# Giới hạn tần suất broadcast để presence/typing không làm ngập channel layer
+PRESENCE_BROADCAST_INTERVAL = getattr(settings, "PRESENCE_BROADCAST_INTERVAL", 5)  # giây / user
+TYPING_INTERVAL = getattr(settings, "TYPING_INTERVAL", 3)  # giây / kết nối
+
+# Giới hạn mỗi kết nối: (số lần liên tiếp tối đa, số token hồi mỗi giây)
+CHAT_FRAME_RATE_LIMIT = getattr(settings, "CHAT_FRAME_RATE_LIMIT", (20, 5))      # mọi frame nhận được
+CHAT_MESSAGE_RATE_LIMIT = getattr(settings, "CHAT_MESSAGE_RATE_LIMIT", (5, 0.5))  # tin nhắn ghi DB
+CHAT_MESSAGE_MAX_LENGTH = getattr(settings, "CHAT_MESSAGE_MAX_LENGTH", 2000)
+
+# Close code khi client không đủ quyền vào phòng
+CLOSE_UNAUTHORIZED = 4403
+
+ADMIN_GROUP = "admin_notifications"
+
+
+class PresenceBroadcaster:
+    """
+    Gửi sự kiện online / offline cho admin, tối đa 1 lần / `interval` giây / user.
+    Thay đổi trong lúc chờ được gộp lại: hết khoảng chờ thì gửi trạng thái cuối cùng
+    (nếu khác trạng thái đã gửi) -> admin không bị kẹt ở trạng thái cũ.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.sent = {}      # user_id -> (thời điểm gửi, online)
+        self.pending = {}   # user_id -> online, gửi khi hết khoảng chờ
+        self.tasks = set()  # giữ tham chiếu để task hẹn giờ không bị thu hồi
+
+    async def publish(self, channel_layer, user_id, online):
+        now = time.monotonic()
+        last = self.sent.get(user_id)
+        if last is None or now - last[0] >= self.interval:
+            await self._send(channel_layer, user_id, online, now)
+            return
+        if user_id not in self.pending:
+            task = asyncio.ensure_future(self._flush_later(channel_layer, user_id, last[0] + self.interval - now))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+        self.pending[user_id] = online
+
+    async def _flush_later(self, channel_layer, user_id, delay):
+        await asyncio.sleep(delay)
+        online = self.pending.pop(user_id, None)
+        if online is not None and online != self.sent[user_id][1]:
+            await self._send(channel_layer, user_id, online, time.monotonic())
+
+    async def _send(self, channel_layer, user_id, online, now):
+        self.sent[user_id] = (now, online)
+        if len(self.sent) > 10_000:
+            # dọn user đã hết khoảng chờ để dict không phình mãi
+            self.sent = {k: v for k, v in self.sent.items() if now - v[0] < self.interval or k in self.pending}
+        await channel_layer.group_send(ADMIN_GROUP, {
+            "type": "chat_message",
+            "payload": {"type": "presence", "user_id": str(user_id), "online": online},
+        })
+
+
+_presence = PresenceBroadcaster(PRESENCE_BROADCAST_INTERVAL)
+# dọn kết nối hết hạn heartbeat tối đa 1 lần / khoảng broadcast trong mỗi process
+_sweep_throttle = Throttle(PRESENCE_BROADCAST_INTERVAL)
+
+
 class DirectChatConsumer(AsyncWebsocketConsumer):
+    # loại frame điều khiển (label metric); frame khác tính là "message"
+    EVENT_TYPES = ("heartbeat", "typing", "presence_query")
+
     async def connect(self):
         # room tương ứng với user_id trong URL (mỗi user có phòng riêng)
         self.user_id = self.scope['url_route']['kwargs']['user_id']
         self.room_group_name = f"chat_{self.user_id}"
 
         # group dành cho admin global notifications
-        self.admin_group = "admin_notifications"
+        self.admin_group = ADMIN_GROUP
+
+        # danh tính lấy từ session (AuthMiddlewareStack), không tin dữ liệu client gửi lên
+        self.user = self.scope.get("user")
+        self.presence_user_id = None
+        if self.user is None or not self.user.is_authenticated:
+            await self._reject()
+            return
+        self.is_admin = self.user.is_staff
+        if not self.is_admin and str(self.user.id) != str(self.user_id):
+            # user thường chỉ được vào phòng của chính mình
+            await self._reject()
+            return
+        if self.is_admin and not await self._get_user(self.user_id):
+            await self._reject()
+            return
+        self.sender = "admin" if self.is_admin else "user"
+
+        self.presence = get_presence_store()
+        self.typing_throttle = Throttle(TYPING_INTERVAL)
+        self.frame_bucket = TokenBucket(*CHAT_FRAME_RATE_LIMIT)
+        self.message_bucket = TokenBucket(*CHAT_MESSAGE_RATE_LIMIT)
 
         await self.channel_layer.group_add(self.room_group_name, self.channel_name)
-        await self.channel_layer.group_add(self.admin_group, self.channel_name)
+        if self.is_admin:
+            await self.channel_layer.group_add(self.admin_group, self.channel_name)
         await self.accept()
+        websocket_connections.labels("accepted").inc()
+        websocket_connections_active.inc()
+
+        # user (không phải admin) vào chat -> đánh dấu online
+        if not self.is_admin:
+            self.presence_user_id = self.user.id
+            await self._touch_presence()
 
     async def disconnect(self, close_code):
+        if not hasattr(self, "sender"):
+            # bị từ chối ở connect(), chưa join group nào
+            return
+        websocket_connections_active.dec()
         await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
-        await self.channel_layer.group_discard(self.admin_group, self.channel_name)
+        if self.is_admin:
+            await self.channel_layer.group_discard(self.admin_group, self.channel_name)
+
+        if self.presence_user_id is not None:
+            await self.presence.remove(self.presence_user_id, self.channel_name)
+            # còn tab khác đang mở thì vẫn online
+            if not await self.presence.is_online(self.presence_user_id):
+                await _presence.publish(self.channel_layer, self.presence_user_id, False)
 
     async def receive(self, text_data):
         """
         Expect JSON payload, e.g.:
         {
-          "message": "hello",
-          "sender": "user" or "admin",
-          "image_url": "https://..."   # optional
+          "message": "hello"
         }
+        Người gửi ("user"/"admin") do server xác định theo tài khoản đăng nhập.
+        Ảnh chỉ gửi qua API upload (send_direct_message): frame có "image_url" bị từ chối,
+        không cho client tự ghi đường dẫn / URL tùy ý vào DirectChatMessage.image.
+        Hoặc event điều khiển (không lưu DB):
+        {"type": "heartbeat"}        # giữ trạng thái online, gửi mỗi < PRESENCE_TTL giây
+        {"type": "typing"}           # đang soạn tin (bị throttle)
+        {"type": "presence_query"}   # admin hỏi danh sách user đang online
         """
+        if not self.frame_bucket.consume():
+            websocket_messages.labels("in", "rate_limited").inc()
+            await self.send(json.dumps({"error": "rate_limited"}))
+            return
+
         try:
-            data = json.loads(text_data)
+            data = json.loads(text_data or "")
         except Exception:
+            data = None
+        if not isinstance(data, dict):
+            websocket_messages.labels("in", "invalid").inc()
             return
 
-        message = data.get("message", "") or ""
-        sender = data.get("sender", "") or ""
-        image_url = data.get("image_url")  # optional (string)
+        event_type = data.get("type")
+        websocket_messages.labels("in", event_type if event_type in self.EVENT_TYPES else "message").inc()
+        if event_type == "heartbeat":
+            if self.presence_user_id is not None:
+                await self._touch_presence()
+            await self._sweep_presence()
+            return
+        if event_type == "typing":
+            await self._handle_typing()
+            return
+        if event_type == "presence_query":
+            await self._handle_presence_query()
+            return
 
-        # Lấy user (owner của phòng)
-        user = await self._get_user(self.user_id)
-        if not user:
-            # nếu không tìm thấy user thì trả về lỗi nhẹ (không raise)
-            await self.send(json.dumps({"error": "user_not_found"}))
+        if data.get("image_url"):
+            await self.send(json.dumps({"error": "image_url_not_allowed"}))
+            return
+        message = str(data.get("message", "") or "")
+        sender = self.sender
+        if not message:
+            return
+        if len(message) > CHAT_MESSAGE_MAX_LENGTH:
+            await self.send(json.dumps({"error": "message_too_long"}))
+            return
+        if not self.message_bucket.consume():
+            await self.send(json.dumps({"error": "rate_limited"}))
             return
 
         # Lưu vào DB (async wrapper)
         created_msg = await sync_to_async(DirectChatMessage.objects.create)(
-            user=user,
+            user_id=self.user_id,
             sender=sender,
-            message=message or None,
-            image=image_url or None,
+            message=message,
             is_read=False
         )
 
         # chuẩn metadata gửi cho frontend
         timestamp = datetime.utcnow().strftime("%H:%M %d/%m/%Y")
-        snippet = (message[:140] + ("..." if len(message) > 140 else "")) if message else ""
+        snippet = message[:140] + ("..." if len(message) > 140 else "")
 
         payload = {
             "type": "new_message",        # dùng để frontend dễ phân loại
@@ -70,8 +210,8 @@ class DirectChatConsumer(AsyncWebsocketConsumer):
             "sender": sender,
             "message": message,
             "snippet": snippet,
-            "image_url": image_url,
             "timestamp": timestamp,
+            "created_at": created_msg.created_at.isoformat(),
         }
 
         # Gửi tới phòng của user (dành cho user hoặc admin đang mở phòng đó)
@@ -88,9 +228,8 @@ class DirectChatConsumer(AsyncWebsocketConsumer):
             "type": "admin_notification",
             "user_id": str(self.user_id),
             "sender": sender,
-            "snippet": snippet or ("📷 Ảnh" if image_url else ""),
+            "snippet": snippet,
             "timestamp": timestamp,
-            "image_url": image_url,
         }
         await self.channel_layer.group_send(
             self.admin_group,
@@ -106,6 +245,47 @@ class DirectChatConsumer(AsyncWebsocketConsumer):
         """
         payload = event.get("payload", {})
         await self.send(text_data=json.dumps(payload))
+        websocket_messages.labels("out", payload.get("type") or "message").inc()
+
+    async def _reject(self):
+        websocket_connections.labels("rejected").inc()
+        await self.close(code=CLOSE_UNAUTHORIZED)
+
+    async def _touch_presence(self):
+        # kết nối đã bị expire() dọn (heartbeat trễ) mà quay lại -> báo online lại
+        was_online = await self.presence.is_online(self.presence_user_id)
+        await self.presence.touch(self.presence_user_id, self.channel_name)
+        if not was_online:
+            await _presence.publish(self.channel_layer, self.presence_user_id, True)
+
+    async def _sweep_presence(self):
+        """Kết nối quá hạn heartbeat (mất mạng, worker chết không kịp disconnect) -> báo offline."""
+        if not _sweep_throttle.allow("sweep"):
+            return
+        for user_id in await self.presence.expire():
+            await _presence.publish(self.channel_layer, user_id, False)
+
+    async def _handle_typing(self):
+        if not self.typing_throttle.allow("typing"):
+            return
+        await self.channel_layer.group_send(
+            self.room_group_name,
+            {
+                "type": "chat_message",
+                "payload": {
+                    "type": "typing",
+                    "user_id": str(self.user_id),
+                    "sender": self.sender,
+                },
+            },
+        )
+
+    async def _handle_presence_query(self):
+        if not self.is_admin:
+            return
+        await self._sweep_presence()
+        online = sorted(await self.presence.online_user_ids())
+        await self.send(text_data=json.dumps({"type": "presence_list", "online": [str(i) for i in online]}))
 
     @staticmethod
     async def _get_user(user_id):
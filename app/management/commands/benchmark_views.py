@@ -0,0 +1,74 @@
+# app/management/commands/benchmark_views.py
+"""
+Đo p50 / p95 thời gian phản hồi + số query của các view chính (xem app/benchmark.py)
+và ghi report JSON để theo dõi regression giữa các lần chạy.
+
+    python manage.py seed_data --scale medium
+    python manage.py benchmark_views -n 50 -o bench/baseline.json
+    python manage.py benchmark_views -n 50 -o bench/new.json --baseline bench/baseline.json --fail-on-regression
+
+Lưu ý: update_item ghi vào giỏ hàng của user đo (được trả lại như cũ sau khi chạy),
+nên chỉ chạy trên DB dev / DB dữ liệu giả lập.
+"""
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.benchmark import REGRESSION_RATIO, build_scenarios, compare, run_benchmark
+
+
+class Command(BaseCommand):
+    help = "Benchmark các view chính bằng test client, ghi report JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument("-n", "--requests", type=int, default=30, help="Số request mỗi kịch bản")
+        parser.add_argument("--warmup", type=int, default=3)
+        parser.add_argument("--user", help="Username dùng để đăng nhập (mặc định: user seed đầu tiên)")
+        parser.add_argument(
+            "--only", action="append", default=[],
+            help="Chỉ chạy kịch bản này (lặp lại được): " + ", ".join(n for n, _ in build_scenarios(None, None)),
+        )
+        parser.add_argument("-o", "--output", help="Ghi report JSON ra file")
+        parser.add_argument("--baseline", help="Report JSON cũ để so sánh")
+        parser.add_argument("--ratio", type=float, default=REGRESSION_RATIO, help="Ngưỡng p95 chậm hơn baseline")
+        parser.add_argument("--fail-on-regression", action="store_true", help="Báo lỗi nếu có regression")
+
+    def handle(self, *args, **options):
+        try:
+            report = run_benchmark(
+                requests=max(1, options["requests"]),
+                warmup=max(0, options["warmup"]),
+                username=options["user"],
+                only=options["only"],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(f"{'Kịch bản':<24}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}{'queries':>10}  status")
+        for name, row in report["results"].items():
+            queries = str(row["queries_max"]) if row["queries_min"] == row["queries_max"] else \
+                f"{row['queries_min']}-{row['queries_max']}"
+            self.stdout.write(
+                f"{name:<24}{row['p50_ms']:>10}{row['p95_ms']:>10}{row['max_ms']:>10}{queries:>10}  {row['status']}"
+            )
+
+        if options["output"]:
+            path = Path(options["output"])
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+            self.stdout.write(self.style.SUCCESS(f"Đã ghi report: {path}"))
+
+        if options["baseline"]:
+            try:
+                baseline = json.loads(Path(options["baseline"]).read_text(encoding="utf-8"))
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Không đọc được baseline: {e}")
+            regressions = []
+            for name, line, regressed in compare(report, baseline, options["ratio"]):
+                style = self.style.ERROR if regressed else self.style.SUCCESS
+                self.stdout.write(style(f"{'❌' if regressed else '✅'} {name}: {line}"))
+                if regressed:
+                    regressions.append(name)
+            if regressions and options["fail_on_regression"]:
+                raise CommandError(f"Regression: {', '.join(regressions)}")
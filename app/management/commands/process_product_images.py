@@ -0,0 +1,30 @@
+# app/management/commands/process_product_images.py
+"""
+Xử lý bù ảnh sản phẩm chưa có kích thước / LQIP / biến thể srcset
+(ảnh upload trước khi có tính năng này). Ảnh mới đã được xử lý tự động lúc upload.
+
+    python manage.py process_product_images
+"""
+from django.core.management.base import BaseCommand
+
+from app.models import Product, ProductImage
+from app.tasks import generate_image_variants, run_task
+
+
+class Command(BaseCommand):
+    help = "Gửi task sinh kích thước + LQIP + srcset cho ảnh sản phẩm còn thiếu."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true", help="Xử lý lại cả ảnh đã có dữ liệu")
+
+    def handle(self, *args, **options):
+        total = 0
+        for model in (Product, ProductImage):
+            qs = model.objects.exclude(image="").exclude(image__isnull=True)
+            if not options["all"]:
+                qs = qs.filter(image_lqip="")
+            label = model._meta.label
+            for pk in qs.values_list("pk", flat=True).iterator():
+                run_task(generate_image_variants, label, pk)
+                total += 1
+        self.stdout.write(self.style.SUCCESS(f"Đã gửi {total} task xử lý ảnh."))
@@ -0,0 +1,59 @@
+# app/management/commands/seed_data.py
+"""
+Sinh dữ liệu giả lập để đo tải / benchmark (xem app/seed.py).
+
+    python manage.py seed_data --scale small
+    python manage.py seed_data --customers 5000 --products 20000 --seed 7
+
+Chạy nhiều lần sẽ cộng thêm dữ liệu (username seed_user_<n> tiếp nối), không xóa dữ liệu cũ.
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.models import SalesDaily
+from app.seed import SCALES, seed_data
+
+
+class Command(BaseCommand):
+    help = "Sinh khách hàng, sản phẩm, đơn hàng, wishlist, bình luận, chat giả lập."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+        parser.add_argument("--customers", type=int, help="Ghi đè số khách hàng của --scale")
+        parser.add_argument("--products", type=int, help="Ghi đè số sản phẩm của --scale")
+        parser.add_argument("--orders-per-customer", type=int, default=3)
+        parser.add_argument("--wishlists-per-customer", type=int, default=5)
+        parser.add_argument("--comments-per-product", type=int, default=3, help="Trung bình")
+        parser.add_argument("--messages-per-customer", type=int, default=8)
+        parser.add_argument("--days", type=int, default=90, help="Đơn hoàn tất rải trong N ngày gần nhất")
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--no-rollup", action="store_true", help="Không tính lại bảng SalesDaily")
+
+    def handle(self, *args, **options):
+        sizes = dict(SCALES[options["scale"]])
+        for key in ("customers", "products"):
+            if options[key] is not None:
+                sizes[key] = options[key]
+        if sizes["products"] < 1:
+            raise CommandError("Cần ít nhất 1 sản phẩm.")
+
+        started = time.perf_counter()
+        counts = seed_data(
+            orders_per_customer=options["orders_per_customer"],
+            wishlists_per_customer=options["wishlists_per_customer"],
+            comments_per_product=options["comments_per_product"],
+            messages_per_customer=options["messages_per_customer"],
+            days=options["days"],
+            seed=options["seed"],
+            batch_size=max(1, options["batch_size"]),
+            **sizes,
+        )
+        if not options["no_rollup"]:
+            SalesDaily.rebuild()
+        elapsed = time.perf_counter() - started
+
+        for name, n in counts.items():
+            self.stdout.write(f"  {name}: {n}")
+        self.stdout.write(self.style.SUCCESS(f"Đã sinh {sum(counts.values())} bản ghi trong {elapsed:.1f}s"))
@@ -0,0 +1,117 @@
+# app/management/commands/streamdump.py
+"""
+Xuất fixture JSON (đọc được bằng loaddata / streamload) theo kiểu streaming:
+đọc từng lô bằng server-side cursor (queryset.iterator), m2m lấy kèm theo lô
+(prefetch_related) thay vì 1 query / object, ghi ra file ngay sau mỗi lô.
+
+    python manage.py streamdump app auth.User -o backup.json
+    python manage.py streamdump app.Product --format jsonl -o products.jsonl
+"""
+import json
+import time
+from itertools import islice
+
+from django.apps import apps
+from django.core import serializers
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DEFAULT_DB_ALIAS, reset_queries, router
+
+
+class Command(BaseCommand):
+    help = "Xuất fixture JSON / JSONL theo lô với server-side cursor."
+
+    def add_arguments(self, parser):
+        parser.add_argument("labels", nargs="*", help="app_label hoặc app_label.Model (mặc định: tất cả)")
+        parser.add_argument("-o", "--output", help="File đích (mặc định: stdout)")
+        parser.add_argument("--format", choices=("json", "jsonl"), default="json")
+        parser.add_argument("--batch-size", type=int, default=2000)
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS)
+        parser.add_argument("-e", "--exclude", action="append", default=[], help="app_label hoặc app_label.Model")
+        parser.add_argument("--natural-foreign", action="store_true", dest="use_natural_foreign_keys")
+        parser.add_argument("--natural-primary", action="store_true", dest="use_natural_primary_keys")
+
+    def handle(self, *args, **options):
+        self.using = options["database"]
+        models = self.get_models(options["labels"], options["exclude"])
+        self.batch_size = max(1, options["batch_size"])
+        self.jsonl = options["format"] == "jsonl"
+        self.serialize_options = {
+            "use_natural_foreign_keys": options["use_natural_foreign_keys"],
+            "use_natural_primary_keys": options["use_natural_primary_keys"],
+        }
+
+        out = open(options["output"], "w", encoding="utf-8") if options["output"] else self.stdout
+        started = time.perf_counter()
+        total = 0
+        try:
+            if not self.jsonl:
+                out.write("[")
+            for model in models:
+                total = self.dump_model(model, out, total)
+            if not self.jsonl:
+                out.write("\n]\n")
+        finally:
+            if options["output"]:
+                out.close()
+
+        elapsed = time.perf_counter() - started
+        log = self.stderr if not options["output"] else self.stdout
+        log.write(f"Đã xuất {total} object trong {elapsed:.1f}s ({total / max(elapsed, 1e-9):,.0f} object/s)")
+
+    def get_models(self, labels, excludes):
+        excluded = set()
+        for label in excludes:
+            try:
+                excluded.update(
+                    [apps.get_model(label)] if "." in label else apps.get_app_config(label).get_models()
+                )
+            except LookupError as e:
+                raise CommandError(str(e))
+
+        app_list = {}
+        try:
+            if not labels:
+                for config in apps.get_app_configs():
+                    app_list[config] = None
+            for label in labels:
+                if "." in label:
+                    model = apps.get_model(label)
+                    app_list.setdefault(model._meta.app_config, []).append(model)
+                else:
+                    app_list[apps.get_app_config(label)] = None
+        except LookupError as e:
+            raise CommandError(str(e))
+
+        # sắp xếp theo phụ thuộc khóa ngoại giống dumpdata
+        models = serializers.sort_dependencies(
+            [(config, model_list) for config, model_list in app_list.items()], allow_cycles=True
+        )
+        return [
+            m for m in models
+            if m not in excluded and not m._meta.proxy and m._meta.managed
+            and router.allow_migrate_model(self.using, m)
+        ]
+
+    def dump_model(self, model, out, total):
+        m2m = [
+            f.name for f in model._meta.many_to_many
+            if f.remote_field.through._meta.auto_created
+        ]
+        qs = model._base_manager.using(self.using).order_by(model._meta.pk.name)
+        if m2m:
+            qs = qs.prefetch_related(*m2m)
+        rows = qs.iterator(chunk_size=self.batch_size)
+
+        while True:
+            chunk = list(islice(rows, self.batch_size))
+            if not chunk:
+                return total
+            data = serializers.serialize("python", chunk, **self.serialize_options)
+            lines = [json.dumps(obj, cls=DjangoJSONEncoder, ensure_ascii=False) for obj in data]
+            if self.jsonl:
+                out.write("\n".join(lines) + "\n")
+            else:
+                out.write(("," if total else "") + "\n" + ",\n".join(lines))
+            total += len(lines)
+            reset_queries()  # DEBUG=True: không giữ SQL prefetch của các lô trước
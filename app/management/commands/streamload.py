@@ -0,0 +1,236 @@
+# app/management/commands/streamload.py
+"""
+Nạp fixture JSON (định dạng của dumpdata / data.json) theo kiểu streaming:
+- Parser JSON tăng dần: đọc file theo từng khối, mỗi lần chỉ giữ 1 object trong RAM
+  (loaddata thì json.load cả file rồi mới bắt đầu ghi)
+- Ghi theo lô bằng bulk_create (upsert theo khóa chính, giống loaddata ghi đè bản ghi cũ),
+  m2m ghi thẳng vào bảng trung gian theo lô
+- Kiểm tra ràng buộc khóa ngoại 1 lần ở cuối (constraint_checks_disabled + check_constraints)
+
+    python manage.py streamload data.json --batch-size 2000
+
+Khác loaddata: không gửi signal pre_save / post_save và không gọi Model.save(). Dữ liệu dẫn xuất
+mà save() / signal vẫn duy trì được tính lại 1 lần ở cuối cho các bản ghi vừa nạp:
+- cột URL *_src của Product / ProductImage / ProductVideo
+- dòng Conversation của các user có DirectChatMessage trong fixture
+(biến thể ảnh srcset / metadata video không sinh lại: chạy lại bằng admin hoặc sync_cloudinary)
+Nhận cả file JSON array lẫn JSONL (mỗi dòng 1 object).
+"""
+import json
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core import serializers
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.core.serializers.base import DeserializationError
+from django.db import DEFAULT_DB_ALIAS, connections, models, reset_queries, transaction
+from django.utils import timezone
+
+from app.models import Conversation, DirectChatMessage, Product, ProductImage, ProductVideo, media_url
+
+READ_CHUNK_SIZE = 1 << 16
+
+# model -> (file field, cột URL) mà Model.save() tự cập nhật qua _sync_media_src
+MEDIA_SRC_FIELDS = {
+    Product: (("image", "image_src"),),
+    ProductImage: (("image", "image_src"),),
+    ProductVideo: (("video", "video_src"),),
+}
+
+
+def iter_json_objects(fp, chunk_size=READ_CHUNK_SIZE):
+    """
+    Yield từng phần tử của 1 JSON array (hoặc chuỗi object JSONL) đọc từ file text,
+    đọc thêm dữ liệu chỉ khi object hiện tại chưa trọn trong buffer.
+    """
+    decoder = json.JSONDecoder()
+    buf, pos, eof, in_array = "", 0, False, False
+
+    def more():
+        nonlocal buf, pos, eof
+        chunk = fp.read(chunk_size)
+        if not chunk:
+            eof = True
+        else:
+            buf, pos = buf[pos:] + chunk, 0
+
+    while True:
+        # bỏ khoảng trắng / dấu phẩy giữa các phần tử
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n,":
+                pos += 1
+            if pos < len(buf) or eof:
+                break
+            more()
+        if pos >= len(buf):
+            return
+
+        ch = buf[pos]
+        if ch == "[" and not in_array:
+            in_array, pos = True, pos + 1
+            continue
+        if ch == "]" and in_array:
+            return
+
+        try:
+            obj, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError as e:
+            if eof:
+                raise DeserializationError(f"invalid JSON near offset {e.pos}: {e.msg}") from e
+            more()  # object chưa đọc hết -> đọc thêm rồi parse lại
+            continue
+        yield obj
+        pos = end
+        if pos > chunk_size:
+            buf, pos = buf[pos:], 0
+
+
+class Command(BaseCommand):
+    help = "Nạp fixture JSON lớn theo kiểu streaming (bulk upsert theo lô)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("fixture", help="Đường dẫn file .json / .jsonl")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS)
+        parser.add_argument(
+            "--ignorenonexistent", "-i", action="store_true",
+            help="Bỏ qua field / model không còn tồn tại",
+        )
+
+    def handle(self, *args, **options):
+        self.using = options["database"]
+        self.batch_size = max(1, options["batch_size"])
+        self.connection = connections[self.using]
+        self.counts = defaultdict(int)
+        self.tables = set()
+        self.deferred = []
+        self.media_pks = defaultdict(list)  # model -> pk vừa nạp, cần tính lại *_src
+        self.chat_users = set()             # user có DirectChatMessage trong fixture
+        started = time.perf_counter()
+
+        try:
+            with open(options["fixture"], encoding="utf-8") as fp:
+                objects = serializers.deserialize(
+                    "python",
+                    iter_json_objects(fp),
+                    using=self.using,
+                    ignorenonexistent=options["ignorenonexistent"],
+                    handle_forward_references=True,
+                )
+                with transaction.atomic(using=self.using):
+                    with self.connection.constraint_checks_disabled():
+                        self.load(objects)
+                        for obj in self.deferred:
+                            obj.save_deferred_fields(using=self.using)
+                    self.connection.check_constraints(table_names=sorted(self.tables))
+                    self.reset_sequences(list(self.counts))
+                    self.rebuild_derived()
+        except (OSError, DeserializationError) as e:
+            raise CommandError(f"Không nạp được fixture: {e}") from e
+
+        elapsed = time.perf_counter() - started
+        total = sum(self.counts.values())
+        for model, n in self.counts.items():
+            self.stdout.write(f"  {model._meta.label}: {n}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Đã nạp {total} object trong {elapsed:.1f}s ({total / max(elapsed, 1e-9):,.0f} object/s)"
+        ))
+
+    def load(self, objects):
+        batch, model = [], None
+        for obj in objects:
+            if obj.deferred_fields:
+                self.deferred.append(obj)
+            obj_model = type(obj.object)
+            if obj_model is not model or len(batch) >= self.batch_size:
+                self.flush(model, batch)
+                batch, model = [], obj_model
+            batch.append(obj)
+        self.flush(model, batch)
+
+    def flush(self, model, batch):
+        if not batch:
+            return
+        meta = model._meta
+        instances = [obj.object for obj in batch]
+        if not settings.USE_TZ:
+            self.make_naive(meta, instances)
+        update_fields = [f.name for f in meta.local_concrete_fields if not f.primary_key]
+        features = self.connection.features
+        kwargs = {}
+        if update_fields and features.supports_update_conflicts_with_target:
+            kwargs = {"update_conflicts": True, "unique_fields": [meta.pk.name], "update_fields": update_fields}
+        elif features.supports_ignore_conflicts:
+            kwargs = {"ignore_conflicts": not update_fields}
+        model._base_manager.using(self.using).bulk_create(instances, batch_size=self.batch_size, **kwargs)
+        self.counts[model] += len(instances)
+        self.tables.add(meta.db_table)
+        if model in MEDIA_SRC_FIELDS:
+            self.media_pks[model].extend(obj.pk for obj in instances)
+        elif model is DirectChatMessage:
+            self.chat_users.update(obj.user_id for obj in instances)
+        self.save_m2m(model, batch)
+        # DEBUG=True: connection.queries giữ lại SQL của từng lô bulk_create -> xóa để RAM không tăng dần
+        reset_queries()
+
+    def make_naive(self, meta, instances):
+        """Fixture dump từ DB có USE_TZ (vd. "2025-11-15T14:21:51.728Z") -> đổi về giờ local."""
+        fields = [f.attname for f in meta.concrete_fields if isinstance(f, models.DateTimeField)]
+        for obj in instances:
+            for attname in fields:
+                value = getattr(obj, attname)
+                if value is not None and timezone.is_aware(value):
+                    setattr(obj, attname, timezone.make_naive(value))
+
+    def save_m2m(self, model, batch):
+        """Ghi m2m (ví dụ user.groups) thẳng vào bảng trung gian, thay toàn bộ giá trị cũ như loaddata."""
+        fields = {f.name: f for f in model._meta.many_to_many}
+        rows = defaultdict(list)
+        for obj in batch:
+            for name, values in (obj.m2m_data or {}).items():
+                rows[fields[name]].append((obj.object.pk, values))
+        for field, pairs in rows.items():
+            through = field.remote_field.through
+            if not through._meta.auto_created:
+                continue  # bảng trung gian tự định nghĩa có object riêng trong fixture
+            source = field.m2m_field_name() + "_id"
+            target = field.m2m_reverse_field_name() + "_id"
+            through._base_manager.using(self.using).filter(
+                **{f"{source}__in": [pk for pk, _ in pairs]}
+            ).delete()
+            through._base_manager.using(self.using).bulk_create(
+                [through(**{source: pk, target: value}) for pk, values in pairs for value in values],
+                batch_size=self.batch_size,
+                ignore_conflicts=True,
+            )
+            self.tables.add(through._meta.db_table)
+
+    def rebuild_derived(self):
+        """Làm thay phần việc của save() / signal mà bulk_create bỏ qua."""
+        for model, fields in MEDIA_SRC_FIELDS.items():
+            pks = self.media_pks.get(model, [])
+            src_fields = [src for _, src in fields]
+            for i in range(0, len(pks), self.batch_size):
+                changed = []
+                qs = model._base_manager.using(self.using).filter(pk__in=pks[i:i + self.batch_size])
+                for obj in qs.only("pk", *(f for f, _ in fields), *src_fields):
+                    urls = {src: media_url(getattr(obj, f)) or "" for f, src in fields}
+                    if any(getattr(obj, src) != url for src, url in urls.items()):
+                        for src, url in urls.items():
+                            setattr(obj, src, url)
+                        changed.append(obj)
+                model._base_manager.using(self.using).bulk_update(changed, src_fields)
+        for user_id in sorted(self.chat_users):
+            Conversation.refresh(user_id, using=self.using)
+        if self.chat_users:
+            self.stdout.write(f"  Conversation: tính lại {len(self.chat_users)} hội thoại")
+
+    def reset_sequences(self, models):
+        # id chèn thẳng từ fixture -> đẩy sequence (PostgreSQL) lên trên id lớn nhất
+        statements = self.connection.ops.sequence_reset_sql(no_style(), models)
+        if statements:
+            with self.connection.cursor() as cursor:
+                for sql in statements:
+                    cursor.execute(sql)
@@ -0,0 +1,249 @@
+# app/management/commands/sync_cloudinary.py
+"""
+Đẩy media local (MEDIA_ROOT) lên Cloudinary và cập nhật DB trỏ sang secure URL.
+
+- Upload song song bằng thread pool (--workers), tối đa 4 × workers upload đang chờ cùng lúc
+  (RAM không tăng theo số dòng)
+- Manifest SQLite (sha256 nội dung -> secure_url), ghi ngay khi từng upload xong: chạy lại sau
+  lỗi / Ctrl+C sẽ không upload lại file đã lên, và các file trùng nội dung chỉ upload 1 lần
+- Ctrl+C: ngừng gửi upload mới, chờ các upload đang chạy xong, ghi manifest + DB rồi in thống kê
+- Cập nhật DB bằng bulk_update theo lô (--batch-size)
+- --dry-run: chỉ thống kê, không upload / không ghi DB
+
+    python manage.py sync_cloudinary --workers 8
+"""
+import os
+import sqlite3
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from app.media import file_sha256, cloudinary_variants
+from app.models import (
+    Product,
+    ProductImage,
+    ProductVideo,
+    Video,
+    DirectChatMessage,
+    MediaBlob,
+    _is_url,
+    decode_media_name,
+)
+
+# (model, file field, resource_type, cột URL chuẩn hóa nếu có)
+TARGETS = (
+    (Product, "image", "image", "image_src"),
+    (ProductImage, "image", "image", "image_src"),
+    (ProductVideo, "video", "video", "video_src"),
+    (Video, "file", "video", None),
+    (Video, "thumbnail", "image", None),
+    (DirectChatMessage, "image", "image", None),
+    (DirectChatMessage, "thumbnail", "image", None),
+)
+
+
+def cloudinary_uploader(path, resource_type):
+    """Uploader mặc định: gọi Cloudinary API, trả về dict có 'secure_url'."""
+    from cloudinary.uploader import upload
+
+    return upload(str(path), resource_type=resource_type)
+
+
+class Manifest:
+    """Lưu các file đã upload: sha256 -> secure_url (SQLite, chỉ ghi từ main thread)."""
+
+    def __init__(self, path):
+        self.conn = sqlite3.connect(str(path))
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS uploads ("
+            " sha256 TEXT PRIMARY KEY, secure_url TEXT NOT NULL,"
+            " resource_type TEXT, source TEXT, uploaded_at REAL)"
+        )
+        self.conn.commit()
+
+    def get(self, sha256):
+        row = self.conn.execute("SELECT secure_url FROM uploads WHERE sha256 = ?", (sha256,)).fetchone()
+        return row[0] if row else None
+
+    def add(self, sha256, secure_url, resource_type, source):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO uploads VALUES (?, ?, ?, ?, ?)",
+            (sha256, secure_url, resource_type, str(source), time.time()),
+        )
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+
+class Command(BaseCommand):
+    help = "Upload media local lên Cloudinary (song song, resume được qua manifest)."
+    # test có thể truyền uploader giả qua call_command(..., uploader=fake)
+    stealth_options = ("uploader",)
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4, help="Số thread upload song song")
+        parser.add_argument("--batch-size", type=int, default=100, help="Số dòng mỗi lần bulk_update")
+        parser.add_argument(
+            "--manifest",
+            default=str(Path(settings.BASE_DIR) / ".sync_cloudinary_manifest.sqlite3"),
+            help="File SQLite lưu các file đã upload",
+        )
+        parser.add_argument("--dry-run", action="store_true", help="Chỉ thống kê, không upload / ghi DB")
+
+    def handle(self, *args, **options):
+        self.uploader = options.get("uploader") or cloudinary_uploader
+        self.dry_run = options["dry_run"]
+        self.batch_size = options["batch_size"]
+        self.media_root = Path(settings.MEDIA_ROOT)
+        self.manifest = Manifest(options["manifest"])
+        self.blobs_done = set()
+        self.stats = {"uploaded": 0, "reused": 0, "skipped": 0, "missing": 0, "failed": 0}
+        workers = max(1, options["workers"])
+        self.window = 4 * workers
+        self.interrupted = False
+
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                for model, field, resource_type, src_field in TARGETS:
+                    self.sync_field(pool, model, field, resource_type, src_field)
+                    if self.interrupted:
+                        break
+        finally:
+            self.manifest.close()
+
+        prefix = "[dry-run] " if self.dry_run else ""
+        summary = prefix + ", ".join(f"{k}={v}" for k, v in self.stats.items())
+        if self.interrupted:
+            self.stdout.write(self.style.WARNING(f"[đã dừng giữa chừng] {summary}"))
+            raise CommandError("Đã dừng bởi Ctrl+C: các file đã upload xong đều đã ghi manifest, chạy lại để tiếp tục.")
+        self.stdout.write(self.style.SUCCESS(summary))
+        return None
+
+    def interrupt(self, label):
+        """Ctrl+C lần 1: ngừng gửi upload mới, chờ các upload đang chạy xong để ghi manifest."""
+        if self.interrupted:
+            raise KeyboardInterrupt  # Ctrl+C lần 2 -> thoát ngay
+        self.interrupted = True
+        self.stdout.write(f"⏸️ {label}: nhận Ctrl+C, chờ các upload đang chạy xong (Ctrl+C lần nữa để thoát ngay)")
+
+    # -------------------
+    # 1 cột file của 1 model
+    # -------------------
+    def sync_field(self, pool, model, field, resource_type, src_field):
+        label = f"{model.__name__}.{field}"
+        self.stdout.write(f"=== Sync {label} ===")
+
+        qs = (
+            model.objects.exclude(**{field: ""})
+            .exclude(**{f"{field}__isnull": True})
+            .exclude(**{f"{field}__startswith": "http"})
+            .only("pk", field)
+            .order_by("pk")
+        )
+
+        pending = []   # object đã có URL mới, chờ bulk_update
+        futures = {}   # future -> (sha256, path), tối đa self.window upload đang chờ
+        by_hash = {}   # sha256 -> list obj cùng nội dung đang chờ upload
+
+        try:
+            self.submit_all(pool, qs, label, field, resource_type, src_field, model, pending, futures, by_hash)
+        except KeyboardInterrupt:
+            self.interrupt(label)
+
+        while futures:
+            try:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            except KeyboardInterrupt:
+                self.interrupt(label)
+                continue
+            self.collect(done, futures, by_hash, pending, label, resource_type, field, src_field)
+            if len(pending) >= self.batch_size:
+                self.flush(model, field, src_field, pending)
+
+        self.flush(model, field, src_field, pending)
+
+    def submit_all(self, pool, qs, label, field, resource_type, src_field, model, pending, futures, by_hash):
+        for obj in qs.iterator(chunk_size=self.batch_size):
+            name = getattr(obj, field).name
+            if _is_url(decode_media_name(name)):
+                self.stats["skipped"] += 1
+                continue
+            path = self.media_root / name
+            if not path.exists():
+                self.stats["missing"] += 1
+                self.stdout.write(f"⚠️ {label}[{obj.pk}] file not found: {path}")
+                continue
+
+            sha256 = file_sha256(path)
+            url = self.manifest.get(sha256)
+            if url:
+                # đã upload ở lần chạy trước (hoặc file trùng nội dung)
+                self.stats["reused"] += 1
+                self.point_blob(sha256, url)
+                pending.append(self.apply_url(obj, field, src_field, url))
+            elif sha256 in by_hash:
+                self.stats["reused"] += 1
+                by_hash[sha256].append(obj)
+            elif self.dry_run:
+                self.stats["uploaded"] += 1
+                by_hash[sha256] = [obj]
+            else:
+                by_hash[sha256] = [obj]
+                futures[pool.submit(self.uploader, path, resource_type)] = (sha256, path)
+                if len(futures) >= self.window:
+                    done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                    self.collect(done, futures, by_hash, pending, label, resource_type, field, src_field)
+
+            if len(pending) >= self.batch_size:
+                self.flush(model, field, src_field, pending)
+
+    def collect(self, done, futures, by_hash, pending, label, resource_type, field, src_field):
+        """Ghi manifest ngay khi từng upload xong (bị ngắt giữa chừng vẫn không mất kết quả)."""
+        for future in done:
+            sha256, path = futures.pop(future)
+            objs = by_hash.pop(sha256)
+            try:
+                res = future.result()
+                url = (res or {}).get("secure_url")
+            except Exception as e:
+                url = None
+                self.stdout.write(f"❌ {label} upload error {path}: {e!r}")
+            if not url:
+                self.stats["failed"] += len(objs)
+                continue
+            self.stats["uploaded"] += 1
+            self.manifest.add(sha256, url, resource_type, path)
+            self.point_blob(sha256, url)
+            self.stdout.write(f"✅ {label} {path.name} -> {url}")
+            pending.extend(self.apply_url(o, field, src_field, url) for o in objs)
+
+    def point_blob(self, sha256, url):
+        """Upload mới trùng nội dung sẽ dùng luôn URL Cloudinary thay vì file local."""
+        if self.dry_run or sha256 in self.blobs_done:
+            return
+        self.blobs_done.add(sha256)
+        MediaBlob.objects.filter(sha256=sha256).update(name=url)
+
+    def apply_url(self, obj, field, src_field, url):
+        getattr(obj, field).name = url
+        if src_field:
+            setattr(obj, src_field, url)
+        if hasattr(obj, "image_variants") and field == "image":
+            obj.image_variants = cloudinary_variants(url)
+        return obj
+
+    def flush(self, model, field, src_field, pending):
+        if not pending or self.dry_run:
+            pending.clear()
+            return
+        fields = [field]
+        if src_field:
+            fields.append(src_field)
+        if hasattr(model, "image_variants") and field == "image":
+            fields.append("image_variants")
+        model.objects.bulk_update(pending, fields, batch_size=self.batch_size)
+        pending.clear()
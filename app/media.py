@@ -0,0 +1,270 @@
+# app/media.py
+"""
+Helper xử lý file media (ảnh upload) dùng chung cho view và Celery task.
+"""
+import base64
+import hashlib
+import os
+import shutil
+import subprocess
+from io import BytesIO
+from urllib.request import Request, urlopen
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from PIL import Image, ImageOps
+
+# Thư mục con (trong staging storage) chứa ảnh chat chờ worker xử lý.
+CHAT_UPLOAD_STAGING_PREFIX = getattr(settings, "CHAT_UPLOAD_STAGING_PREFIX", "chat")
+CHAT_THUMBNAIL_SIZE = getattr(settings, "CHAT_THUMBNAIL_SIZE", (320, 320))
+
+
+def file_sha256(fp, chunk_size=1024 * 1024):
+    """SHA-256 của file (đọc theo chunk). Nhận path hoặc file object đang mở."""
+    h = hashlib.sha256()
+    if isinstance(fp, (str, os.PathLike)):
+        with open(fp, "rb") as fh:
+            for chunk in iter(lambda: fh.read(chunk_size), b""):
+                h.update(chunk)
+    else:
+        for chunk in iter(lambda: fp.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def staging_storage():
+    """
+    Ổ đĩa local / volume dùng chung giữa web và Celery worker (settings.CHAT_UPLOAD_STAGING_DIR).
+    Không dùng default storage: trên production đó là Cloudinary, request sẽ phải upload cả ảnh
+    lên mạng rồi worker lại tải về và upload lần nữa.
+    """
+    location = getattr(settings, "CHAT_UPLOAD_STAGING_DIR", "") or os.path.join(settings.MEDIA_ROOT, "_staging")
+    return FileSystemStorage(location=location)
+
+
+def stage_upload(uploaded_file, prefix=CHAT_UPLOAD_STAGING_PREFIX):
+    """
+    Ghi file upload vào thư mục staging trên ổ đĩa (ghi theo chunk, không đọc cả file vào RAM).
+    Trả về tên file trong staging storage để truyền cho Celery task (task chỉ nhận tên, không nhận nội dung).
+    """
+    name = os.path.basename(uploaded_file.name or "upload")
+    return staging_storage().save(f"{prefix}/{name}", uploaded_file)
+
+
+def make_thumbnail(fp, size=CHAT_THUMBNAIL_SIZE, quality=80):
+    """Tạo ảnh thu nhỏ JPEG (giữ tỉ lệ, xoay theo EXIF). Trả về ContentFile."""
+    with Image.open(fp) as img:
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        img.thumbnail(size)
+        buf = BytesIO()
+        img.save(buf, format="JPEG", quality=quality, optimize=True)
+    return ContentFile(buf.getvalue())
+
+
+def thumbnail_name(name):
+    base = os.path.splitext(os.path.basename(name))[0]
+    return f"{base}_thumb.jpg"
+
+
+# ====================
+# Ảnh responsive (srcset) cho sản phẩm
+# ====================
+IMAGE_VARIANT_WIDTHS = getattr(settings, "IMAGE_VARIANT_WIDTHS", (320, 640, 1280))
+IMAGE_VARIANT_FORMATS = (("webp", "WEBP"), ("jpeg", "JPEG"))
+
+
+def cloudinary_variants(url, widths=IMAGE_VARIANT_WIDTHS):
+    """
+    Ảnh đã nằm trên Cloudinary -> không cần tự resize, chỉ chèn transformation
+    (w_<width>, f_<format>) vào URL để Cloudinary sinh & cache biến thể.
+    Trả về {} nếu URL không phải ảnh Cloudinary.
+    """
+    if not url or "res.cloudinary.com" not in url or "/image/upload/" not in url:
+        return {}
+    head, tail = url.split("/image/upload/", 1)
+    return {
+        fmt: {
+            str(w): f"{head}/image/upload/w_{w},c_limit,q_auto,f_{fmt}/{tail}"
+            for w in widths
+        }
+        for fmt, _ in IMAGE_VARIANT_FORMATS
+    }
+
+
+def build_image_variants(fp, name, storage, widths=IMAGE_VARIANT_WIDTHS, quality=80):
+    """
+    Sinh các biến thể theo chiều rộng (WebP + JPEG) bằng Pillow và lưu vào `storage`.
+    Không phóng to ảnh: chỉ giữ các width nhỏ hơn ảnh gốc (luôn có ít nhất 1 biến thể).
+    Trả về {"webp": {"320": url, ...}, "jpeg": {...}}.
+    """
+    base = os.path.splitext(os.path.basename(name))[0]
+    folder = os.path.dirname(name) or "products"
+    variants = {fmt: {} for fmt, _ in IMAGE_VARIANT_FORMATS}
+
+    with Image.open(fp) as src:
+        src = ImageOps.exif_transpose(src)
+        if src.mode not in ("RGB", "L"):
+            src = src.convert("RGB")
+        targets = [w for w in widths if w < src.width] or [min(widths[0], src.width)]
+        for w in targets:
+            h = max(1, round(src.height * w / src.width))
+            resized = src.resize((w, h), Image.LANCZOS)
+            for fmt, pil_format in IMAGE_VARIANT_FORMATS:
+                buf = BytesIO()
+                resized.save(buf, format=pil_format, quality=quality, optimize=True)
+                saved = storage.save(f"{folder}/variants/{base}_{w}.{fmt}", ContentFile(buf.getvalue()))
+                variants[fmt][str(w)] = storage.url(saved)
+    return variants
+
+
+def srcset(variants):
+    """{"320": url, ...} -> 'url 320w, url 640w' (tăng dần theo width)."""
+    if not variants:
+        return ""
+    return ", ".join(f"{url} {w}w" for w, url in sorted(variants.items(), key=lambda kv: int(kv[0])))
+
+
+# ====================
+# Kích thước gốc + placeholder mờ (LQIP) cho lazy-loading
+# ====================
+LQIP_SIZE = getattr(settings, "LQIP_SIZE", 16)
+REMOTE_IMAGE_MAX_BYTES = getattr(settings, "REMOTE_IMAGE_MAX_BYTES", 15 * 1024 * 1024)
+
+
+def image_meta(fp, lqip_size=LQIP_SIZE):
+    """
+    Đọc ảnh 1 lần lúc upload: kích thước gốc (width/height cho thẻ <img>, tránh layout shift)
+    và ảnh siêu nhỏ dạng data URI base64 (~ vài trăm byte) để hiện mờ trong lúc ảnh thật đang tải.
+    """
+    with Image.open(fp) as img:
+        img = ImageOps.exif_transpose(img)
+        width, height = img.size
+        if img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        img.thumbnail((lqip_size, lqip_size))
+        buf = BytesIO()
+        img.save(buf, format="JPEG", quality=50)
+    lqip = "data:image/jpeg;base64," + base64.b64encode(buf.getvalue()).decode("ascii")
+    return {"width": width, "height": height, "lqip": lqip}
+
+
+def fetch_remote(url, max_bytes=REMOTE_IMAGE_MAX_BYTES, timeout=10):
+    """Tải file từ URL (Cloudinary...) vào RAM, giới hạn dung lượng. Trả về BytesIO."""
+    req = Request(url, headers={"User-Agent": "webchothuetro/1.0"})
+    with urlopen(req, timeout=timeout) as res:
+        data = res.read(max_bytes + 1)
+    if len(data) > max_bytes:
+        raise ValueError(f"remote file larger than {max_bytes} bytes")
+    return BytesIO(data)
+
+
+# ====================
+# Video: metadata (MP4) + ảnh poster
+# ====================
+VIDEO_POSTER_WIDTH = getattr(settings, "VIDEO_POSTER_WIDTH", 640)
+VIDEO_POSTER_SEEK = getattr(settings, "VIDEO_POSTER_SEEK", 1)  # giây
+_MP4_CONTAINERS = {b"moov", b"trak", b"mdia", b"minf", b"stbl", b"edts", b"udta"}
+
+
+def _read_exact(fh, n):
+    data = fh.read(n)
+    if len(data) < n:
+        raise ValueError("unexpected end of MP4 data")
+    return data
+
+
+def _iter_boxes(fh, end):
+    """Duyệt các box MP4 trong [vị trí hiện tại, end). Yield (type, vị trí payload, vị trí kết thúc)."""
+    while end is None or fh.tell() + 8 <= end:
+        start = fh.tell()
+        header = fh.read(8)
+        if len(header) < 8:
+            return
+        size = int.from_bytes(header[:4], "big")
+        kind = header[4:]
+        if size == 1:
+            size = int.from_bytes(_read_exact(fh, 8), "big")
+        elif size == 0:
+            # box kéo dài tới hết file
+            fh.seek(0, os.SEEK_END)
+            size = fh.tell() - start
+            fh.seek(start + 8)
+        if size < 8:
+            raise ValueError("invalid MP4 box size")
+        box_end = start + size
+        yield kind, fh.tell(), box_end
+        fh.seek(box_end)
+
+
+def mp4_metadata(fh):
+    """
+    Đọc duration (giây), width, height từ file MP4/MOV bằng cách nhảy qua các box
+    (không đọc mdat nên chỉ tốn vài KB I/O, kể cả khi moov nằm cuối file).
+    Trả về {"duration", "width", "height"} (giá trị None nếu không đọc được).
+    """
+    meta = {"duration": None, "width": None, "height": None}
+    fh.seek(0)
+
+    def walk(end):
+        for kind, payload, box_end in _iter_boxes(fh, end):
+            if kind in _MP4_CONTAINERS:
+                walk(box_end)
+            elif kind == b"mvhd":
+                version = _read_exact(fh, 4)[0]
+                if version == 1:
+                    data = _read_exact(fh, 28)
+                    timescale = int.from_bytes(data[16:20], "big")
+                    duration = int.from_bytes(data[20:28], "big")
+                else:
+                    data = _read_exact(fh, 16)
+                    timescale = int.from_bytes(data[8:12], "big")
+                    duration = int.from_bytes(data[12:16], "big")
+                if timescale:
+                    meta["duration"] = round(duration / timescale, 3)
+            elif kind == b"tkhd":
+                version = _read_exact(fh, 4)[0]
+                fh.seek(payload + 4 + (32 if version == 1 else 20) + 16)
+                matrix = _read_exact(fh, 36)
+                width = int.from_bytes(_read_exact(fh, 4), "big") >> 16
+                height = int.from_bytes(_read_exact(fh, 4), "big") >> 16
+                if width and height and width * height > (meta["width"] or 0) * (meta["height"] or 0):
+                    a = int.from_bytes(matrix[0:4], "big", signed=True)
+                    b = int.from_bytes(matrix[4:8], "big", signed=True)
+                    if a == 0 and b != 0:
+                        # video quay 90/270 độ (quay dọc trên điện thoại)
+                        width, height = height, width
+                    meta["width"], meta["height"] = width, height
+
+    walk(None)
+    return meta
+
+
+def ffmpeg_poster(source, seek=VIDEO_POSTER_SEEK, width=VIDEO_POSTER_WIDTH, timeout=60):
+    """
+    Cắt 1 khung hình làm poster bằng ffmpeg (nếu máy có cài). `source` là path hoặc URL.
+    Trả về ContentFile JPEG hoặc None nếu không có ffmpeg / lỗi.
+    """
+    ffmpeg = shutil.which(getattr(settings, "FFMPEG_BINARY", "ffmpeg"))
+    if not ffmpeg:
+        return None
+    cmd = [
+        ffmpeg, "-v", "error", "-ss", str(seek), "-i", str(source),
+        "-frames:v", "1", "-vf", f"scale='min({width},iw)':-2", "-f", "image2", "-c:v", "mjpeg", "pipe:1",
+    ]
+    try:
+        res = subprocess.run(cmd, capture_output=True, timeout=timeout, check=True)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return ContentFile(res.stdout) if res.stdout else None
+
+
+def cloudinary_video_poster(url, seek=VIDEO_POSTER_SEEK, width=VIDEO_POSTER_WIDTH):
+    """Video trên Cloudinary: poster là transformation URL (so_<giây>, đuôi .jpg), không cần tải video."""
+    if not url or "res.cloudinary.com" not in url or "/video/upload/" not in url:
+        return ""
+    head, tail = url.split("/video/upload/", 1)
+    tail = os.path.splitext(tail)[0] + ".jpg"
+    return f"{head}/video/upload/so_{seek},w_{width},c_limit,q_auto/{tail}"
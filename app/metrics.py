@@ -0,0 +1,377 @@
+# app/metrics.py
+"""
+Metrics kiểu Prometheus (text exposition format 0.0.4), không cần thư viện ngoài:
+Counter / Gauge / Histogram có label, lưu trong RAM của process, xuất ở /metrics.
+
+- Web: MetricsMiddleware đo latency + số query / thời gian SQL theo view
+- Gemini: ask_gemini (app/utils.py) ghi latency + kết quả (ok / empty / quota / error)
+- Websocket: DirectChatConsumer ghi số kết nối đang mở, tin nhắn nhận / gửi
+- Celery: signal task_prerun / task_postrun ghi thời gian chạy từng task
+  (worker là process riêng: đặt METRICS_WORKER_PORT để worker mở HTTP /metrics của nó,
+  mặc định chỉ nghe 127.0.0.1 — METRICS_WORKER_ADDR — và cũng kiểm tra METRICS_TOKEN)
+
+Mỗi process (gunicorn worker, daphne, celery worker) có bộ đếm riêng: Prometheus scrape
+từng process, cộng gộp bằng sum() trong PromQL.
+"""
+import math
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+
+from .request_sql import record_sql
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# bucket mặc định (giây) giống prometheus_client
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    pairs += [f'{n}="{v}"' for n, v in extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+# ====================
+# Các loại metric
+# ====================
+class Metric:
+    kind = ""
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.children = {}
+        (registry or REGISTRY).register(self)
+        if not self.labelnames:
+            self.labels()  # metric không label: xuất giá trị 0 ngay từ đầu
+
+    def labels(self, *values, **kwargs):
+        if kwargs:
+            values = tuple(kwargs[name] for name in self.labelnames)
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name}: cần label {self.labelnames}")
+        key = tuple(str(v) for v in values)
+        child = self.children.get(key)
+        if child is None:
+            with self.lock:
+                child = self.children.setdefault(key, self.new_child())
+        return child
+
+    def _default(self):
+        # metric không có label dùng thẳng 1 child
+        return self.labels()
+
+    def new_child(self):
+        raise NotImplementedError
+
+    def samples(self):
+        """Yield (hậu tố tên, label values, label thêm, giá trị)."""
+        raise NotImplementedError
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, values, extra, value in self.samples():
+            lines.append(
+                f"{self.name}{suffix}{_format_labels(self.labelnames, values, extra)} {_format_value(value)}"
+            )
+        return "\n".join(lines)
+
+
+class _Value:
+    __slots__ = ("value", "lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def set(self, value):
+        with self.lock:
+            self.value = value
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def new_child(self):
+        return _Value()
+
+    def inc(self, amount=1):
+        self._default().inc(amount)
+
+    def samples(self):
+        for key, child in list(self.children.items()):
+            yield "_total" if not self.name.endswith("_total") else "", key, (), child.value
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def new_child(self):
+        return _Value()
+
+    def inc(self, amount=1):
+        self._default().inc(amount)
+
+    def dec(self, amount=1):
+        self._default().dec(amount)
+
+    def set(self, value):
+        self._default().set(value)
+
+    def samples(self):
+        for key, child in list(self.children.items()):
+            yield "", key, (), child.value
+
+
+class _HistogramValue:
+    __slots__ = ("upper_bounds", "counts", "sum", "lock")
+
+    def __init__(self, upper_bounds):
+        self.upper_bounds = upper_bounds
+        self.counts = [0] * len(upper_bounds)
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.upper_bounds, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def time(self):
+        return _Timer(self)
+
+
+class _Timer:
+    def __init__(self, target):
+        self.target = target
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.target.observe(time.perf_counter() - self.started)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        self.upper_bounds = tuple(sorted(buckets)) + (math.inf,)
+        super().__init__(name, documentation, labelnames, registry)
+
+    def new_child(self):
+        return _HistogramValue(self.upper_bounds)
+
+    def observe(self, value):
+        self._default().observe(value)
+
+    def time(self):
+        return self._default().time()
+
+    def samples(self):
+        for key, child in list(self.children.items()):
+            with child.lock:
+                counts, total = list(child.counts), child.sum
+            cumulative = 0
+            for bound, count in zip(self.upper_bounds, counts):
+                cumulative += count
+                yield "_bucket", key, (("le", _format_value(bound)),), cumulative
+            yield "_sum", key, (), total
+            yield "_count", key, (), cumulative
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+
+    def register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"metric {metric.name} đã tồn tại")
+        self.metrics[metric.name] = metric
+
+    def expose(self):
+        return "\n".join(m.expose() for m in self.metrics.values()) + "\n"
+
+
+REGISTRY = Registry()
+
+
+# ====================
+# Metric của ứng dụng
+# ====================
+http_requests = Counter(
+    "http_requests_total", "Số request HTTP theo view, method, status.", ("view", "method", "status"),
+)
+http_request_duration = Histogram(
+    "http_request_duration_seconds", "Thời gian xử lý request theo view.", ("view",),
+)
+db_queries = Counter("db_queries_total", "Số query SQL chạy trong request, theo view.", ("view",))
+db_query_duration = Histogram(
+    "db_query_duration_seconds", "Thời gian từng query SQL trong request.",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+gemini_requests = Counter("gemini_requests_total", "Số lần gọi Gemini theo kết quả.", ("status",))
+gemini_request_duration = Histogram(
+    "gemini_request_duration_seconds", "Thời gian gọi Gemini.",
+    buckets=(0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 8.0, 13.0, 21.0, 30.0),
+)
+websocket_connections = Counter(
+    "websocket_connections_total", "Số kết nối websocket chat theo kết quả (accepted / rejected).", ("status",),
+)
+websocket_connections_active = Gauge("websocket_connections_active", "Số kết nối websocket chat đang mở.")
+websocket_messages = Counter(
+    "websocket_messages_total", "Số frame websocket chat theo chiều (in / out) và loại.", ("direction", "type"),
+)
+celery_tasks = Counter("celery_tasks_total", "Số task Celery đã chạy theo tên và trạng thái.", ("task", "state"))
+celery_task_duration = Histogram(
+    "celery_task_duration_seconds", "Thời gian chạy task Celery.", ("task",),
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0),
+)
+
+
+# ====================
+# Web: middleware + endpoint
+# ====================
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        status = 500
+        queries = 0
+        try:
+            # dùng chung recorder SQL với ProfilingMiddleware (1 execute_wrapper / request)
+            with record_sql(on_query=db_query_duration.observe) as sql:
+                count = sql.count
+                try:
+                    response = self.get_response(request)
+                finally:
+                    queries = sql.count - count
+            status = response.status_code
+            return response
+        finally:
+            match = getattr(request, "resolver_match", None)
+            # chỉ dùng tên view đã khai báo (không dùng path) để số label không tăng vô hạn
+            view = (match.view_name or "<unnamed>") if match else "<unresolved>"
+            http_request_duration.labels(view).observe(time.perf_counter() - started)
+            http_requests.labels(view, request.method, status).inc()
+            if queries:
+                db_queries.labels(view).inc(queries)
+
+
+def metrics_view(request):
+    """
+    /metrics cho Prometheus. Nếu có METRICS_TOKEN: cần header "Authorization: Bearer <token>";
+    không có token thì chỉ staff (hoặc DEBUG) xem được.
+    """
+    token = getattr(settings, "METRICS_TOKEN", "")
+    auth = request.headers.get("Authorization", "")
+    if token:
+        allowed = constant_time_compare(auth, f"Bearer {token}") or request.user.is_staff
+    else:
+        allowed = settings.DEBUG or request.user.is_staff
+    if not allowed:
+        return HttpResponseForbidden("forbidden")
+    return HttpResponse(REGISTRY.expose(), content_type=CONTENT_TYPE)
+
+
+# ====================
+# Celery
+# ====================
+_task_started = {}
+
+
+def _task_prerun(task_id=None, task=None, **kwargs):
+    _task_started[task_id] = time.perf_counter()
+
+
+def _task_postrun(task_id=None, task=None, state=None, **kwargs):
+    started = _task_started.pop(task_id, None)
+    name = getattr(task, "name", "unknown")
+    celery_tasks.labels(name, state or "UNKNOWN").inc()
+    if started is not None:
+        celery_task_duration.labels(name).observe(time.perf_counter() - started)
+
+
+def _worker_process_init(**kwargs):
+    port = getattr(settings, "METRICS_WORKER_PORT", None)
+    if not port:
+        return
+    # prefork: mỗi process con lấy port trống đầu tiên từ METRICS_WORKER_PORT trở đi
+    for offset in range(64):
+        try:
+            start_http_server(int(port) + offset)
+            return
+        except OSError:
+            continue
+    print(">>> metrics worker http error: không còn port trống từ", port)
+
+
+def connect_celery_signals():
+    from celery.signals import task_postrun, task_prerun, worker_process_init
+
+    task_prerun.connect(_task_prerun, weak=False, dispatch_uid="metrics_task_prerun")
+    task_postrun.connect(_task_postrun, weak=False, dispatch_uid="metrics_task_postrun")
+    worker_process_init.connect(_worker_process_init, weak=False, dispatch_uid="metrics_worker_init")
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        # cùng quy tắc token với metrics_view (worker không có session staff để fallback)
+        token = getattr(settings, "METRICS_TOKEN", "")
+        if token and not constant_time_compare(self.headers.get("Authorization", ""), f"Bearer {token}"):
+            self.send_response(403)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = REGISTRY.expose().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_http_server(port, addr=None):
+    """
+    HTTP /metrics riêng cho process không chạy Django view (celery worker).
+    addr mặc định settings.METRICS_WORKER_ADDR (127.0.0.1): chỉ mở ra ngoài khi cấu hình rõ.
+    """
+    if addr is None:
+        addr = getattr(settings, "METRICS_WORKER_ADDR", "127.0.0.1") or "127.0.0.1"
+    server = ThreadingHTTPServer((addr, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True, name="metrics-http").start()
+    return server
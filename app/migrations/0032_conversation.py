@@ -0,0 +1,75 @@
+# Generated by Django 5.2.6 on 2026-10-19 23:19
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, Q
+
+
+def backfill_conversations(apps, schema_editor):
+    DirectChatMessage = apps.get_model("app", "DirectChatMessage")
+    Conversation = apps.get_model("app", "Conversation")
+
+    stats = (
+        DirectChatMessage.objects.order_by()
+        .values("user_id")
+        .annotate(
+            total=Count("id"),
+            unread=Count("id", filter=Q(sender="user", is_read=False)),
+            last_time=Max("created_at"),
+        )
+    )
+    batch = []
+    for row in stats.iterator():
+        last = (
+            DirectChatMessage.objects.filter(user_id=row["user_id"])
+            .order_by("-created_at", "-id")
+            .only("message", "sender", "image")
+            .first()
+        )
+        if last.message:
+            snippet = last.message[:140] + ("..." if len(last.message) > 140 else "")
+        else:
+            snippet = "📷 Hình ảnh" if last.image else ""
+        batch.append(Conversation(
+            user_id=row["user_id"],
+            last_message=snippet,
+            last_sender=last.sender,
+            last_time=row["last_time"],
+            total_messages=row["total"],
+            unread_count=row["unread"],
+        ))
+        if len(batch) >= 500:
+            Conversation.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        Conversation.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0031_alter_productimage_options_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Conversation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_message', models.TextField(blank=True, default='', verbose_name='Tin nhắn gần nhất')),
+                ('last_sender', models.CharField(blank=True, choices=[('user', 'Người dùng'), ('admin', 'Admin')], max_length=10, verbose_name='Người gửi cuối')),
+                ('last_time', models.DateTimeField(blank=True, db_index=True, null=True, verbose_name='Thời gian cuối')),
+                ('total_messages', models.PositiveIntegerField(default=0, verbose_name='Tổng tin nhắn')),
+                ('unread_count', models.PositiveIntegerField(default=0, verbose_name='Chưa đọc')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='conversation', to=settings.AUTH_USER_MODEL, verbose_name='Người dùng')),
+            ],
+            options={
+                'verbose_name': 'Hội thoại',
+                'verbose_name_plural': 'Hộp thư hội thoại',
+                'ordering': ['-last_time'],
+            },
+        ),
+        migrations.RunPython(backfill_conversations, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-19 23:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0032_conversation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='directchatmessage',
+            name='image_pending',
+            field=models.BooleanField(default=False, verbose_name='Ảnh đang tải lên'),
+        ),
+        migrations.AddField(
+            model_name='directchatmessage',
+            name='thumbnail',
+            field=models.ImageField(blank=True, null=True, upload_to='chat_images/thumbs/', verbose_name='Ảnh thu nhỏ'),
+        ),
+    ]
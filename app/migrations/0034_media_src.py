@@ -0,0 +1,94 @@
+# Generated by Django 5.2.6 on 2026-10-19 23:26
+
+import re
+from urllib.parse import unquote
+
+from django.db import migrations, models
+
+
+# Bản sao helper trong app/models.py tại thời điểm viết migration:
+# migration không import code model đang chạy để kết quả không đổi khi helper đổi về sau.
+def _is_url(val):
+    if not val:
+        return False
+    s = str(val).strip()
+    return s.startswith(("http://", "https://", "//")) or "res.cloudinary.com" in s
+
+
+def decode_media_name(name):
+    s = str(name or "").strip()
+    if "%3A" in s or s.startswith("media/https") or s.startswith("/media/https"):
+        s = unquote(s)
+        for prefix in ("/media/", "media/"):
+            if s.startswith(prefix):
+                s = s[len(prefix):]
+                break
+        s = re.sub(r"^(https?):/(?!/)", r"\1://", s)
+    return s
+
+
+def media_url(field_file):
+    if not field_file:
+        return None
+    s = decode_media_name(field_file.name)
+    if _is_url(s):
+        return "https:" + s if s.startswith("//") else s
+    try:
+        return field_file.url
+    except Exception:
+        return None
+
+MEDIA_COLUMNS = (
+    ("Product", "image", "image_src"),
+    ("ProductImage", "image", "image_src"),
+    ("ProductVideo", "video", "video_src"),
+)
+
+
+def normalize_media_urls(apps, schema_editor):
+    """
+    Sửa các giá trị cũ dạng 'media/https%3A/...' về URL gốc
+    và điền sẵn cột *_src để lúc render không phải parse URL nữa.
+    """
+    for model_name, file_field, src_field in MEDIA_COLUMNS:
+        Model = apps.get_model("app", model_name)
+        batch = []
+        qs = Model.objects.exclude(**{file_field: ""}).exclude(**{f"{file_field}__isnull": True})
+        for obj in qs.only("pk", file_field).iterator(chunk_size=500):
+            field_file = getattr(obj, file_field)
+            decoded = decode_media_name(field_file.name)
+            if decoded != field_file.name:
+                field_file.name = decoded
+            setattr(obj, src_field, media_url(field_file) or "")
+            batch.append(obj)
+            if len(batch) >= 500:
+                Model.objects.bulk_update(batch, [file_field, src_field])
+                batch = []
+        if batch:
+            Model.objects.bulk_update(batch, [file_field, src_field])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0033_directchatmessage_thumbnail'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='image_src',
+            field=models.CharField(blank=True, default='', editable=False, max_length=500, verbose_name='URL ảnh chính'),
+        ),
+        migrations.AddField(
+            model_name='productimage',
+            name='image_src',
+            field=models.CharField(blank=True, default='', editable=False, max_length=500, verbose_name='URL ảnh'),
+        ),
+        migrations.AddField(
+            model_name='productvideo',
+            name='video_src',
+            field=models.CharField(blank=True, default='', editable=False, max_length=500, verbose_name='URL video'),
+        ),
+        migrations.RunPython(normalize_media_urls, migrations.RunPython.noop),
+    ]
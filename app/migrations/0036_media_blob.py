@@ -0,0 +1,63 @@
+# Generated by Django 5.2.6 on 2026-10-19 23:33
+
+import app.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0035_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64, unique=True, verbose_name='SHA-256')),
+                ('name', models.CharField(max_length=500, verbose_name='Tên file / URL')),
+                ('size', models.BigIntegerField(default=0, verbose_name='Kích thước (bytes)')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Ngày tạo')),
+            ],
+            options={
+                'verbose_name': 'File media',
+                'verbose_name_plural': 'Kho file media',
+            },
+        ),
+        migrations.AlterField(
+            model_name='directchatmessage',
+            name='image',
+            field=app.models.DedupImageField(blank=True, null=True, upload_to='chat_images/', verbose_name='Ảnh'),
+        ),
+        migrations.AlterField(
+            model_name='directchatmessage',
+            name='thumbnail',
+            field=app.models.DedupImageField(blank=True, null=True, upload_to='chat_images/thumbs/', verbose_name='Ảnh thu nhỏ'),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='image',
+            field=app.models.DedupImageField(blank=True, null=True, upload_to='products/', verbose_name='Ảnh chính'),
+        ),
+        migrations.AlterField(
+            model_name='productimage',
+            name='image',
+            field=app.models.DedupImageField(upload_to='products/', verbose_name='Ảnh phụ'),
+        ),
+        migrations.AlterField(
+            model_name='productvideo',
+            name='video',
+            field=app.models.DedupFileField(upload_to='products/videos/', verbose_name='Video sản phẩm'),
+        ),
+        migrations.AlterField(
+            model_name='video',
+            name='file',
+            field=app.models.DedupFileField(blank=True, null=True, upload_to='videos/', verbose_name='Video'),
+        ),
+        migrations.AlterField(
+            model_name='video',
+            name='thumbnail',
+            field=app.models.DedupImageField(blank=True, null=True, upload_to='videos/thumbnails/', verbose_name='Ảnh đại diện'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.6 on 2026-10-19 23:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0036_media_blob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='image_height',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Chiều cao ảnh'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='image_lqip',
+            field=models.TextField(blank=True, default='', editable=False, verbose_name='Ảnh placeholder (LQIP)'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='image_width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Chiều rộng ảnh'),
+        ),
+        migrations.AddField(
+            model_name='productimage',
+            name='image_height',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Chiều cao ảnh'),
+        ),
+        migrations.AddField(
+            model_name='productimage',
+            name='image_lqip',
+            field=models.TextField(blank=True, default='', editable=False, verbose_name='Ảnh placeholder (LQIP)'),
+        ),
+        migrations.AddField(
+            model_name='productimage',
+            name='image_width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Chiều rộng ảnh'),
+        ),
+    ]
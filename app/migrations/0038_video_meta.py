@@ -0,0 +1,54 @@
+# Generated by Django 5.2.6 on 2026-10-19 23:36
+
+import app.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0037_image_lqip'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productvideo',
+            name='duration',
+            field=models.FloatField(blank=True, editable=False, null=True, verbose_name='Thời lượng (giây)'),
+        ),
+        migrations.AddField(
+            model_name='productvideo',
+            name='height',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Chiều cao'),
+        ),
+        migrations.AddField(
+            model_name='productvideo',
+            name='poster',
+            field=app.models.DedupImageField(blank=True, editable=False, null=True, upload_to='products/videos/posters/', verbose_name='Ảnh poster'),
+        ),
+        migrations.AddField(
+            model_name='productvideo',
+            name='width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Chiều rộng'),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='duration',
+            field=models.FloatField(blank=True, editable=False, null=True, verbose_name='Thời lượng (giây)'),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='height',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Chiều cao'),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='poster',
+            field=app.models.DedupImageField(blank=True, editable=False, null=True, upload_to='videos/posters/', verbose_name='Ảnh poster (tự tạo)'),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Chiều rộng'),
+        ),
+    ]
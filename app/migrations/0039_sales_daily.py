@@ -0,0 +1,45 @@
+# Generated by Django 5.2.6 on 2026-10-19 23:39
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_completed_at(apps, schema_editor):
+    # đơn cũ không lưu thời điểm chốt -> lấy tạm ngày đặt hàng
+    Order = apps.get_model("app", "Order")
+    Order.objects.filter(complete=True, completed_at__isnull=True).update(completed_at=F("date_order"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0038_video_meta'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='completed_at',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, null=True, verbose_name='Ngày hoàn tất'),
+        ),
+        migrations.RunPython(backfill_completed_at, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='SalesDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(db_index=True, verbose_name='Ngày')),
+                ('district', models.CharField(blank=True, default='', max_length=100, verbose_name='Quận')),
+                ('category', models.CharField(blank=True, choices=[('shop', 'Sản phẩm cửa hàng'), ('rental', 'Phòng cho thuê')], default='', max_length=20, verbose_name='Loại')),
+                ('orders', models.PositiveIntegerField(default=0, verbose_name='Số đơn')),
+                ('units', models.PositiveIntegerField(default=0, verbose_name='Số lượng')),
+                ('revenue', models.DecimalField(decimal_places=0, default=0, max_digits=16, verbose_name='Doanh thu (VNĐ)')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Cập nhật lúc')),
+            ],
+            options={
+                'verbose_name': 'Doanh thu theo ngày',
+                'verbose_name_plural': 'Thống kê doanh thu',
+                'ordering': ['-date', 'district', 'category'],
+                'constraints': [models.UniqueConstraint(fields=('date', 'district', 'category'), name='unique_sales_daily')],
+            },
+        ),
+    ]
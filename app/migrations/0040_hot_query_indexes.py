@@ -0,0 +1,65 @@
+# Generated by Django 5.2.6 on 2026-10-20 00:06
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0039_sales_daily'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='order',
+            name='customer',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, to='app.customer', verbose_name='Khách hàng'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['product', '-created_at'], name='comment_product_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='directchatmessage',
+            index=models.Index(fields=['user', 'created_at'], name='directchat_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='directchatmessage',
+            index=models.Index(fields=['user', '-id'], name='directchat_user_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='directchatmessage',
+            index=models.Index(condition=models.Q(('is_read', False), ('sender', 'user')), fields=['user'], name='directchat_unread_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['customer', 'complete', '-date_order'], name='order_customer_complete_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['district', 'category', '-id'], name='product_district_cat_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', 'price'], name='product_category_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', '-id'], name='product_category_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['price'], name='product_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('discount_percent__gt', 0)), fields=['-id'], name='product_on_sale_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='wishlist',
+            index=models.Index(fields=['user', '-date_added'], name='wishlist_user_added_idx'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.6 on 2026-10-20 00:08
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def merge_open_orders(apps, schema_editor):
+    # customer có nhiều giỏ đang mở: giữ giỏ mới nhất (giỏ các view cũ hiển thị), dồn sản phẩm từ giỏ khác vào
+    Order = apps.get_model("app", "Order")
+    OrderItem = apps.get_model("app", "OrderItem")
+    duplicated = (
+        Order.objects.filter(complete=False, customer__isnull=False)
+        .values("customer_id").annotate(n=Count("id")).filter(n__gt=1)
+    )
+    for row in duplicated:
+        orders = list(Order.objects.filter(customer_id=row["customer_id"], complete=False).order_by("-date_order", "-id"))
+        keep, extras = orders[0], orders[1:]
+        kept = {item.product_id: item for item in OrderItem.objects.filter(order=keep)}
+        for item in OrderItem.objects.filter(order__in=extras):
+            target = kept.get(item.product_id)
+            if target is None:
+                item.order = keep
+                item.save(update_fields=["order"])
+                kept[item.product_id] = item
+            else:
+                target.quantity += item.quantity
+                target.save(update_fields=["quantity"])
+                item.delete()
+        Order.objects.filter(pk__in=[o.pk for o in extras]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0040_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_open_orders, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='order',
+            constraint=models.UniqueConstraint(condition=models.Q(('complete', False)), fields=('customer',), name='one_open_order_per_customer'),
+        ),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 5.2.6 on 2026-10-20 00:31
+
+from django.db import migrations, models
+from django.db.models import Count, Value
+from django.db.models.functions import Coalesce, TruncDate
+
+
+def backfill_counts(apps, schema_editor):
+    # bảng tổng hợp cũ đếm đơn theo từng nhóm -> đếm lại dòng đơn / số đơn theo ngày
+    # (doanh thu, số lượng không đổi nên không cần rebuild toàn bộ)
+    SalesDaily = apps.get_model("app", "SalesDaily")
+    OrdersDaily = apps.get_model("app", "OrdersDaily")
+    Order = apps.get_model("app", "Order")
+    OrderItem = apps.get_model("app", "OrderItem")
+
+    items = (
+        OrderItem.objects.filter(order__complete=True, order__completed_at__isnull=False)
+        .annotate(
+            day=TruncDate("order__completed_at"),
+            district_name=Coalesce("product__district", Value("")),
+            category_name=Coalesce("product__category", Value("")),
+        )
+        .values("day", "district_name", "category_name")
+        .annotate(n=Count("id"))
+        .order_by()
+    )
+    for r in items:
+        SalesDaily.objects.filter(
+            date=r["day"], district=r["district_name"], category=r["category_name"]
+        ).update(order_lines=r["n"])
+
+    days = (
+        Order.objects.filter(complete=True, completed_at__isnull=False)
+        .annotate(day=TruncDate("completed_at"))
+        .values("day")
+        .annotate(n=Count("id"))
+        .order_by()
+    )
+    OrdersDaily.objects.bulk_create(
+        [OrdersDaily(date=r["day"], orders=r["n"]) for r in days], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0041_one_open_order_per_customer'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrdersDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True, verbose_name='Ngày')),
+                ('orders', models.PositiveIntegerField(default=0, verbose_name='Số đơn')),
+            ],
+            options={
+                'verbose_name': 'Số đơn theo ngày',
+                'verbose_name_plural': 'Số đơn theo ngày',
+                'ordering': ['-date'],
+            },
+        ),
+        migrations.RemoveField(
+            model_name='salesdaily',
+            name='orders',
+        ),
+        migrations.AddField(
+            model_name='salesdaily',
+            name='order_lines',
+            field=models.PositiveIntegerField(default=0, verbose_name='Số dòng đơn'),
+        ),
+        migrations.RunPython(backfill_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.6 on 2026-10-20 00:47
+
+from django.db import migrations, models
+
+IMAGE_DATA_FIELDS = ("image_variants", "image_width", "image_height", "image_lqip")
+
+
+def backfill_image_data(apps, schema_editor):
+    # ảnh đã xử lý trước migration -> chép sang MediaBlob để upload trùng file dùng lại được
+    MediaBlob = apps.get_model("app", "MediaBlob")
+    done = set()
+    for model_name in ("Product", "ProductImage"):
+        model = apps.get_model("app", model_name)
+        rows = (
+            model.objects.exclude(image="").exclude(image__isnull=True)
+            .exclude(image_variants={}).exclude(image_lqip="")
+            .values_list("image", *IMAGE_DATA_FIELDS)
+            .iterator(chunk_size=2000)
+        )
+        for name, *values in rows:
+            if name in done:
+                continue
+            done.add(name)
+            MediaBlob.objects.filter(name=name).update(image_data=dict(zip(IMAGE_DATA_FIELDS, values)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0043_drop_redundant_fk_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mediablob',
+            name='image_data',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Dữ liệu ảnh đã xử lý'),
+        ),
+        migrations.AddIndex(
+            model_name='mediablob',
+            index=models.Index(fields=['name'], name='mediablob_name_idx'),
+        ),
+        migrations.RunPython(backfill_image_data, migrations.RunPython.noop),
+    ]
@@ -1,24 +1,226 @@
+from datetime import timedelta
+
+from django.conf import settings
 from django.db import models
 from django.contrib.auth.models import User
-from django.db.models import Sum
-from django.db import models
+from django.db.models import Count, Sum, F, OuterRef, Q, Subquery, Value
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.db.models.functions import Coalesce, Floor, TruncDate
+from django.db import models, transaction, IntegrityError
+from django.db.models.fields.files import FieldFile, ImageFieldFile
 from django.utils import timezone
+from django.utils.functional import cached_property
 import re
 from urllib.parse import unquote
 
-# helper nhỏ
-def _is_url(s: str) -> bool:
-    """Simple URL check (http/https)."""
-    if not s:
-        return False
-    s = str(s).strip()
-    return bool(re.match(r'^(https?:)?//', s)) or s.startswith('http://') or s.startswith('https://')
+from .media import cloudinary_variants, cloudinary_video_poster, file_sha256
 
-def _is_url(val: str) -> bool:
+# helper nhỏ
+def _is_url(val) -> bool:
+    """Giá trị đã là URL tuyệt đối (http/https, //host hoặc Cloudinary)."""
     if not val:
         return False
-    s = str(val)
-    return s.startswith("http") or "res.cloudinary.com" in s
+    s = str(val).strip()
+    return s.startswith(("http://", "https://", "//")) or "res.cloudinary.com" in s
+
+
+def decode_media_name(name) -> str:
+    """
+    Sửa giá trị FileField bị lưu sai dạng 'media/https%3A/res.cloudinary.com/...'
+    (URL bị storage encode + gộp '//' thành '/') về lại URL gốc.
+    """
+    s = str(name or "").strip()
+    if "%3A" in s or s.startswith("media/https") or s.startswith("/media/https"):
+        s = unquote(s)
+        for prefix in ("/media/", "media/"):
+            if s.startswith(prefix):
+                s = s[len(prefix):]
+                break
+        s = re.sub(r"^(https?):/(?!/)", r"\1://", s)
+    return s
+
+
+def media_url(field_file):
+    """
+    Trả về URL hiển thị cho 1 FileField / ImageField:
+    - Nếu DB lưu trực tiếp URL (kể cả dạng encode lỗi) -> trả URL đó
+    - Nếu là file trong storage -> dùng storage .url (Cloudinary hoặc local)
+    """
+    if not field_file:
+        return None
+    s = decode_media_name(field_file.name)
+    if _is_url(s):
+        return "https:" + s if s.startswith("//") else s
+    try:
+        return field_file.url
+    except Exception:
+        return None
+
+
+def _sync_media_src(obj, file_field, src_field):
+    """
+    Tính URL 1 lần lúc ghi và lưu vào cột src (sau khi storage đã lưu file).
+    Trả về True nếu URL thay đổi.
+    """
+    url = media_url(getattr(obj, file_field)) or ""
+    if getattr(obj, src_field) != url:
+        setattr(obj, src_field, url)
+        type(obj).objects.filter(pk=obj.pk).update(**{src_field: url})
+        return True
+    return False
+
+
+def _schedule_image_variants(obj):
+    """
+    Ảnh vừa đổi -> sinh biến thể responsive cho srcset:
+    - Ảnh Cloudinary: chỉ ghép transformation URL, lưu ngay
+    - Ảnh trong storage khác: Celery task resize bằng Pillow
+    Kèm kích thước gốc + placeholder LQIP (Celery task đọc ảnh 1 lần).
+    """
+    values = _existing_image_data(obj) if obj.image else None
+    if values is None:
+        # chưa có sẵn: Cloudinary -> ghép transformation URL ngay, kích thước + LQIP để task làm
+        values = {
+            "image_variants": cloudinary_variants(obj.image_src),
+            "image_width": None,
+            "image_height": None,
+            "image_lqip": "",
+        }
+    for k, v in values.items():
+        setattr(obj, k, v)
+    type(obj).objects.filter(pk=obj.pk).update(**values)
+    if not obj.image or obj.image_lqip:
+        return
+
+    from .tasks import generate_image_variants, run_task
+
+    label, pk = obj._meta.label, obj.pk
+    transaction.on_commit(lambda: run_task(generate_image_variants, label, pk))
+
+
+def _schedule_video_meta(obj, field):
+    """
+    Video vừa đổi -> xóa metadata cũ rồi lấy duration / kích thước / poster mới:
+    - Video Cloudinary: poster là transformation URL, lưu ngay
+    - Video trong storage: Celery task đọc box MP4 + cắt poster bằng ffmpeg (nếu có)
+    """
+    video = getattr(obj, field)
+    values = {
+        "duration": None,
+        "width": None,
+        "height": None,
+        "poster": cloudinary_video_poster(media_url(video) or ""),
+    }
+    for k, v in values.items():
+        setattr(obj, k, v)
+    type(obj).objects.filter(pk=obj.pk).update(**values)
+    if not video or values["poster"] or _is_url(decode_media_name(video.name)):
+        return
+
+    from .tasks import extract_video_meta, run_task
+
+    label, pk = obj._meta.label, obj.pk
+    transaction.on_commit(lambda: run_task(extract_video_meta, label, pk, field))
+
+
+IMAGE_DATA_FIELDS = ("image_variants", "image_width", "image_height", "image_lqip")
+
+
+def _existing_image_data(obj):
+    """
+    File dùng chung (MediaBlob) đã xử lý ở bản ghi khác -> dùng lại biến thể / kích thước / LQIP
+    lưu trên MediaBlob (1 query theo index mediablob_name_idx), không đọc / resize lại.
+    """
+    data = MediaBlob.objects.filter(name=obj.image.name).values_list("image_data", flat=True).first()
+    if data and data.get("image_variants") and data.get("image_lqip"):
+        return {k: data.get(k) for k in IMAGE_DATA_FIELDS}
+    return None
+
+
+# ====================
+# Media: dedup theo nội dung (SHA-256)
+# ====================
+class MediaBlob(models.Model):
+    """
+    Registry file đã ghi vào storage, khóa theo SHA-256 nội dung.
+    Upload 1 file trùng nội dung với file đã có -> dùng lại file cũ, không ghi / upload lại.
+    """
+    sha256 = models.CharField("SHA-256", max_length=64, unique=True)
+    name = models.CharField("Tên file / URL", max_length=500)
+    size = models.BigIntegerField("Kích thước (bytes)", default=0)
+    # ảnh đã xử lý (generate_image_variants): image_variants / image_width / image_height / image_lqip
+    image_data = models.JSONField("Dữ liệu ảnh đã xử lý", default=dict, blank=True, editable=False)
+    created_at = models.DateTimeField("Ngày tạo", auto_now_add=True)
+
+    class Meta:
+        verbose_name = "File media"
+        verbose_name_plural = "Kho file media"
+        # _existing_image_data: tìm theo tên file đang gắn vào Product / ProductImage
+        indexes = [models.Index(fields=["name"], name="mediablob_name_idx")]
+
+    def __str__(self):
+        return f"{self.name} ({self.sha256[:12]})"
+
+    def is_available(self, storage):
+        if _is_url(decode_media_name(self.name)):
+            return True
+        try:
+            return storage.exists(self.name)
+        except Exception:
+            return False
+
+    @classmethod
+    def store(cls, storage, name, content, max_length=None):
+        """
+        Ghi `content` vào `storage` qua registry. Trả về tên file trong storage
+        (tên của file cũ nếu nội dung đã tồn tại).
+        """
+        content.seek(0)
+        sha256 = file_sha256(content)
+        content.seek(0)
+
+        blob = cls.objects.filter(sha256=sha256).first()
+        if blob and blob.is_available(storage):
+            return blob.name
+
+        stored = storage.save(name, content, max_length=max_length)
+        try:
+            with transaction.atomic():
+                cls.objects.update_or_create(
+                    sha256=sha256, defaults={"name": stored, "size": getattr(content, "size", 0) or 0}
+                )
+        except IntegrityError:
+            # request khác vừa đăng ký cùng nội dung -> giữ bản ghi của request đó
+            pass
+        return stored
+
+
+class DedupFieldFile(FieldFile):
+    """FieldFile ghi file qua MediaBlob thay vì gọi thẳng storage.save."""
+
+    def save(self, name, content, save=True):
+        name = self.field.generate_filename(self.instance, name)
+        self.name = MediaBlob.store(self.storage, name, content, max_length=self.field.max_length)
+        self._set_instance_attribute(self.name, content)
+        self._committed = True
+
+        if save:
+            self.instance.save()
+
+
+class DedupImageFieldFile(DedupFieldFile, ImageFieldFile):
+    pass
+
+
+class DedupFileField(models.FileField):
+    attr_class = DedupFieldFile
+
+
+class DedupImageField(models.ImageField):
+    attr_class = DedupImageFieldFile
+
+
 # ====================
 # Khách hàng
 # ====================
@@ -69,7 +271,12 @@ class Product(models.Model):
 
     size = models.CharField("Diện tích", max_length=50, null=True, blank=True)
     description = models.TextField("Mô tả", null=True, blank=True)
-    image = models.ImageField(upload_to="products/", null=True, blank=True, verbose_name="Ảnh chính")
+    image = DedupImageField(upload_to="products/", null=True, blank=True, verbose_name="Ảnh chính")
+    image_src = models.CharField("URL ảnh chính", max_length=500, blank=True, default="", editable=False)
+    image_variants = models.JSONField("Biến thể ảnh (srcset)", default=dict, blank=True, editable=False)
+    image_width = models.PositiveIntegerField("Chiều rộng ảnh", null=True, blank=True, editable=False)
+    image_height = models.PositiveIntegerField("Chiều cao ảnh", null=True, blank=True, editable=False)
+    image_lqip = models.TextField("Ảnh placeholder (LQIP)", blank=True, default="", editable=False)
     views = models.PositiveIntegerField("Lượt xem", default=0)
 
     # ====== Khuyến mãi ======
@@ -79,6 +286,18 @@ class Product(models.Model):
         verbose_name = "Sản phẩm"
         verbose_name_plural = "Danh sách sản phẩm"
         ordering = ["-id"]
+        # theo đúng các kiểu lọc / sắp xếp ở product_page, home, product_detail
+        indexes = [
+            # lọc quận (+ loại), sắp xếp mặc định mới nhất
+            models.Index(fields=["district", "category", "-id"], name="product_district_cat_id_idx"),
+            # lọc loại + khoảng giá / sắp xếp theo giá; sản phẩm liên quan (cùng loại, mới nhất)
+            models.Index(fields=["category", "price"], name="product_category_price_idx"),
+            models.Index(fields=["category", "-id"], name="product_category_id_idx"),
+            # chỉ lọc khoảng giá / sắp xếp theo giá
+            models.Index(fields=["price"], name="product_price_idx"),
+            # "Đang giảm giá" ở trang chủ: chỉ index các sản phẩm có giảm giá
+            models.Index(fields=["-id"], name="product_on_sale_idx", condition=Q(discount_percent__gt=0)),
+        ]
 
     def __str__(self):
         return f"{self.name} - {self.gia_hien_thi}"
@@ -97,116 +316,144 @@ class Product(models.Model):
             return f"{self.gia_giam:,.0f} VNĐ (giảm {self.discount_percent}%)"
         return f"{self.price:,.0f} VNĐ" if self.price else "Liên hệ"
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        if _sync_media_src(self, "image", "image_src"):
+            _schedule_image_variants(self)
+
     @property
     def image_url(self):
         """
-        Trả về URL an toàn cho ảnh chính:
-        - Nếu field lưu trực tiếp URL string -> trả thẳng
-        - Nếu là FieldFile (ImageField) -> trả image.url (nếu có)
-        - Nếu DB lưu dạng encode 'media/https%3A/...' -> decode
+        URL ảnh chính, đã chuẩn hóa lúc lưu (cột image_src) nên không phải parse lại mỗi lần render.
+        Fallback tính trực tiếp cho bản ghi chưa có image_src (vd. tạo bằng bulk_create).
         """
-        if not self.image:
-            return None
-
-        s = str(self.image)
+        if self.image_src:
+            return self.image_src
+        return media_url(self.image)
 
-        # fix trường hợp lưu dạng media/https%3A/...
-        if "%3A" in s or s.startswith("media/https") or s.startswith("/media/https"):
-            s = unquote(s)
-            s = s.replace('/media/', '').replace('media/', '')
-
-        # nếu đã là URL -> trả luôn
-        if _is_url(s):
-            # ensure scheme present (some values may start with //)
-            if s.startswith("//"):
-                return "https:" + s
-            return s
-
-        # else try to use Django storage .url (works for Cloudinary storage or local)
-        try:
-            return self.image.url
-        except Exception:
-            return None
-        
-    @property
+    @cached_property
     def get_all_images(self):
         """
         Lấy list các URL ảnh (ảnh chính + ảnh phụ) dạng string.
         Bỏ qua các đường dẫn local bắt đầu bằng '/media/' nếu không hợp lệ.
+        Tính 1 lần / instance; dùng prefetch_related("images") nếu view đã prefetch.
         """
         images = []
 
-        # ảnh chính (product.image_url đã xử lý trong property image_url)
-        try:
-            if self.image_url:
-                if str(self.image_url).startswith("http"):
-                    images.append(self.image_url)
-        except Exception:
-            pass
+        # ảnh chính (đã chuẩn hóa sẵn trong image_url)
+        if self.image_url and self.image_url.startswith("http"):
+            images.append(self.image_url)
 
         # ảnh phụ
         for img in self.images.all():
-            u = getattr(img, "image_url", None)
-            if not u:
-                continue
-            s = str(u).strip()
-            if s.startswith("http://") or s.startswith("https://"):
-                images.append(s)
+            u = (img.image_url or "").strip()
+            if u.startswith("http://") or u.startswith("https://"):
+                images.append(u)
 
         return images
 
 
 class ProductImage(models.Model):
     product = models.ForeignKey(Product, related_name="images", on_delete=models.CASCADE)
-    image = models.ImageField(upload_to="products/", verbose_name="Ảnh phụ")
+    image = DedupImageField(upload_to="products/", verbose_name="Ảnh phụ")
+    image_src = models.CharField("URL ảnh", max_length=500, blank=True, default="", editable=False)
+    image_variants = models.JSONField("Biến thể ảnh (srcset)", default=dict, blank=True, editable=False)
+    image_width = models.PositiveIntegerField("Chiều rộng ảnh", null=True, blank=True, editable=False)
+    image_height = models.PositiveIntegerField("Chiều cao ảnh", null=True, blank=True, editable=False)
+    image_lqip = models.TextField("Ảnh placeholder (LQIP)", blank=True, default="", editable=False)
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        if _sync_media_src(self, "image", "image_src"):
+            _schedule_image_variants(self)
 
     @property
     def image_url(self):
-        if not self.image:
-            return None
-        s = str(self.image)
-        if "%3A" in s or s.startswith("media/https") or s.startswith("/media/https"):
-            s = unquote(s).replace('/media/', '').replace('media/', '')
-        if _is_url(s):
-            if s.startswith("//"):
-                return "https:" + s
-            return s
-        try:
-            return self.image.url
-        except Exception:
-            return None
+        if self.image_src:
+            return self.image_src
+        return media_url(self.image)
 
 
 # ProductVideo
 class ProductVideo(models.Model):
     product = models.ForeignKey(Product, related_name="videos", on_delete=models.CASCADE)
-    video = models.FileField(upload_to="products/videos/", verbose_name="Video sản phẩm")
+    video = DedupFileField(upload_to="products/videos/", verbose_name="Video sản phẩm")
+    video_src = models.CharField("URL video", max_length=500, blank=True, default="", editable=False)
+    duration = models.FloatField("Thời lượng (giây)", null=True, blank=True, editable=False)
+    width = models.PositiveIntegerField("Chiều rộng", null=True, blank=True, editable=False)
+    height = models.PositiveIntegerField("Chiều cao", null=True, blank=True, editable=False)
+    poster = DedupImageField("Ảnh poster", upload_to="products/videos/posters/", blank=True, null=True, editable=False)
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        if _sync_media_src(self, "video", "video_src"):
+            _schedule_video_meta(self, "video")
 
     @property
     def video_url(self):
-        if not self.video:
-            return None
-        s = str(self.video)
-        if "%3A" in s or s.startswith("media/https") or s.startswith("/media/https"):
-            s = unquote(s).replace('/media/', '').replace('media/', '')
-        if _is_url(s):
-            if s.startswith("//"):
-                return "https:" + s
-            return s
-        try:
-            return self.video.url
-        except Exception:
-            return None
+        if self.video_src:
+            return self.video_src
+        return media_url(self.video)
+
+    @property
+    def poster_url(self):
+        return media_url(self.poster)
 
 # ====================
 # Đơn hàng
 # ====================
+MONEY_FIELD = models.DecimalField(max_digits=20, decimal_places=0)
+
+
+def line_total(prefix=""):
+    """
+    Biểu thức SQL thành tiền 1 dòng chi tiết đơn hàng, cùng công thức với
+    Product.gia_giam * quantity. `prefix` là đường dẫn từ model đang query tới OrderItem.
+    """
+    unit_price = Floor(
+        F(f"{prefix}product__price") * (100 - F(f"{prefix}product__discount_percent")) / 100
+    )
+    return unit_price * F(f"{prefix}quantity")
+
+
+class OrderQuerySet(models.QuerySet):
+    def with_totals(self):
+        """
+        Tính tổng tiền / tổng số lượng ngay trong SQL (1 query cho cả trang danh sách).
+        Dùng subquery tương quan thay vì JOIN + GROUP BY: COUNT(*) của changelist admin
+        vẫn là COUNT thường, không phải bọc cả query GROUP BY trong subquery.
+        """
+        items = OrderItem.objects.filter(order=OuterRef("pk")).order_by().values("order")
+        return self.annotate(
+            total_amount=Coalesce(
+                Subquery(items.annotate(s=Sum(line_total())).values("s"), output_field=MONEY_FIELD),
+                Value(0, output_field=MONEY_FIELD),
+            ),
+            total_quantity=Coalesce(
+                Subquery(items.annotate(s=Sum("quantity")).values("s"), output_field=models.IntegerField()),
+                0,
+            ),
+        )
+
+    def open_cart(self, customer, create=True):
+        """
+        Giỏ hàng (đơn complete=False) của customer: 1 query qua index one_open_order_per_customer.
+        create=True: chưa có thì tạo. 2 request cùng tạo -> request sau vướng unique constraint,
+        get_or_create tự bắt IntegrityError (trong savepoint) và đọc lại giỏ của request trước.
+        """
+        if create:
+            return self.get_or_create(customer=customer, complete=False)[0]
+        return self.filter(customer=customer, complete=False).first()
+
+
 class Order(models.Model):
+    # index riêng cho customer_id thừa: order_customer_complete_idx bắt đầu bằng customer
     customer = models.ForeignKey(
-        Customer, on_delete=models.SET_NULL, blank=True, null=True, verbose_name="Khách hàng"
+        Customer, on_delete=models.SET_NULL, blank=True, null=True, verbose_name="Khách hàng", db_index=False
     )
     date_order = models.DateTimeField("Ngày đặt hàng", auto_now_add=True)
     complete = models.BooleanField("Hoàn thành", default=False)
+    completed_at = models.DateTimeField("Ngày hoàn tất", null=True, blank=True, db_index=True, editable=False)
     transaction_id = models.CharField("Mã giao dịch", max_length=200, null=True, blank=True)
 
     shipping_address = models.ForeignKey(
@@ -218,20 +465,45 @@ class Order(models.Model):
         verbose_name="Địa chỉ giao hàng"
     )
 
+    objects = OrderQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Đơn hàng"
         verbose_name_plural = "Danh sách đơn hàng"
         ordering = ["-date_order"]
+        indexes = [
+            # lịch sử đơn (customer, complete=True) mới nhất trước; giỏ hàng dùng one_open_order_per_customer
+            models.Index(fields=["customer", "complete", "-date_order"], name="order_customer_complete_idx"),
+        ]
+        constraints = [
+            # mỗi customer chỉ 1 giỏ hàng đang mở (xem OrderQuerySet.open_cart)
+            models.UniqueConstraint(
+                fields=["customer"], condition=Q(complete=False), name="one_open_order_per_customer"
+            ),
+        ]
 
     def __str__(self):
-        return f"Đơn hàng #{self.id} ({self.tong_san_pham} SP - {self.tong_tien:,.0f} VNĐ)"
+        # không query thêm: __str__ được gọi ở mọi select / danh sách admin có FK tới đơn hàng
+        return f"Đơn hàng #{self.id}"
+
+    def save(self, *args, **kwargs):
+        # mốc thời gian chốt đơn, dùng cho thống kê doanh thu theo ngày
+        if self.complete and self.completed_at is None:
+            self.completed_at = timezone.now()
+            if kwargs.get("update_fields") is not None:
+                kwargs["update_fields"] = {*kwargs["update_fields"], "completed_at"}
+        super().save(*args, **kwargs)
 
     @property
     def tong_tien(self):
+        if "total_amount" in self.__dict__:  # đã annotate bằng with_totals()
+            return int(self.total_amount)
         return sum(item.thanh_tien for item in self.orderitem_set.all())
 
     @property
     def tong_san_pham(self):
+        if "total_quantity" in self.__dict__:
+            return self.total_quantity
         return self.orderitem_set.aggregate(total=Sum("quantity"))["total"] or 0
 
 
@@ -280,6 +552,136 @@ class ShippingAddress(models.Model):
         return f"{self.address}, {self.city} ({self.mobile or 'Không có số'})"
 
 
+# ====================
+# Thống kê doanh thu (bảng tổng hợp)
+# ====================
+class SalesDaily(models.Model):
+    """
+    Doanh thu tổng hợp theo ngày × quận × loại sản phẩm (đơn đã hoàn tất, theo ngày chốt đơn).
+    Do Celery beat (rollup_sales_daily) tính lại vài ngày gần nhất; dashboard admin
+    chỉ đọc bảng này (vài trăm dòng) thay vì quét toàn bộ lịch sử đơn hàng.
+
+    Chỉ lưu số liệu cộng dồn được qua mọi chiều (dòng đơn, số lượng, doanh thu): 1 đơn có
+    sản phẩm ở nhiều quận / loại nằm ở nhiều dòng, nên số đơn thật lưu riêng ở OrdersDaily.
+    """
+    date = models.DateField("Ngày", db_index=True)
+    district = models.CharField("Quận", max_length=100, blank=True, default="")
+    category = models.CharField("Loại", max_length=20, choices=Product.CATEGORY_CHOICES, blank=True, default="")
+    order_lines = models.PositiveIntegerField("Số dòng đơn", default=0)
+    units = models.PositiveIntegerField("Số lượng", default=0)
+    revenue = models.DecimalField("Doanh thu (VNĐ)", max_digits=16, decimal_places=0, default=0)
+    updated_at = models.DateTimeField("Cập nhật lúc", auto_now=True)
+
+    class Meta:
+        verbose_name = "Doanh thu theo ngày"
+        verbose_name_plural = "Thống kê doanh thu"
+        ordering = ["-date", "district", "category"]
+        constraints = [
+            models.UniqueConstraint(fields=["date", "district", "category"], name="unique_sales_daily")
+        ]
+
+    def __str__(self):
+        return f"{self.date} - {self.district or '—'} / {self.category or '—'}: {self.revenue:,.0f} VNĐ"
+
+    @classmethod
+    def rebuild(cls, since=None, until=None):
+        """
+        Tính lại các ngày từ `since` tới `until` (date, until=None -> tới nay); since=None -> toàn bộ.
+        Đơn chốt hôm nay luôn rơi vào ngày hôm nay nên chỉ cần tính lại vài ngày cuối
+        (xóa đơn cũ hơn thì _rollup_on_order_delete tính lại riêng ngày đó).
+        Trả về số dòng tổng hợp (SalesDaily) đã ghi.
+        """
+        done = Order.objects.filter(complete=True, completed_at__isnull=False)
+        items = OrderItem.objects.filter(order__complete=True, order__completed_at__isnull=False)
+        if since is not None:
+            done = done.filter(completed_at__date__gte=since)
+            items = items.filter(order__completed_at__date__gte=since)
+        if until is not None:
+            done = done.filter(completed_at__date__lte=until)
+            items = items.filter(order__completed_at__date__lte=until)
+        rows = (
+            items.annotate(
+                day=TruncDate("order__completed_at"),
+                district_name=Coalesce("product__district", Value("")),
+                category_name=Coalesce("product__category", Value("")),
+            )
+            .values("day", "district_name", "category_name")
+            .annotate(
+                n_lines=Count("id"),
+                n_units=Sum("quantity"),
+                amount=Sum(line_total(), output_field=MONEY_FIELD),
+            )
+            .order_by()
+        )
+        objs = [
+            cls(
+                date=r["day"],
+                district=r["district_name"],
+                category=r["category_name"],
+                order_lines=r["n_lines"],
+                units=r["n_units"] or 0,
+                revenue=r["amount"] or 0,
+            )
+            for r in rows
+        ]
+        day_orders = [
+            OrdersDaily(date=r["day"], orders=r["n"])
+            for r in done.annotate(day=TruncDate("completed_at")).values("day").annotate(n=Count("id")).order_by()
+        ]
+        with transaction.atomic():
+            for model in (cls, OrdersDaily):
+                stale = model.objects.all()
+                if since is not None:
+                    stale = stale.filter(date__gte=since)
+                if until is not None:
+                    stale = stale.filter(date__lte=until)
+                stale.delete()
+            cls.objects.bulk_create(objs, batch_size=500)
+            OrdersDaily.objects.bulk_create(day_orders, batch_size=500)
+        return len(objs)
+
+
+class OrdersDaily(models.Model):
+    """Số đơn hoàn tất theo ngày (mỗi đơn đúng 1 lần), ghi cùng lúc với SalesDaily.rebuild()."""
+    date = models.DateField("Ngày", unique=True)
+    orders = models.PositiveIntegerField("Số đơn", default=0)
+
+    class Meta:
+        verbose_name = "Số đơn theo ngày"
+        verbose_name_plural = "Số đơn theo ngày"
+        ordering = ["-date"]
+
+    def __str__(self):
+        return f"{self.date}: {self.orders} đơn"
+
+
+@receiver(post_delete, sender=Order, dispatch_uid="sales_rollup_on_order_delete")
+def _rollup_on_order_delete(sender, instance, using=None, **kwargs):
+    """
+    Xóa đơn đã chốt (delete_order / admin) -> tính lại ngày chốt đơn đó sau khi commit.
+    Ngày nằm trong cửa sổ SALES_ROLLUP_DAYS thì beat tự tính lại, không cần gửi task.
+    """
+    if not instance.complete or instance.completed_at is None:
+        return
+    day = instance.completed_at.date()
+    window = getattr(settings, "SALES_ROLLUP_DAYS", 2)
+    if day > timezone.now().date() - timedelta(days=window):
+        return
+    conn = transaction.get_connection(using)
+    days = conn.__dict__.setdefault("_sales_rollup_days", set())
+    if day in days:
+        return
+    days.add(day)
+
+    def rollup():
+        from .tasks import rollup_sales_daily, run_task
+
+        conn.__dict__.get("_sales_rollup_days", set()).discard(day)
+        run_task(rollup_sales_daily, None, False, day.isoformat())
+
+    transaction.on_commit(rollup, using=using)
+
+
 # ====================
 # Wishlist & Bình luận
 # ====================
@@ -295,13 +697,18 @@ class Wishlist(models.Model):
             models.UniqueConstraint(fields=["user", "product"], name="unique_user_product")
         ]
         ordering = ["-date_added"]
+        # unique_user_product đã phục vụ filter(user=...).count(); index này cho trang wishlist (mới nhất trước)
+        indexes = [
+            models.Index(fields=["user", "-date_added"], name="wishlist_user_added_idx"),
+        ]
 
     def __str__(self):
         return f"{self.user.username} ❤ {self.product.name}"
 
 
 class Comment(models.Model):
-    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="comments")
+    # index riêng cho product_id thừa: comment_product_created_idx bắt đầu bằng product
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="comments", db_index=False)
     name = models.CharField("Tên người bình luận", max_length=100, blank=True, null=True)  # 🆕 thêm dòng này
     user = models.ForeignKey(Customer, on_delete=models.SET_NULL, null=True, blank=True)
     content = models.TextField("Nội dung bình luận")
@@ -311,6 +718,10 @@ class Comment(models.Model):
         verbose_name = "Bình luận"
         verbose_name_plural = "Danh sách bình luận"
         ordering = ["-created_at"]
+        indexes = [
+            # prefetch bình luận ở trang chi tiết sản phẩm (mới nhất trước)
+            models.Index(fields=["product", "-created_at"], name="comment_product_created_idx"),
+        ]
 
     def __str__(self):
         return f"{self.user.name if self.user else 'Khách'} - {self.product.name}"
@@ -344,10 +755,13 @@ class DirectChatMessage(models.Model):
         ("admin", "Admin"),
     )
 
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="direct_chats")
+    # index riêng cho user_id thừa: directchat_user_created_idx / directchat_user_id_idx bắt đầu bằng user
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="direct_chats", db_index=False)
     sender = models.CharField("Người gửi", max_length=10, choices=SENDER_CHOICES)
     message = models.TextField("Nội dung tin nhắn", blank=True, null=True)
-    image = models.ImageField("Ảnh", upload_to="chat_images/", blank=True, null=True)
+    image = DedupImageField("Ảnh", upload_to="chat_images/", blank=True, null=True)
+    thumbnail = DedupImageField("Ảnh thu nhỏ", upload_to="chat_images/thumbs/", blank=True, null=True)
+    image_pending = models.BooleanField("Ảnh đang tải lên", default=False)
     is_read = models.BooleanField("Đã đọc", default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -355,12 +769,140 @@ class DirectChatMessage(models.Model):
         verbose_name = "Tin nhắn trực tiếp"
         verbose_name_plural = "Hộp thoại trực tiếp"
         ordering = ["created_at"]
+        indexes = [
+            # trang chat của user (cũ -> mới)
+            models.Index(fields=["user", "created_at"], name="directchat_user_created_idx"),
+            # API get_direct_messages: user + id < cursor, mới nhất trước
+            models.Index(fields=["user", "-id"], name="directchat_user_id_idx"),
+            # Conversation.mark_read: chỉ các tin user gửi chưa đọc
+            models.Index(
+                fields=["user"], name="directchat_unread_idx",
+                condition=Q(sender="user", is_read=False),
+            ),
+        ]
 
     def __str__(self):
         if self.message:
             return f"{self.user.username} - {self.sender}: {self.message[:20]}"
         return f"{self.user.username} - {self.sender}: 📷 Hình ảnh"
 
+    def save(self, *args, **kwargs):
+        is_new = self._state.adding
+        super().save(*args, **kwargs)
+        if is_new:
+            # cập nhật bảng tóm tắt hội thoại ngay khi có tin nhắn mới
+            Conversation.record_message(self)
+
+
+class Conversation(models.Model):
+    """
+    Bảng tóm tắt hội thoại (1 dòng / user), cập nhật mỗi khi có DirectChatMessage mới.
+    Trang hộp thư admin chỉ cần đọc bảng này thay vì gom nhóm toàn bộ tin nhắn.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="conversation", verbose_name="Người dùng")
+    last_message = models.TextField("Tin nhắn gần nhất", blank=True, default="")
+    last_sender = models.CharField("Người gửi cuối", max_length=10, choices=DirectChatMessage.SENDER_CHOICES, blank=True)
+    last_time = models.DateTimeField("Thời gian cuối", null=True, blank=True, db_index=True)
+    total_messages = models.PositiveIntegerField("Tổng tin nhắn", default=0)
+    unread_count = models.PositiveIntegerField("Chưa đọc", default=0)
+
+    class Meta:
+        verbose_name = "Hội thoại"
+        verbose_name_plural = "Hộp thư hội thoại"
+        ordering = ["-last_time"]
+
+    def __str__(self):
+        return f"{self.user.username} ({self.total_messages} tin nhắn)"
+
+    @staticmethod
+    def snippet_for(msg):
+        if msg.message:
+            return msg.message[:140] + ("..." if len(msg.message) > 140 else "")
+        return "📷 Hình ảnh" if msg.image or msg.image_pending else ""
+
+    @classmethod
+    def record_message(cls, msg):
+        """Cộng dồn 1 tin nhắn mới vào dòng hội thoại của user (tạo mới nếu chưa có)."""
+        unread = 1 if msg.sender == "user" and not msg.is_read else 0
+        values = {
+            "last_message": cls.snippet_for(msg),
+            "last_sender": msg.sender,
+            "last_time": msg.created_at,
+        }
+        updated = cls.objects.filter(user_id=msg.user_id).update(
+            total_messages=F("total_messages") + 1,
+            unread_count=F("unread_count") + unread,
+            **values,
+        )
+        if updated:
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(user_id=msg.user_id, total_messages=1, unread_count=unread, **values)
+        except IntegrityError:
+            # request khác vừa tạo dòng hội thoại -> cộng dồn như bình thường
+            cls.objects.filter(user_id=msg.user_id).update(
+                total_messages=F("total_messages") + 1,
+                unread_count=F("unread_count") + unread,
+                **values,
+            )
+
+    @classmethod
+    def refresh(cls, user_id, using=None):
+        """
+        Tính lại dòng hội thoại từ tin nhắn hiện có (sau khi xóa tin nhắn / nạp fixture bằng
+        streamload); user có tin nhắn mà chưa có dòng hội thoại thì tạo mới.
+        """
+        messages = DirectChatMessage.objects.using(using).filter(user_id=user_id)
+        stats = messages.aggregate(
+            total=Count("id"), unread=Count("id", filter=Q(sender="user", is_read=False)),
+        )
+        last = messages.order_by("-id").first()
+        values = {
+            "total_messages": stats["total"],
+            "unread_count": stats["unread"],
+            "last_message": cls.snippet_for(last) if last else "",
+            "last_sender": last.sender if last else "",
+            "last_time": last.created_at if last else None,
+        }
+        conversations = cls.objects.using(using).filter(user_id=user_id)
+        if conversations.update(**values) or not stats["total"]:
+            return
+        try:
+            with transaction.atomic(using=conversations.db):
+                cls.objects.using(using).create(user_id=user_id, **values)
+        except IntegrityError:
+            conversations.update(**values)
+
+    @classmethod
+    def mark_read(cls, user):
+        """Admin đã mở hội thoại -> đánh dấu đã đọc tin nhắn của user."""
+        DirectChatMessage.objects.filter(user=user, sender="user", is_read=False).update(is_read=True)
+        cls.objects.filter(user=user).update(unread_count=0)
+
+
+@receiver(post_delete, sender=DirectChatMessage, dispatch_uid="conversation_refresh_on_delete")
+def _refresh_conversation(sender, instance, origin=None, using=None, **kwargs):
+    """
+    Gom user_id của các tin nhắn bị xóa, tính lại mỗi hội thoại 1 lần sau khi transaction commit
+    (xóa N tin nhắn của 1 user -> 1 lần refresh thay vì N).
+    """
+    # xóa user (1 object hay queryset trong admin) -> dòng hội thoại bị xóa theo (cascade)
+    if isinstance(origin, User) or (isinstance(origin, models.QuerySet) and origin.model is User):
+        return
+    conn = transaction.get_connection(using)
+    pending = conn.__dict__.setdefault("_conversation_refresh", set())
+    pending.add(instance.user_id)
+    # mỗi dòng 1 callback nhưng callback đầu tiên đã lấy hết user_id, các callback sau không query
+    transaction.on_commit(lambda: _flush_conversation_refresh(using), using=using)
+
+
+def _flush_conversation_refresh(using):
+    conn = transaction.get_connection(using)
+    user_ids = conn.__dict__.pop("_conversation_refresh", set())
+    for user_id in sorted(user_ids):
+        Conversation.refresh(user_id, using=using)
+
 
 # ====================
 # Video
@@ -368,9 +910,13 @@ class DirectChatMessage(models.Model):
 class Video(models.Model):
     title = models.CharField("Tiêu đề", max_length=200)
     description = models.TextField("Mô tả", blank=True, null=True)
-    file = models.FileField("Video", upload_to="videos/", blank=True, null=True)
+    file = DedupFileField("Video", upload_to="videos/", blank=True, null=True)
     url = models.URLField("Link video ngoài", blank=True, null=True)
-    thumbnail = models.ImageField("Ảnh đại diện", upload_to="videos/thumbnails/", blank=True, null=True)
+    thumbnail = DedupImageField("Ảnh đại diện", upload_to="videos/thumbnails/", blank=True, null=True)
+    duration = models.FloatField("Thời lượng (giây)", null=True, blank=True, editable=False)
+    width = models.PositiveIntegerField("Chiều rộng", null=True, blank=True, editable=False)
+    height = models.PositiveIntegerField("Chiều cao", null=True, blank=True, editable=False)
+    poster = DedupImageField("Ảnh poster (tự tạo)", upload_to="videos/posters/", blank=True, null=True, editable=False)
     created_at = models.DateTimeField("Ngày tạo", auto_now_add=True)
 
     class Meta:
@@ -381,6 +927,21 @@ class Video(models.Model):
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        # video mới / file mới upload (chưa ghi vào storage) / file bị xóa -> lấy lại metadata
+        if self.file:
+            file_changed = self._state.adding or not self.file._committed
+        else:
+            file_changed = self.duration is not None or bool(self.poster)
+        super().save(*args, **kwargs)
+        if file_changed:
+            _schedule_video_meta(self, "file")
+
+    @property
+    def poster_url(self):
+        """Ảnh đại diện do admin upload, nếu không có thì dùng poster tự cắt từ video."""
+        return media_url(self.thumbnail) or media_url(self.poster)
+
     @property
     def get_source(self):
         """Trả về link video (ưu tiên file upload, fallback sang url ngoài)"""
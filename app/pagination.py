@@ -0,0 +1,68 @@
+# app/pagination.py
+"""
+Paginator cho trang danh sách admin của các bảng lớn: trên PostgreSQL dùng số dòng ước lượng
+(pg_class.reltuples hoặc EXPLAIN) thay cho COUNT(*) quét cả bảng.
+"""
+import json
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import QuerySet
+from django.utils.functional import cached_property
+
+# dưới ngưỡng này COUNT(*) vẫn nhanh -> đếm chính xác
+ESTIMATED_COUNT_THRESHOLD = getattr(settings, "ADMIN_ESTIMATED_COUNT_THRESHOLD", 100_000)
+
+
+def estimate_count(queryset):
+    """
+    Ước lượng số dòng của queryset, trả về None nếu không ước lượng được (không phải PostgreSQL...).
+    - Không có điều kiện lọc: pg_class.reltuples (thống kê của ANALYZE / autovacuum)
+    - Có lọc (search, list_filter): số dòng planner dự đoán trong EXPLAIN
+    """
+    if not isinstance(queryset, QuerySet):
+        return None
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql":
+        return None
+
+    with connection.cursor() as cursor:
+        if not queryset.query.where:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+            # -1: bảng chưa từng được ANALYZE
+            return row[0] if row and row[0] >= 0 else None
+
+        sql, params = queryset.query.sql_with_params()
+        cursor.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Dùng cho ModelAdmin.paginator (kèm show_full_result_count = False).
+    Bảng nhỏ hoặc DB khác PostgreSQL: đếm chính xác như Paginator mặc định.
+    """
+
+    threshold = ESTIMATED_COUNT_THRESHOLD
+
+    def estimate(self):
+        try:
+            return estimate_count(self.object_list)
+        except Exception as e:
+            print(">>> estimate_count error:", repr(e))
+            return None
+
+    @cached_property
+    def count(self):
+        estimate = self.estimate()
+        if estimate is None or estimate < self.threshold:
+            return super().count
+        return estimate
@@ -0,0 +1,111 @@
+# app/presence.py
+"""
+Theo dõi trạng thái online của user cho chat trực tiếp.
+
+Mỗi kết nối websocket là 1 member "user_id:channel_name" trong sorted set,
+score = thời điểm hết hạn. Kết nối phải gửi heartbeat trước khi hết hạn,
+nếu không sẽ tự bị coi là offline (kể cả khi worker chết không kịp disconnect);
+expire() dọn các kết nối đó và trả về user vừa offline để consumer báo cho admin.
+- Production: Redis sorted set (dùng chung giữa các worker).
+- Test / dev với InMemoryChannelLayer: lưu trong bộ nhớ process.
+"""
+import time
+
+from django.conf import settings
+
+PRESENCE_TTL = getattr(settings, "PRESENCE_TTL", 60)  # giây
+PRESENCE_KEY = "chat:presence"
+
+
+def _member(user_id, channel_name):
+    return f"{user_id}:{channel_name}"
+
+
+def _user_ids(members):
+    ids = set()
+    for m in members:
+        if isinstance(m, bytes):
+            m = m.decode()
+        ids.add(int(m.split(":", 1)[0]))
+    return ids
+
+
+class MemoryPresenceStore:
+    """Lưu presence trong bộ nhớ process (dùng cho test / InMemoryChannelLayer)."""
+
+    def __init__(self, ttl=PRESENCE_TTL):
+        self.ttl = ttl
+        self._expiry = {}
+
+    async def touch(self, user_id, channel_name, now=None):
+        now = time.time() if now is None else now
+        self._expiry[_member(user_id, channel_name)] = now + self.ttl
+
+    async def remove(self, user_id, channel_name):
+        self._expiry.pop(_member(user_id, channel_name), None)
+
+    async def online_user_ids(self, now=None):
+        now = time.time() if now is None else now
+        return _user_ids(m for m, expiry in self._expiry.items() if expiry > now)
+
+    async def expire(self, now=None):
+        """Xóa kết nối quá hạn heartbeat, trả về các user không còn kết nối nào."""
+        now = time.time() if now is None else now
+        expired = [m for m, expiry in self._expiry.items() if expiry <= now]
+        for member in expired:
+            del self._expiry[member]
+        return _user_ids(expired) - _user_ids(self._expiry)
+
+    async def is_online(self, user_id, now=None):
+        return int(user_id) in await self.online_user_ids(now)
+
+
+class RedisPresenceStore:
+    """Lưu presence trong Redis sorted set (score = thời điểm hết hạn)."""
+
+    def __init__(self, url, ttl=PRESENCE_TTL, key=PRESENCE_KEY):
+        import redis.asyncio as redis
+
+        self.ttl = ttl
+        self.key = key
+        self.redis = redis.from_url(url)
+
+    async def touch(self, user_id, channel_name, now=None):
+        now = time.time() if now is None else now
+        await self.redis.zadd(self.key, {_member(user_id, channel_name): now + self.ttl})
+
+    async def remove(self, user_id, channel_name):
+        await self.redis.zrem(self.key, _member(user_id, channel_name))
+
+    async def online_user_ids(self, now=None):
+        now = time.time() if now is None else now
+        return _user_ids(await self.redis.zrangebyscore(self.key, f"({now}", "+inf"))
+
+    async def expire(self, now=None):
+        now = time.time() if now is None else now
+        # MULTI: member quá hạn chỉ 1 worker nhận được -> mỗi lần offline chỉ báo 1 lần
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.zrangebyscore(self.key, "-inf", now)
+            pipe.zremrangebyscore(self.key, "-inf", now)
+            pipe.zrange(self.key, 0, -1)
+            expired, _, remaining = await pipe.execute()
+        return _user_ids(expired) - _user_ids(remaining)
+
+    async def is_online(self, user_id, now=None):
+        return int(user_id) in await self.online_user_ids(now)
+
+
+_store = None
+
+
+def get_presence_store():
+    """Chọn backend theo channel layer đang cấu hình (Redis hay in-memory)."""
+    global _store
+    if _store is None:
+        backend = settings.CHANNEL_LAYERS.get("default", {}).get("BACKEND", "")
+        if "InMemoryChannelLayer" in backend:
+            _store = MemoryPresenceStore()
+        else:
+            _store = RedisPresenceStore(getattr(settings, "REDIS_URL", "redis://127.0.0.1:6379/0"))
+    return _store
+
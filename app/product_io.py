@@ -0,0 +1,236 @@
+# app/product_io.py
+"""
+Import / export danh sách sản phẩm dạng CSV hoặc JSONL (dùng trong ProductAdmin).
+- Import: đọc file từng dòng (không load cả file vào RAM), validate từng dòng,
+  bulk_create theo lô; dòng lỗi được ghi lại (số dòng + lý do) và bỏ qua.
+  Chạy trong Celery task import_products_file (admin chỉ lưu file vào staging rồi trả về),
+  mỗi lô commit xong thì gửi generate_image_variants cho các sản phẩm có ảnh.
+- Export: sinh từng dòng từ queryset.iterator() để trả về bằng StreamingHttpResponse.
+"""
+import csv
+import io
+import json
+import os
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from .media import cloudinary_variants, stage_upload, staging_storage
+from .models import Product, media_url
+
+# cột của file import / export (id chỉ có khi export)
+PRODUCT_FIELDS = (
+    "name",
+    "price",
+    "discount_percent",
+    "digital",
+    "category",
+    "district",
+    "location",
+    "size",
+    "description",
+    "image",
+)
+EXPORT_FIELDS = ("id",) + PRODUCT_FIELDS
+MODEL_FIELDS = [f.name for f in Product._meta.concrete_fields]
+IMPORT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 500
+# file import chờ worker xử lý + file kết quả, trong staging storage (chung với web)
+IMPORT_STAGING_PREFIX = "product_import"
+RESULT_SUFFIX = ".result.json"
+
+FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "jsonl": "application/x-ndjson; charset=utf-8",
+}
+
+
+class ImportResult:
+    def __init__(self):
+        self.created = 0
+        self.failed = 0
+        self.errors = []  # [(số dòng, lỗi)], tối đa MAX_REPORTED_ERRORS
+
+    def add_error(self, line, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+    def as_dict(self):
+        return {"ok": True, "created": self.created, "failed": self.failed, "errors": self.errors}
+
+
+# ====================
+# Import
+# ====================
+def detect_format(filename):
+    name = (filename or "").lower()
+    return "jsonl" if name.endswith((".jsonl", ".ndjson")) else "csv"
+
+
+def iter_rows(fileobj, fmt):
+    """Yield (số dòng, dict) từ file upload (bytes), đọc tuần tự từng dòng."""
+    text = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+    try:
+        if fmt == "jsonl":
+            for line_no, line in enumerate(text, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError as e:
+                    yield line_no, e
+                    continue
+                yield line_no, row if isinstance(row, dict) else ValueError("mỗi dòng phải là 1 object JSON")
+        else:
+            reader = csv.DictReader(text)
+            for row in reader:
+                # dòng 1 là header
+                yield reader.line_num, row
+    finally:
+        text.detach()
+
+
+def _to_bool(value):
+    if isinstance(value, bool):
+        return value
+    s = str(value or "").strip().lower()
+    if s in ("1", "true", "yes", "y", "có", "x"):
+        return True
+    if s in ("", "0", "false", "no", "n", "không"):
+        return False
+    raise ValidationError(f"giá trị không hợp lệ: {value!r}")
+
+
+def _to_price(value):
+    s = str(value if value is not None else "").strip().replace(".", "").replace(",", "").replace(" ", "")
+    if s.upper().endswith("VNĐ"):
+        s = s[:-3]
+    try:
+        return Decimal(s or 0)
+    except InvalidOperation:
+        raise ValidationError(f"giá không hợp lệ: {value!r}")
+
+
+def build_product(row):
+    """dict 1 dòng -> Product (chưa lưu) đã validate; lỗi -> ValidationError."""
+    data = {k: row.get(k) for k in PRODUCT_FIELDS if row.get(k) not in (None, "")}
+    errors = {}
+    for key, convert in (("price", _to_price), ("digital", _to_bool)):
+        if key in data:
+            try:
+                data[key] = convert(data[key])
+            except ValidationError as e:
+                errors[key] = e.messages
+    if errors:
+        raise ValidationError(errors)
+
+    product = Product(**data)
+    # chỉ validate các cột có trong file (cột bỏ trống dùng default của model)
+    product.full_clean(exclude=[f for f in MODEL_FIELDS if f not in data], validate_unique=False)
+    # bulk_create bỏ qua Product.save() -> tự điền URL ảnh đã chuẩn hóa
+    # (kích thước / LQIP / biến thể Pillow do generate_image_variants làm sau khi lô commit)
+    product.image_src = media_url(product.image) or ""
+    product.image_variants = cloudinary_variants(product.image_src)
+    return product
+
+
+def _schedule_image_variants(pks):
+    from .tasks import generate_image_variants, run_task
+
+    for pk in pks:
+        run_task(generate_image_variants, Product._meta.label, pk)
+
+
+def _error_message(exc):
+    if isinstance(exc, ValidationError) and hasattr(exc, "error_dict"):
+        return "; ".join(f"{field}: {' '.join(msgs)}" for field, msgs in exc.message_dict.items())
+    if isinstance(exc, ValidationError):
+        return " ".join(exc.messages)
+    return str(exc)
+
+
+def import_products(fileobj, fmt="csv", batch_size=IMPORT_BATCH_SIZE):
+    """Import sản phẩm từ file CSV / JSONL. Trả về ImportResult."""
+    result = ImportResult()
+    batch = []
+
+    def flush():
+        if batch:
+            with transaction.atomic():
+                Product.objects.bulk_create(batch, batch_size=batch_size)
+                pks = [p.pk for p in batch if p.image]
+                if pks:
+                    transaction.on_commit(lambda: _schedule_image_variants(pks))
+            result.created += len(batch)
+            batch.clear()
+
+    for line_no, row in iter_rows(fileobj, fmt):
+        if isinstance(row, Exception):
+            result.add_error(line_no, _error_message(row))
+            continue
+        try:
+            batch.append(build_product(row))
+        except (ValidationError, TypeError, ValueError) as e:
+            result.add_error(line_no, _error_message(e))
+            continue
+        if len(batch) >= batch_size:
+            flush()
+    flush()
+    return result
+
+
+def stage_import(upload):
+    """Lưu file upload vào staging storage; trả về job id (tên file) cho task + trang kết quả."""
+    return stage_upload(upload, prefix=IMPORT_STAGING_PREFIX)
+
+
+def valid_job(job):
+    return bool(job) and job.startswith(IMPORT_STAGING_PREFIX + "/") and ".." not in job
+
+
+def save_job_result(job, data):
+    from django.core.files.base import ContentFile
+
+    staging_storage().save(job + RESULT_SUFFIX, ContentFile(json.dumps(data, ensure_ascii=False).encode("utf-8")))
+
+
+def load_job_result(job):
+    """Kết quả import của job (dict), None nếu task chưa chạy xong."""
+    storage = staging_storage()
+    name = job + RESULT_SUFFIX
+    if not storage.exists(name):
+        return None
+    with storage.open(name, "rb") as fh:
+        return json.loads(fh.read().decode("utf-8"))
+
+
+def job_filename(job):
+    return os.path.basename(job)
+
+
+# ====================
+# Export
+# ====================
+class _Echo:
+    """File giả cho csv.writer: write() trả lại chuỗi thay vì ghi ra đâu đó."""
+
+    def write(self, value):
+        return value
+
+
+def export_rows(queryset, fmt="csv", chunk_size=2000):
+    """Generator các dòng CSV / JSONL cho StreamingHttpResponse."""
+    rows = queryset.order_by("id").values_list(*EXPORT_FIELDS).iterator(chunk_size=chunk_size)
+    if fmt == "jsonl":
+        for values in rows:
+            row = dict(zip(EXPORT_FIELDS, values))
+            row["price"] = int(row["price"] or 0)
+            yield json.dumps(row, ensure_ascii=False) + "\n"
+        return
+
+    writer = csv.writer(_Echo())
+    yield "\ufeff" + writer.writerow(EXPORT_FIELDS)  # BOM để Excel đọc đúng tiếng Việt
+    for values in rows:
+        yield writer.writerow(values)
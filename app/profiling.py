@@ -0,0 +1,263 @@
+# app/profiling.py
+"""
+Đo thời gian từng request theo view (bật bằng PROFILING_ENABLED = True):
+- wall time, số query + thời gian SQL (recorder dùng chung với metrics, app/request_sql.py),
+  thời gian render template, cache hit / miss
+- cộng dồn theo view trong RAM của process, xem ở /debug/profiling/ (chỉ staff)
+- header Server-Timing để xem ngay trong DevTools của trình duyệt
+- PROFILING_SAMPLE_RATE: tỉ lệ request được chạy dưới cProfile, file .prof ghi vào PROFILING_DIR
+  (xem bằng `python -m pstats file.prof` hoặc snakeviz)
+
+Tắt (mặc định) thì middleware tự gỡ khỏi chuỗi middleware (MiddlewareNotUsed), không tốn gì.
+"""
+import cProfile
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import JsonResponse
+from django.template.backends.django import Template as DjangoTemplate
+from django.views.decorators.http import require_http_methods
+
+from .request_sql import record_sql
+
+# số request gần nhất giữ lại mỗi view để tính p50 / p95
+RECENT_SAMPLES = 200
+_current = ContextVar("request_profile", default=None)
+
+
+class RequestProfile:
+    __slots__ = ("sql_count", "sql_ms", "template_ms", "template_depth", "cache_hits", "cache_misses")
+
+    def __init__(self):
+        self.sql_count = 0
+        self.sql_ms = 0.0
+        self.template_ms = 0.0
+        self.template_depth = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+
+# ====================
+# Số liệu cộng dồn theo view
+# ====================
+class ProfileStore:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = {}
+
+    def record(self, view, wall_ms, profile):
+        with self.lock:
+            row = self.views.get(view)
+            if row is None:
+                row = self.views[view] = {
+                    "requests": 0, "wall_ms": 0.0, "max_ms": 0.0, "sql_count": 0, "sql_ms": 0.0,
+                    "template_ms": 0.0, "cache_hits": 0, "cache_misses": 0,
+                    "recent": deque(maxlen=RECENT_SAMPLES),
+                }
+            row["requests"] += 1
+            row["wall_ms"] += wall_ms
+            row["max_ms"] = max(row["max_ms"], wall_ms)
+            row["sql_count"] += profile.sql_count
+            row["sql_ms"] += profile.sql_ms
+            row["template_ms"] += profile.template_ms
+            row["cache_hits"] += profile.cache_hits
+            row["cache_misses"] += profile.cache_misses
+            row["recent"].append(wall_ms)
+
+    def summary(self):
+        """Trung bình / request cho từng view, view tốn nhiều thời gian nhất lên đầu."""
+        with self.lock:
+            rows = {view: (dict(row), sorted(row["recent"])) for view, row in self.views.items()}
+        result = []
+        for view, (row, recent) in rows.items():
+            n = row["requests"]
+            other_ms = row["wall_ms"] - row["sql_ms"] - row["template_ms"]
+            result.append({
+                "view": view,
+                "requests": n,
+                "total_ms": round(row["wall_ms"], 1),
+                "avg_ms": round(row["wall_ms"] / n, 2),
+                "p50_ms": round(recent[(len(recent) - 1) // 2], 2),
+                "p95_ms": round(recent[max(0, -(-len(recent) * 95 // 100) - 1)], 2),
+                "max_ms": round(row["max_ms"], 2),
+                "avg_sql_queries": round(row["sql_count"] / n, 1),
+                "avg_sql_ms": round(row["sql_ms"] / n, 2),
+                "avg_template_ms": round(row["template_ms"] / n, 2),
+                "avg_other_ms": round(other_ms / n, 2),
+                "cache_hits": row["cache_hits"],
+                "cache_misses": row["cache_misses"],
+            })
+        return sorted(result, key=lambda r: -r["total_ms"])
+
+    def reset(self):
+        with self.lock:
+            self.views.clear()
+
+
+store = ProfileStore()
+
+
+# ====================
+# Đo template + cache (gắn 1 lần, chỉ ghi khi request hiện tại đang được đo)
+# ====================
+_instrumented = False
+_instrument_lock = threading.Lock()
+_MISSING = object()
+
+
+def _timed_render(render):
+    @wraps(render)
+    def wrapper(self, *args, **kwargs):
+        profile = _current.get()
+        if profile is None:
+            return render(self, *args, **kwargs)
+        # template lồng nhau (render_to_string trong template tag...) chỉ tính 1 lần ở ngoài cùng
+        profile.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return render(self, *args, **kwargs)
+        finally:
+            profile.template_depth -= 1
+            if profile.template_depth == 0:
+                profile.template_ms += (time.perf_counter() - started) * 1000
+    return wrapper
+
+
+def _counted_get(get):
+    @wraps(get)
+    def wrapper(self, key, default=None, version=None):
+        profile = _current.get()
+        if profile is None:
+            return get(self, key, default, version)
+        value = get(self, key, _MISSING, version)
+        if value is _MISSING:
+            profile.cache_misses += 1
+            return default
+        profile.cache_hits += 1
+        return value
+    return wrapper
+
+
+def _counted_get_many(get_many):
+    @wraps(get_many)
+    def wrapper(self, keys, version=None):
+        profile = _current.get()
+        if profile is None:
+            return get_many(self, keys, version)
+        keys = list(keys)
+        values = get_many(self, keys, version)
+        profile.cache_hits += len(values)
+        profile.cache_misses += len(keys) - len(values)
+        return values
+    return wrapper
+
+
+def install_instrumentation():
+    global _instrumented
+    with _instrument_lock:
+        if _instrumented:
+            return
+        DjangoTemplate.render = _timed_render(DjangoTemplate.render)
+        for backend in {type(caches[alias]) for alias in settings.CACHES}:
+            # get_many mặc định của BaseCache gọi lại get() -> chỉ bọc khi backend tự cài get_many
+            if "get" in vars(backend):
+                backend.get = _counted_get(backend.get)
+            if "get_many" in vars(backend):
+                backend.get_many = _counted_get_many(backend.get_many)
+        _instrumented = True
+
+
+# ====================
+# Middleware
+# ====================
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        if not getattr(settings, "PROFILING_ENABLED", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = float(getattr(settings, "PROFILING_SAMPLE_RATE", 0.0))
+        self.profile_dir = getattr(settings, "PROFILING_DIR", os.path.join(settings.BASE_DIR, "profiles"))
+        install_instrumentation()
+
+    def __call__(self, request):
+        profile = RequestProfile()
+        token = _current.set(profile)
+        profiler = self.start_profiler() if self.sample_rate and random.random() < self.sample_rate else None
+        started = time.perf_counter()
+        try:
+            with record_sql() as sql:
+                count, ms = sql.count, sql.ms
+                try:
+                    response = self.get_response(request)
+                finally:
+                    profile.sql_count = sql.count - count
+                    profile.sql_ms = sql.ms - ms
+        finally:
+            wall_ms = (time.perf_counter() - started) * 1000
+            if profiler:
+                profiler.disable()
+            _current.reset(token)
+
+        view = self.view_name(request)
+        store.record(view, wall_ms, profile)
+        if profiler:
+            self.dump(profiler, view, wall_ms)
+        response["Server-Timing"] = (
+            f'sql;dur={profile.sql_ms:.1f};desc="{profile.sql_count} queries", '
+            f"tpl;dur={profile.template_ms:.1f}, total;dur={wall_ms:.1f}"
+        )
+        return response
+
+    @staticmethod
+    def view_name(request):
+        match = getattr(request, "resolver_match", None)
+        if match is None:
+            return "<unresolved>"
+        # URL không đặt name -> "module.qualname" của view (không dùng thuộc tính private _func_path)
+        return match.view_name or f"{match.func.__module__}.{match.func.__qualname__}"
+
+    def start_profiler(self):
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError as e:
+            # thread khác đang chạy profiler (Python 3.12+: chỉ 1 profiler / process)
+            print(">>> profiling error:", repr(e))
+            return None
+        return profiler
+
+    def dump(self, profiler, view, wall_ms):
+        try:
+            os.makedirs(self.profile_dir, exist_ok=True)
+            name = re.sub(r"[^A-Za-z0-9_.-]+", "_", view)
+            path = os.path.join(self.profile_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{name}-{wall_ms:.0f}ms.prof")
+            profiler.dump_stats(path)
+        except OSError as e:
+            print(">>> profiling dump error:", repr(e))
+
+
+# ====================
+# Endpoint xem số liệu (staff)
+# ====================
+@staff_member_required
+@require_http_methods(["GET", "POST"])
+def profiling_stats(request):
+    """GET: số liệu theo view. POST: xóa số liệu để đo lại từ đầu."""
+    if request.method == "POST":
+        store.reset()
+    return JsonResponse({
+        "enabled": getattr(settings, "PROFILING_ENABLED", False),
+        "sample_rate": float(getattr(settings, "PROFILING_SAMPLE_RATE", 0.0)),
+        "pid": os.getpid(),
+        "views": store.summary(),
+    })
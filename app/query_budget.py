@@ -0,0 +1,109 @@
+# app/query_budget.py
+"""
+Giới hạn số query / thời gian SQL cho 1 đoạn code (thường là 1 request trong test):
+
+    with QueryBudget("cart", max_queries=8, max_sql_ms=50) as budget:
+        client.get("/cart/")
+    budget.check()   # vượt ngân sách -> QueryBudgetExceeded kèm danh sách query
+
+Báo lỗi gom các query cùng "dạng" (bỏ giá trị tham số) và đánh dấu dạng lặp lại
+-> N+1 hiện ra ngay (vd. "×12  SELECT ... FROM app_wishlist WHERE product_id = ?").
+QueryBudget.diff() so sánh 2 lần chạy (vd. ít dữ liệu vs nhiều dữ liệu) dạng unified diff.
+"""
+import difflib
+import re
+from collections import Counter
+
+from django.db import connection as default_connection
+from django.test.utils import CaptureQueriesContext
+
+# chuỗi '...', số, danh sách IN (...) -> ?
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST_RE = re.compile(r"\bIN \((?:\?, )*\?\)")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_sql(sql):
+    """Bỏ giá trị cụ thể khỏi câu SQL để các query cùng dạng gom lại được."""
+    sql = _STRING_RE.sub("?", sql)
+    sql = _NUMBER_RE.sub("?", sql)
+    sql = _IN_LIST_RE.sub("IN (...)", sql)
+    return _SPACE_RE.sub(" ", sql).strip()
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryBudget:
+    def __init__(self, label, max_queries=None, max_sql_ms=None, connection=None):
+        self.label = label
+        self.max_queries = max_queries
+        self.max_sql_ms = max_sql_ms
+        self.capture = CaptureQueriesContext(connection or default_connection)
+
+    def __enter__(self):
+        self.capture.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.capture.__exit__(exc_type, exc_value, traceback)
+
+    # -------------------
+    # Số liệu
+    # -------------------
+    @property
+    def queries(self):
+        return [q["sql"] for q in self.capture.captured_queries]
+
+    @property
+    def count(self):
+        return len(self.capture.captured_queries)
+
+    @property
+    def sql_ms(self):
+        return sum(float(q["time"]) for q in self.capture.captured_queries) * 1000
+
+    @property
+    def shapes(self):
+        return [normalize_sql(sql) for sql in self.queries]
+
+    def problems(self):
+        problems = []
+        if self.max_queries is not None and self.count > self.max_queries:
+            problems.append(f"{self.count} query (ngân sách {self.max_queries}, vượt {self.count - self.max_queries})")
+        if self.max_sql_ms is not None and self.sql_ms > self.max_sql_ms:
+            problems.append(f"{self.sql_ms:.1f} ms SQL (ngân sách {self.max_sql_ms} ms)")
+        return problems
+
+    def check(self):
+        problems = self.problems()
+        if problems:
+            raise QueryBudgetExceeded(f"{self.label}: " + "; ".join(problems) + "\n" + self.report())
+
+    # -------------------
+    # Báo cáo dễ đọc
+    # -------------------
+    def report(self, max_sql_chars=300):
+        """Các dạng query, dạng lặp lại (nghi N+1) lên đầu, kèm số lần và tổng thời gian."""
+        times = Counter()
+        for q in self.capture.captured_queries:
+            times[normalize_sql(q["sql"])] += float(q["time"]) * 1000
+        counts = Counter(self.shapes)
+
+        lines = [f"{self.count} query, {self.sql_ms:.1f} ms SQL:"]
+        for shape, n in sorted(counts.items(), key=lambda item: -item[1]):
+            mark = "⚠️ " if n > 1 else "   "
+            sql = shape if len(shape) <= max_sql_chars else shape[:max_sql_chars] + "…"
+            lines.append(f"{mark}×{n:<3} {times[shape]:7.1f} ms  {sql}")
+        return "\n".join(lines)
+
+    def diff(self, other):
+        """Unified diff dạng query giữa lần chạy này và `other` (thứ tự giữ nguyên)."""
+        return "\n".join(difflib.unified_diff(
+            self.shapes, other.shapes,
+            fromfile=f"{self.label} ({self.count} query)",
+            tofile=f"{other.label} ({other.count} query)",
+            lineterm="",
+        ))
@@ -0,0 +1,46 @@
+# app/ratelimit.py
+"""Bộ giới hạn tần suất dùng trong process (websocket chat, broadcast presence...)."""
+import time
+
+
+class Throttle:
+    """Giới hạn tần suất theo key: mỗi key chỉ được phép 1 lần / `interval` giây."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._last = {}
+
+    def allow(self, key, now=None):
+        now = time.monotonic() if now is None else now
+        last = self._last.get(key)
+        if last is not None and now - last < self.interval:
+            return False
+        self._last[key] = now
+        if len(self._last) > 10_000:
+            # dọn các key cũ để dict không phình mãi
+            cutoff = now - self.interval
+            self._last = {k: t for k, t in self._last.items() if t >= cutoff}
+        return True
+
+
+class TokenBucket:
+    """
+    Token bucket cho 1 kết nối: tối đa `capacity` lần liên tiếp,
+    sau đó hồi `rate` token / giây.
+    """
+
+    def __init__(self, capacity, rate):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def consume(self, amount=1, now=None):
+        now = time.monotonic() if now is None else now
+        elapsed = max(0.0, now - self.updated)
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+        self.updated = now
+        if self.tokens >= amount:
+            self.tokens -= amount
+            return True
+        return False
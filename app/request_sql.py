@@ -0,0 +1,57 @@
+# app/request_sql.py
+"""
+Đếm query SQL của request hiện tại bằng 1 execute_wrapper duy nhất / connection,
+dùng chung cho ProfilingMiddleware (app/profiling.py) và MetricsMiddleware (app/metrics.py):
+
+    with record_sql(on_query=histogram.observe) as sql:
+        start = sql.count
+        response = get_response(request)
+    queries = sql.count - start
+
+Middleware lồng bên trong dùng lại recorder của middleware ngoài (không bọc thêm lớp wrapper
+cho mỗi query), nên lấy hiệu số count / ms trước và sau đoạn mình đo.
+"""
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.db import connections
+
+_current = ContextVar("request_sql", default=None)
+
+
+class SQLRecorder:
+    __slots__ = ("count", "ms", "listeners")
+
+    def __init__(self):
+        self.count = 0
+        self.ms = 0.0
+        self.listeners = []  # hàm nhận thời gian (giây) của từng query
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            seconds = time.perf_counter() - started
+            self.count += 1
+            self.ms += seconds * 1000
+            for listener in self.listeners:
+                listener(seconds)
+
+
+@contextmanager
+def record_sql(on_query=None):
+    """Recorder của request hiện tại (tạo mới + gắn vào mọi connection nếu chưa có)."""
+    recorder = _current.get()
+    with ExitStack() as stack:
+        if recorder is None:
+            recorder = SQLRecorder()
+            token = _current.set(recorder)
+            stack.callback(_current.reset, token)
+            for conn in connections.all():
+                stack.enter_context(conn.execute_wrapper(recorder))
+        if on_query is not None:
+            recorder.listeners.append(on_query)
+            stack.callback(recorder.listeners.remove, on_query)
+        yield recorder
@@ -0,0 +1,235 @@
+# app/seed.py
+"""
+Sinh dữ liệu giả lập gần giống production (dùng cho benchmark / đo query):
+khách hàng + tài khoản, sản phẩm ở các quận trong DISTRICT_CHOICES, đơn hàng đã hoàn tất
+và giỏ hàng đang mở, wishlist, bình luận, chat AI, chat trực tiếp (kèm bảng Conversation).
+
+Ghi bằng bulk_create theo lô nên không chạy Model.save() / signal:
+- Product: không có ảnh (image_src rỗng)
+- Conversation: tự tính từ tin nhắn vừa sinh thay vì Conversation.record_message
+- Đơn hoàn tất: completed_at rải trong `days` ngày gần nhất (cho dashboard doanh thu)
+
+Cùng `seed` -> cùng dữ liệu (random.Random riêng, không đụng random toàn cục).
+"""
+import random
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from .models import (
+    ChatMessage,
+    Comment,
+    Conversation,
+    Customer,
+    DirectChatMessage,
+    Order,
+    OrderItem,
+    Product,
+    ShippingAddress,
+    Wishlist,
+)
+
+USERNAME_PREFIX = "seed_user_"
+DEFAULT_PASSWORD = "seed-password"
+
+# số bản ghi mỗi mức (--scale của lệnh seed_data)
+SCALES = {
+    "tiny": {"customers": 10, "products": 40},
+    "small": {"customers": 200, "products": 1_000},
+    "medium": {"customers": 2_000, "products": 10_000},
+    "large": {"customers": 20_000, "products": 100_000},
+}
+
+HO = ("Nguyễn", "Trần", "Lê", "Phạm", "Hoàng", "Huỳnh", "Phan", "Vũ", "Võ", "Đặng", "Bùi", "Đỗ")
+TEN_DEM = ("Văn", "Thị", "Minh", "Ngọc", "Thanh", "Quốc", "Gia", "Hoài", "Bảo", "Khánh")
+TEN = ("An", "Bình", "Chi", "Dũng", "Giang", "Hà", "Hùng", "Lan", "Linh", "Nam", "Phúc", "Quân", "Trang", "Vy")
+DUONG = ("Lũy Bán Bích", "Âu Cơ", "Cộng Hòa", "Quang Trung", "Phan Đăng Lưu", "Lê Văn Sỹ",
+         "Nguyễn Thị Minh Khai", "Tân Kỳ Tân Quý", "Trường Chinh", "Xô Viết Nghệ Tĩnh")
+LOAI_PHONG = ("Phòng trọ", "Phòng trọ có gác", "Căn hộ mini", "Studio", "Phòng ở ghép", "Nhà nguyên căn")
+TIEN_ICH = ("máy lạnh", "ban công", "giờ giấc tự do", "chỗ để xe", "wifi", "gần chợ", "bếp riêng", "thang máy")
+DO_DUNG = ("Quạt đứng", "Kệ sách", "Nệm", "Tủ quần áo", "Bàn học", "Đèn ngủ", "Rèm cửa", "Móc treo đồ")
+BINH_LUAN = (
+    "Phòng sạch sẽ, chủ nhà dễ thương.",
+    "Giá hơi cao so với khu vực.",
+    "Còn phòng không ạ?",
+    "Khu này buổi tối có ồn không?",
+    "Mình đã ở 6 tháng, rất ổn.",
+    "Cho mình xin số điện thoại chủ nhà.",
+)
+TIN_NHAN = (
+    "Chào admin, phòng này còn trống không?",
+    "Mình muốn hẹn xem phòng cuối tuần.",
+    "Giá đã bao gồm điện nước chưa ạ?",
+    "Dạ phòng vẫn còn, bạn qua xem lúc nào cũng được.",
+    "Tiền cọc là 1 tháng nhé.",
+    "Cảm ơn bạn!",
+)
+CAU_HOI_AI = (
+    "Phòng dưới 3 triệu ở Tân Phú",
+    "Căn hộ mini gần Quận 1",
+    "Có phòng nào có ban công không?",
+    "Phòng trọ Gò Vấp giá rẻ",
+)
+
+
+def _ho_ten(rng):
+    return f"{rng.choice(HO)} {rng.choice(TEN_DEM)} {rng.choice(TEN)}"
+
+
+def _phone(rng):
+    return "09" + "".join(rng.choice("0123456789") for _ in range(8))
+
+
+def _product(rng, districts):
+    district = rng.choice(districts)
+    if rng.random() < 0.8:
+        category = "rental"
+        name = f"{rng.choice(LOAI_PHONG)} {district}"
+        price = rng.randrange(1_500_000, 9_000_000, 100_000)
+        size = f"{rng.randint(12, 45)}m²"
+    else:
+        category = "shop"
+        name = rng.choice(DO_DUNG)
+        price = rng.randrange(50_000, 1_500_000, 10_000)
+        size = None
+    return Product(
+        name=name,
+        category=category,
+        district=district,
+        location=f"{rng.randint(1, 500)} {rng.choice(DUONG)}, {district}",
+        price=price,
+        discount_percent=rng.choice((0, 0, 0, 0, 5, 10, 15, 20)),
+        size=size,
+        description="Tiện ích: " + ", ".join(rng.sample(TIEN_ICH, 3)) + ".",
+        views=rng.randint(0, 5_000),
+    )
+
+
+def seed_data(
+    customers=200,
+    products=1_000,
+    orders_per_customer=3,
+    open_cart_ratio=0.5,
+    wishlists_per_customer=5,
+    comments_per_product=3,
+    messages_per_customer=8,
+    ai_chats_per_customer=2,
+    days=90,
+    seed=42,
+    batch_size=1_000,
+    password=DEFAULT_PASSWORD,
+):
+    """Sinh dữ liệu và trả về dict {tên model: số bản ghi đã tạo}."""
+    rng = random.Random(seed)
+    now = timezone.now()
+    districts = [value for value, _ in Product.DISTRICT_CHOICES]
+    counts = {}
+
+    def bulk(model, objs):
+        created = model.objects.bulk_create(objs, batch_size=batch_size)
+        counts[model.__name__] = counts.get(model.__name__, 0) + len(created)
+        return created
+
+    with transaction.atomic():
+        # --- Sản phẩm ---
+        product_objs = bulk(Product, [_product(rng, districts) for _ in range(products)])
+        product_ids = [p.pk for p in product_objs]
+
+        # --- Tài khoản + khách hàng (hash mật khẩu 1 lần, dùng chung) ---
+        start = User.objects.filter(username__startswith=USERNAME_PREFIX).count()
+        hashed = make_password(password)
+        users = []
+        for i in range(start, start + customers):
+            users.append(User(
+                username=f"{USERNAME_PREFIX}{i}",
+                email=f"{USERNAME_PREFIX}{i}@example.com",
+                password=hashed,
+                date_joined=now - timedelta(days=rng.randint(0, days)),
+            ))
+        users = bulk(User, users)
+        customer_objs = bulk(Customer, [
+            Customer(user=u, name=_ho_ten(rng), email=u.email, phone=_phone(rng)) for u in users
+        ])
+        addresses = bulk(ShippingAddress, [
+            ShippingAddress(
+                customer=c,
+                address=f"{rng.randint(1, 500)} {rng.choice(DUONG)}",
+                city="Hồ Chí Minh",
+                state=rng.choice(districts),
+                country="Việt Nam",
+                mobile=c.phone,
+            )
+            for c in customer_objs
+        ])
+
+        # --- Đơn hàng: đã hoàn tất + giỏ hàng đang mở ---
+        orders = []
+        for customer, address in zip(customer_objs, addresses):
+            for _ in range(orders_per_customer):
+                orders.append(Order(
+                    customer=customer,
+                    complete=True,
+                    completed_at=now - timedelta(days=rng.random() * days),
+                    transaction_id=f"{rng.getrandbits(40):x}",
+                    shipping_address=address,
+                ))
+            if rng.random() < open_cart_ratio:
+                orders.append(Order(customer=customer, complete=False))
+        orders = bulk(Order, orders)
+
+        items = []
+        for order in orders:
+            for product_id in rng.sample(product_ids, min(len(product_ids), rng.randint(1, 4))):
+                items.append(OrderItem(order=order, product_id=product_id, quantity=rng.randint(1, 3)))
+        bulk(OrderItem, items)
+
+        # --- Wishlist / bình luận ---
+        wishlists = []
+        for user in users:
+            for product_id in rng.sample(product_ids, min(len(product_ids), wishlists_per_customer)):
+                wishlists.append(Wishlist(user=user, product_id=product_id))
+        bulk(Wishlist, wishlists)
+
+        comments = []
+        for product_id in product_ids:
+            for _ in range(rng.randint(0, comments_per_product * 2)):
+                customer = rng.choice(customer_objs) if customer_objs else None
+                comments.append(Comment(
+                    product_id=product_id,
+                    user=customer,
+                    name=customer.name if customer else _ho_ten(rng),
+                    content=rng.choice(BINH_LUAN),
+                ))
+        bulk(Comment, comments)
+
+        # --- Chat AI + chat trực tiếp ---
+        bulk(ChatMessage, [
+            ChatMessage(user=u, message=rng.choice(CAU_HOI_AI), response="Mình tìm được vài phòng phù hợp...")
+            for u in users for _ in range(ai_chats_per_customer)
+        ])
+
+        messages = []
+        for user in users:
+            for n in range(messages_per_customer):
+                sender = "user" if n % 2 == 0 else "admin"
+                messages.append(DirectChatMessage(
+                    user=user, sender=sender, message=rng.choice(TIN_NHAN),
+                    is_read=sender == "admin" or n < messages_per_customer - 2,
+                ))
+        messages = bulk(DirectChatMessage, messages)
+
+        # bulk_create bỏ qua DirectChatMessage.save() -> tự dựng bảng tóm tắt hội thoại
+        summaries = {}
+        for msg in messages:
+            conv = summaries.setdefault(msg.user_id, Conversation(user_id=msg.user_id))
+            conv.total_messages += 1
+            conv.unread_count += 1 if msg.sender == "user" and not msg.is_read else 0
+            conv.last_message = Conversation.snippet_for(msg)
+            conv.last_sender = msg.sender
+            conv.last_time = msg.created_at
+        bulk(Conversation, list(summaries.values()))
+
+    return counts
@@ -2,7 +2,13 @@
 from django.urls import reverse
 from django.contrib.sites.shortcuts import get_current_site
 from django.utils.http import url_has_allowed_host_and_scheme
-from .models import Product, Wishlist, Comment
+from django.db import transaction
+from django.db.models import Count
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from PIL import Image
+from .models import Product, DirectChatMessage, Conversation
+from .media import stage_upload
 from .utils import ask_gemini
 
 
@@ -11,14 +17,18 @@ def search_products(query):
 
 
 def ask_with_products(user_msg, request=None):  # ⚡ nhận thêm request
-    products = search_products(user_msg)
+    # đếm lượt thích / bình luận ngay trong query tìm kiếm (không query thêm cho từng sản phẩm)
+    products = list(search_products(user_msg).annotate(
+        wishlist_count=Count("wishlist", distinct=True),
+        comment_count=Count("comments", distinct=True),
+    ))
 
-    if products.exists():
+    if products:
         product_info = []
         for p in products:
-            wishlist_count = Wishlist.objects.filter(product=p).count()
-            comment_count = Comment.objects.filter(product=p).count()
-            first_image = p.image.url if p.image else ""
+            wishlist_count = p.wishlist_count
+            comment_count = p.comment_count
+            first_image = p.image_url or ""
 
             # ✅ link tuyệt đối
             relative_link = reverse("product_detail", args=[p.id])
@@ -89,3 +99,68 @@ def ask_with_products(user_msg, request=None):  # ⚡ nhận thêm request
         """
 
     return ask_gemini(context)
+
+
+def is_valid_image(uploaded_file):
+    """Kiểm tra nhanh file upload có phải ảnh không (chỉ đọc header)."""
+    try:
+        with Image.open(uploaded_file) as img:
+            img.verify()
+        return True
+    except Exception:
+        return False
+    finally:
+        uploaded_file.seek(0)
+
+
+def notify_chat_room(user_id, payload):
+    """Báo cho phòng chat qua channel layer (bỏ qua nếu Redis không sẵn sàng)."""
+    try:
+        async_to_sync(get_channel_layer().group_send)(
+            f"chat_{user_id}", {"type": "chat_message", "payload": payload}
+        )
+    except Exception as e:
+        print(">>> notify chat room error:", repr(e))
+
+
+def direct_message_data(m):
+    """Dữ liệu 1 tin nhắn trả cho frontend (API lịch sử + event websocket)."""
+    return {
+        "id": m.id,
+        "sender": m.sender,
+        "message": m.message or "",
+        "image": m.image.url if m.image else None,
+        "thumbnail": m.thumbnail.url if m.thumbnail else None,
+        "image_pending": m.image_pending,
+        "created_at": m.created_at.isoformat(),
+    }
+
+
+def create_direct_message(user, sender, message="", image=None):
+    """
+    Tạo tin nhắn chat trực tiếp. Ảnh (nếu có) chỉ được ghi vào thư mục staging trên ổ đĩa
+    (media.staging_storage), việc upload lên storage chính + tạo thumbnail do Celery task
+    process_chat_image làm — request không upload gì lên Cloudinary.
+    """
+    from .tasks import process_chat_image, run_task
+
+    staged_name = stage_upload(image) if image else None
+    chat = DirectChatMessage.objects.create(
+        user=user,
+        sender=sender,
+        message=message or "",
+        image_pending=bool(staged_name),
+    )
+    def broadcast():
+        # tin nhắn gửi qua HTTP cũng đẩy tới các client đang mở websocket
+        notify_chat_room(chat.user_id, {
+            "type": "new_message",
+            "user_id": str(chat.user_id),
+            "snippet": Conversation.snippet_for(chat),
+            **direct_message_data(chat),
+        })
+
+    transaction.on_commit(broadcast)
+    if staged_name:
+        transaction.on_commit(lambda: run_task(process_chat_image, chat.id, staged_name, background=True))
+    return chat
@@ -1,8 +1,50 @@
 # app/tasks.py
+import os
+import threading
 import time
-from celery import shared_task
+from celery import Task, shared_task
+from django.core.files import File
 from django.core.mail import send_mail
 from django.conf import settings
+from django.db import connections
+
+from .media import (
+    staging_storage,
+    make_thumbnail,
+    thumbnail_name,
+    build_image_variants,
+    image_meta,
+    fetch_remote,
+    mp4_metadata,
+    ffmpeg_poster,
+)
+
+
+CHAT_IMAGE_MAX_RETRIES = getattr(settings, "CHAT_IMAGE_MAX_RETRIES", 5)
+
+
+def run_task(task, *args, background=False):
+    """
+    Gửi task lên Celery; broker không sẵn sàng thì chạy luôn trong process hiện tại.
+    background=True: chạy ở thread riêng để không giữ request đang xử lý (task nặng: upload, resize).
+    Lưu ý: fallback này vẫn làm toàn bộ việc (upload, resize...) trong process web — chỉ là
+    không bắt request chờ; CPU / băng thông vẫn của web worker cho tới khi broker chạy lại.
+    """
+    try:
+        return task.delay(*args)
+    except Exception as e:
+        print(f">>> {task.name} enqueue error:", repr(e))
+    if not background:
+        return task.apply(args=args)
+
+    def run():
+        try:
+            task.apply(args=args)
+        finally:
+            connections.close_all()
+
+    threading.Thread(target=run, daemon=True, name=f"task-{task.name}").start()
+    return None
 
 @shared_task(bind=True)
 def test_task(self, x=1):
@@ -28,3 +70,195 @@ def send_contact_email(self, subject, message, from_email, to_email=None):
         # log rõ ra console để worker show
         print(">>> send_contact_email error:", repr(e))
         return {"ok": False, "error": str(e)}
+
+
+class ChatImageTask(Task):
+    def on_failure(self, exc, task_id, args, kwargs, einfo):
+        # hết lượt retry: bỏ trạng thái "đang tải ảnh" để giao diện không chờ mãi
+        from .models import DirectChatMessage
+        from .services import notify_chat_room
+
+        message_id, staged_name = args
+        print(">>> process_chat_image failed:", repr(exc))
+        if DirectChatMessage.objects.filter(id=message_id, image_pending=True).update(image_pending=False):
+            notify_chat_room(
+                DirectChatMessage.objects.values_list("user_id", flat=True).get(id=message_id),
+                {"type": "image_failed", "id": message_id},
+            )
+        try:
+            staging_storage().delete(staged_name)
+        except Exception as e:
+            print(">>> process_chat_image staging delete error:", repr(e))
+
+
+@shared_task(
+    bind=True, base=ChatImageTask,
+    autoretry_for=(Exception,), max_retries=CHAT_IMAGE_MAX_RETRIES, retry_backoff=True, retry_backoff_max=300,
+)
+def process_chat_image(self, message_id, staged_name):
+    """
+    Đẩy ảnh chat từ thư mục staging lên vị trí chính trong storage (Cloudinary / filesystem)
+    và tạo ảnh thu nhỏ bằng Pillow, chạy ngoài request của web worker.
+    Lỗi (storage / mạng) -> tự retry với backoff; hết lượt thì ChatImageTask.on_failure bỏ image_pending.
+    Trả về dict {ok, id, image_url, thumbnail_url}.
+    """
+    from .models import DirectChatMessage
+    from .services import notify_chat_room
+
+    staging = staging_storage()
+    try:
+        msg = DirectChatMessage.objects.get(id=message_id)
+    except DirectChatMessage.DoesNotExist:
+        staging.delete(staged_name)
+        return {"ok": False, "error": "message_not_found"}
+
+    # lỗi ở đây được autoretry; file staging giữ lại cho lần chạy sau
+    with staging.open(staged_name, "rb") as fh:
+        thumb = make_thumbnail(fh)
+        fh.seek(0)
+        msg.image.save(os.path.basename(staged_name), File(fh), save=False)
+    msg.thumbnail.save(thumbnail_name(staged_name), thumb, save=False)
+
+    msg.image_pending = False
+    msg.save(update_fields=["image", "thumbnail", "image_pending"])
+    staging.delete(staged_name)
+
+    result = {
+        "ok": True,
+        "id": msg.id,
+        "image_url": msg.image.url,
+        "thumbnail_url": msg.thumbnail.url,
+    }
+    notify_chat_room(msg.user_id, {"type": "image_ready", **result})
+    return result
+
+
+@shared_task(bind=True)
+def generate_image_variants(self, model_label, pk):
+    """
+    Xử lý ảnh Product / ProductImage 1 lần sau upload:
+    - kích thước gốc + placeholder LQIP (image_width / image_height / image_lqip)
+    - ảnh responsive (320/640/1280, WebP + JPEG) -> image_variants
+      (ảnh Cloudinary đã có transformation URL, chỉ cần tải về đọc kích thước + LQIP)
+    """
+    from django.apps import apps
+    from .models import IMAGE_DATA_FIELDS, MediaBlob, _is_url, decode_media_name
+
+    Model = apps.get_model(model_label)
+    obj = Model.objects.filter(pk=pk).first()
+    if obj is None or not obj.image:
+        return {"ok": False, "error": "not_found"}
+
+    name = obj.image.name
+    remote = _is_url(decode_media_name(name))
+    if remote and not obj.image_src:
+        return {"ok": False, "error": "remote_image"}
+
+    try:
+        if remote:
+            meta = image_meta(fetch_remote(obj.image_src))
+            values = {}
+        else:
+            with obj.image.open("rb") as fh:
+                meta = image_meta(fh)
+                fh.seek(0)
+                values = {"image_variants": build_image_variants(fh, name, obj.image.storage)}
+    except Exception as e:
+        print(">>> generate_image_variants error:", repr(e))
+        return {"ok": False, "error": str(e)}
+
+    values.update(image_width=meta["width"], image_height=meta["height"], image_lqip=meta["lqip"])
+    # chỉ ghi nếu ảnh chưa bị đổi trong lúc task chạy
+    Model.objects.filter(pk=pk, image=name).update(**values)
+    # lưu theo file (MediaBlob) để bản ghi khác dùng cùng file không phải xử lý lại
+    data = {k: values.get(k, getattr(obj, k)) for k in IMAGE_DATA_FIELDS}
+    MediaBlob.objects.filter(name=name).update(image_data=data)
+    return {"ok": True, **values}
+
+
+@shared_task(bind=True)
+def extract_video_meta(self, model_label, pk, field):
+    """
+    Đọc duration / width / height của video (parser box MP4 thuần Python, chỉ đọc vài KB)
+    và cắt 1 khung hình làm poster nếu máy worker có ffmpeg.
+    Admin / trang chi tiết chỉ cần hiện ảnh poster thay vì tải cả video.
+    """
+    from django.apps import apps
+    from .models import _is_url, decode_media_name
+
+    Model = apps.get_model(model_label)
+    obj = Model.objects.filter(pk=pk).first()
+    video = getattr(obj, field, None)
+    if obj is None or not video:
+        return {"ok": False, "error": "not_found"}
+
+    name = video.name
+    if _is_url(decode_media_name(name)):
+        return {"ok": False, "error": "remote_video"}
+
+    values = {}
+    try:
+        with video.open("rb") as fh:
+            values.update(mp4_metadata(fh))
+    except Exception as e:
+        # không phải MP4/MOV hoặc file hỏng -> vẫn thử cắt poster
+        print(">>> extract_video_meta parse error:", repr(e))
+
+    try:
+        source = video.path
+    except NotImplementedError:
+        source = video.url
+    poster = ffmpeg_poster(source)
+    if poster is not None:
+        base = os.path.splitext(os.path.basename(name))[0]
+        obj.poster.save(f"{base}_poster.jpg", poster, save=False)
+        values["poster"] = obj.poster.name
+
+    # chỉ ghi nếu video chưa bị đổi trong lúc task chạy
+    Model.objects.filter(pk=pk, **{field: name}).update(**values)
+    return {"ok": True, **values}
+
+
+@shared_task(bind=True)
+def import_products_file(self, job, fmt):
+    """
+    Import sản phẩm từ file admin đã lưu vào staging (product_io.stage_import),
+    ghi kết quả (số dòng tạo / lỗi) cạnh file để trang import hiển thị, rồi xóa file nguồn.
+    """
+    from . import product_io
+
+    staging = staging_storage()
+    try:
+        with staging.open(job, "rb") as fh:
+            data = product_io.import_products(fh, fmt).as_dict()
+    except Exception as e:
+        print(">>> import_products_file error:", repr(e))
+        data = {"ok": False, "error": str(e)}
+    product_io.save_job_result(job, data)
+    staging.delete(job)
+    return {k: v for k, v in data.items() if k != "errors"}
+
+
+@shared_task(bind=True)
+def rollup_sales_daily(self, days=None, full=False, day=None):
+    """
+    Celery beat: cập nhật bảng SalesDaily cho `days` ngày gần nhất
+    (mặc định settings.SALES_ROLLUP_DAYS), full=True -> tính lại toàn bộ lịch sử,
+    day="YYYY-MM-DD" -> chỉ tính lại đúng ngày đó (đơn cũ vừa bị xóa).
+    """
+    from datetime import date, timedelta
+    from django.utils import timezone
+    from .models import SalesDaily
+
+    days = days or getattr(settings, "SALES_ROLLUP_DAYS", 2)
+    until = None
+    if day:
+        since = until = date.fromisoformat(day)
+    else:
+        since = None if full else timezone.now().date() - timedelta(days=days - 1)
+    try:
+        rows = SalesDaily.rebuild(since, until)
+    except Exception as e:
+        print(">>> rollup_sales_daily error:", repr(e))
+        return {"ok": False, "error": str(e)}
+    return {"ok": True, "rows": rows, "since": since.isoformat() if since else None}
@@ -1,4 +1,7 @@
 from django import template
+from django.utils.html import format_html
+
+from app.media import srcset
 
 register = template.Library()
 
@@ -9,3 +12,44 @@ def currency_vn(value):
         return f"{value:,.0f} VNĐ".replace(",", ".")
     except (ValueError, TypeError):
         return value
+
+
+@register.simple_tag
+def responsive_img(obj, css_class="", sizes="(max-width: 576px) 50vw, 25vw", alt=None, lazy=True):
+    """
+    Render ảnh sản phẩm kèm srcset (WebP + JPEG) nếu đã có biến thể,
+    ngược lại render <img> thường với image_url.
+    - loading="lazy" (truyền lazy=False cho ảnh đầu trang / LCP)
+    - width / height gốc để trình duyệt giữ chỗ, không nhảy layout
+    - nền là ảnh LQIP base64 (tính lúc upload) hiện mờ trong lúc ảnh thật đang tải
+    Dùng: {% responsive_img product "card-img-top" %}
+    """
+    url = getattr(obj, "image_url", None) or ""
+    if alt is None:
+        alt = getattr(obj, "name", "") or ""
+    variants = getattr(obj, "image_variants", None) or {}
+    webp = srcset(variants.get("webp"))
+    jpeg = srcset(variants.get("jpeg"))
+
+    width = getattr(obj, "image_width", None)
+    height = getattr(obj, "image_height", None)
+    lqip = getattr(obj, "image_lqip", "")
+    attrs = format_html(
+        'loading="{}" decoding="async"', "lazy" if lazy else "eager"
+    )
+    if width and height:
+        attrs += format_html(' width="{}" height="{}"', width, height)
+    if lqip:
+        attrs += format_html(
+            ' style="background-image:url({});background-size:cover;background-position:center"', lqip
+        )
+
+    if not webp and not jpeg:
+        return format_html('<img src="{}" class="{}" alt="{}" {}>', url, css_class, alt, attrs)
+    return format_html(
+        '<picture>'
+        '<source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" class="{}" alt="{}" {}>'
+        '</picture>',
+        webp, sizes, url, jpeg, sizes, css_class, alt, attrs,
+    )
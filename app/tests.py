@@ -1,3 +1,1542 @@
-from django.test import TestCase
+import importlib
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.contrib.auth.models import Group, User
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, reverse
+from django.utils import timezone
+from PIL import Image
+
+from .benchmark import percentile, run_benchmark
+from .management.commands.streamload import iter_json_objects
+from .media import file_sha256, mp4_metadata
+from .models import (
+    Product, ProductImage, ProductVideo, Comment, MediaBlob, Video,
+    Customer, Order, OrderItem, ShippingAddress, SalesDaily, OrdersDaily, ChatMessage, Contact, Conversation,
+    DirectChatMessage, Wishlist, OrderQuerySet, _sync_media_src, decode_media_name,
+)
+from . import consumers, metrics, presence
+from .pagination import EstimatedCountPaginator
+from .profiling import store as profile_store
+from .query_budget import QueryBudget, QueryBudgetExceeded, normalize_sql
+from .routing import websocket_urlpatterns
+from .seed import seed_data
+from . import urls as app_urls
+from .tasks import generate_image_variants, extract_video_meta, process_chat_image, rollup_sales_daily, run_task
+
+
+def make_image_file(name="room.jpg", size=(1600, 1000), color="green"):
+    buf = BytesIO()
+    Image.new("RGB", size, color).save(buf, "JPEG")
+    return SimpleUploadedFile(name, buf.getvalue(), content_type="image/jpeg")
+
+
+class ProductDetailQueryTests(TestCase):
+    """Trang chi tiết sản phẩm phải chạy số query cố định, không phụ thuộc số ảnh / bình luận."""
+
+    def make_product(self, n_related):
+        product = Product.objects.create(
+            name="Phòng test", price=3_000_000, category="rental",
+            image="https://res.cloudinary.com/demo/image/upload/main.jpg",
+        )
+        for i in range(n_related):
+            ProductImage.objects.create(
+                product=product, image=f"https://res.cloudinary.com/demo/image/upload/{i}.jpg"
+            )
+            ProductVideo.objects.create(
+                product=product, video=f"https://res.cloudinary.com/demo/video/upload/{i}.mp4"
+            )
+            Comment.objects.create(product=product, name=f"Khách {i}", content="Phòng đẹp")
+        return product
+
+    def count_queries(self, product):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse("product_detail", args=[product.id]))
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_query_count_is_constant(self):
+        small = self.make_product(1)
+        large = self.make_product(10)
+        self.assertEqual(self.count_queries(small), self.count_queries(large))
+
+    def test_query_budget(self):
+        product = self.make_product(5)
+        # update views, product, images, videos, comments(+user), sản phẩm liên quan
+        with self.assertNumQueries(6):
+            self.client.get(reverse("product_detail", args=[product.id]))
+
+    def test_gallery_lists_main_and_extra_images(self):
+        product = self.make_product(2)
+        response = self.client.get(reverse("product_detail", args=[product.id]))
+        self.assertEqual(len(response.context["product"].get_all_images), 3)
+        self.assertContains(response, "https://res.cloudinary.com/demo/image/upload/main.jpg")
+
+
+class AdminChangelistQueryTests(TestCase):
+    """Trang danh sách admin phải chạy số query cố định, không phụ thuộc số dòng."""
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser("admin", "a@example.com", "pw"))
+        self.products = [
+            Product.objects.create(name=f"SP {i}", price=100_000 * (i + 1), image="https://res.cloudinary.com/demo/image/upload/p.jpg")
+            for i in range(3)
+        ]
+
+    def make_orders(self, n):
+        for i in range(n):
+            customer = Customer.objects.create(name=f"Khách {i}")
+            address = ShippingAddress.objects.create(customer=customer, address="1 Lê Lợi", city="HCM", state="HCM")
+            order = Order.objects.create(customer=customer, shipping_address=address)
+            for p in self.products:
+                OrderItem.objects.create(order=order, product=p, quantity=2)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def assertConstantQueries(self, url):
+        self.make_orders(1)
+        small = self.count_queries(url)
+        self.make_orders(9)
+        self.assertEqual(self.count_queries(url), small)
+
+    def test_shipping_address_changelist(self):
+        url = reverse("admin:app_shippingaddress_changelist")
+        self.assertConstantQueries(url)
+        self.assertContains(self.client.get(url), "SP 0 x 2 → <b>200.000 VNĐ</b>")
+
+    def test_order_changelist(self):
+        url = reverse("admin:app_order_changelist")
+        self.assertConstantQueries(url)
+        # 2 x (100k + 200k + 300k)
+        self.assertContains(self.client.get(url), "1.200.000 VNĐ")
+
+    def test_order_changelist_count_is_plain(self):
+        self.make_orders(3)
+        url = reverse("admin:app_order_changelist")
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, {"o": "6"})
+        self.assertFalse(response.context["cl"].show_full_result_count)
+        counts = [q["sql"] for q in ctx.captured_queries if "COUNT(" in q["sql"]]
+        self.assertTrue(counts)
+        for sql in counts:
+            self.assertNotIn("GROUP BY", sql)
+        self.assertContains(response, "1.200.000 VNĐ", count=3)
+
+    def test_orderitem_changelist(self):
+        self.assertConstantQueries(reverse("admin:app_orderitem_changelist"))
+
+    def test_annotated_total_matches_python_total(self):
+        self.products[0].discount_percent = 15
+        self.products[0].price = 99_999
+        self.products[0].save()
+        self.make_orders(1)
+        order = Order.objects.with_totals().get()
+        plain = Order.objects.get()
+        self.assertEqual(order.tong_tien, plain.tong_tien)
+        self.assertEqual(order.tong_san_pham, plain.tong_san_pham)
+
+
+class EstimatedCountPaginatorTests(TestCase):
+    def setUp(self):
+        for i in range(5):
+            Comment.objects.create(product=Product.objects.create(name=f"SP {i}"), content="Tốt")
+
+    def test_exact_count_without_estimate(self):
+        # SQLite: không ước lượng được -> COUNT(*) như bình thường
+        self.assertEqual(EstimatedCountPaginator(Comment.objects.all(), 2).count, 5)
+
+    def test_uses_estimate_above_threshold(self):
+        class Fake(EstimatedCountPaginator):
+            threshold = 1_000
+
+            def estimate(self):
+                return 2_000_000
+
+        with self.assertNumQueries(0):
+            self.assertEqual(Fake(Comment.objects.all(), 20).count, 2_000_000)
+
+    def test_changelists_skip_full_count(self):
+        ChatMessage.objects.create(message="Xin chào", response="Chào bạn")
+        self.client.force_login(User.objects.create_superuser("admin", "a@example.com", "pw"))
+        for name in ("product", "comment", "chatmessage", "conversation"):
+            response = self.client.get(reverse(f"admin:app_{name}_changelist"), {"q": "a"})
+            self.assertEqual(response.status_code, 200)
+            self.assertFalse(response.context["cl"].show_full_result_count)
+
+
+class ProductImportExportTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser("admin", "a@example.com", "pw"))
+        self.staging_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.staging_dir, True)
+        override = override_settings(CHAT_UPLOAD_STAGING_DIR=self.staging_dir)
+        override.enable()
+        self.addCleanup(override.disable)
+        # task import chạy ngay; các task khác (biến thể ảnh) chỉ ghi lại
+        self.queued = []
+        patcher = mock.patch("app.tasks.run_task", side_effect=self.fake_run_task)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def fake_run_task(self, task, *args, background=False):
+        if task.name.endswith("import_products_file"):
+            return task.apply(args=args)
+        self.queued.append((task.name.rsplit(".", 1)[-1], args))
+
+    def upload(self, name, content):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse("admin:app_product_import"),
+                {"file": SimpleUploadedFile(name, content.encode("utf-8"))},
+            )
+        self.assertEqual(response.status_code, 302)
+        return self.client.get(response.url)
+
+    def test_csv_import_collects_row_errors(self):
+        content = (
+            "name,price,category,district,digital,image\n"
+            "Phòng A,3.500.000,rental,Gò Vấp,0,https://res.cloudinary.com/demo/image/upload/a.jpg\n"
+            "Phòng B,abc,rental,Gò Vấp,0,\n"
+            "Áo,150000,nope,Quận 1,1,\n"
+            "Áo thun,150000,shop,Quận 1,có,\n"
+        )
+        response = self.upload("products.csv", content)
+        self.assertEqual(response.status_code, 200)
+        result = response.context["result"]
+        self.assertEqual((result["created"], result["failed"]), (2, 2))
+        self.assertEqual([line for line, _ in result["errors"]], [3, 4])
+        self.assertContains(response, "2 sản phẩm đã tạo")
+
+        room = Product.objects.get(name="Phòng A")
+        self.assertEqual(room.price, 3_500_000)
+        self.assertEqual(room.image_url, "https://res.cloudinary.com/demo/image/upload/a.jpg")
+        self.assertIn("webp", room.image_variants)
+        self.assertTrue(Product.objects.get(name="Áo thun").digital)
+        # chỉ sản phẩm có ảnh mới cần generate_image_variants, gửi sau khi lô commit
+        self.assertEqual(self.queued, [("generate_image_variants", ("app.Product", room.pk))])
+        # file nguồn đã xóa, chỉ còn file kết quả
+        self.assertEqual(len(os.listdir(os.path.join(self.staging_dir, "product_import"))), 1)
+
+    def test_jsonl_import(self):
+        content = '{"name": "Phòng C", "price": 2000000, "category": "rental"}\n\nnot json\n'
+        result = self.upload("products.jsonl", content).context["result"]
+        self.assertEqual((result["created"], result["failed"]), (1, 1))
+
+    def test_pending_and_invalid_job(self):
+        response = self.client.get(reverse("admin:app_product_import"), {"job": "product_import/x.csv"})
+        self.assertIsNone(response.context["result"])
+        self.assertContains(response, "Đang import")
+        response = self.client.get(reverse("admin:app_product_import"), {"job": "../settings.py"})
+        self.assertEqual(response.context["job"], "")
+
+    def test_streaming_export(self):
+        Product.objects.create(name="Phòng, có dấu phẩy", price=1_000_000)
+        response = self.client.get(reverse("admin:app_product_export"), {"format": "csv"})
+        self.assertTrue(response.streaming)
+        body = b"".join(response.streaming_content).decode("utf-8")
+        self.assertIn('"Phòng, có dấu phẩy",1000000', body)
+
+        response = self.client.get(reverse("admin:app_product_export"), {"format": "jsonl"})
+        line = b"".join(response.streaming_content).decode("utf-8").strip()
+        self.assertEqual(json.loads(line)["price"], 1_000_000)
+
+
+class SalesRollupTests(TestCase):
+    def setUp(self):
+        self.room = Product.objects.create(name="Phòng", price=3_000_000, category="rental", district="Gò Vấp")
+        self.shirt = Product.objects.create(
+            name="Áo", price=200_000, discount_percent=10, category="shop", district="Quận 1"
+        )
+        self.customer = Customer.objects.create(name="Khách")
+
+    def make_order(self, items, days_ago=0):
+        order = Order.objects.create(customer=self.customer)
+        for product, qty in items:
+            OrderItem.objects.create(order=order, product=product, quantity=qty)
+        order.complete = True
+        order.save()
+        Order.objects.filter(pk=order.pk).update(completed_at=timezone.now() - timedelta(days=days_ago))
+        return order
+
+    def test_rollup_by_day_district_category(self):
+        self.make_order([(self.room, 1), (self.shirt, 2)])
+        self.make_order([(self.shirt, 1)])
+        self.make_order([(self.room, 1)], days_ago=10)
+        Order.objects.create(customer=self.customer)  # giỏ hàng chưa chốt -> không tính
+
+        result = rollup_sales_daily.apply(kwargs={"full": True}).get()
+        self.assertEqual(result["rows"], 3)
+
+        today = SalesDaily.objects.get(date=timezone.now().date(), district="Quận 1")
+        self.assertEqual((today.category, today.order_lines, today.units, today.revenue), ("shop", 2, 3, 540_000))
+        self.assertEqual(SalesDaily.objects.filter(district="Gò Vấp").count(), 2)
+        # đơn đầu có sản phẩm ở 2 quận nhưng chỉ tính 1 đơn
+        self.assertEqual(
+            list(OrdersDaily.objects.order_by("date").values_list("orders", flat=True)), [1, 2]
+        )
+
+    def test_incremental_rollup_keeps_older_days(self):
+        self.make_order([(self.room, 1)], days_ago=10)
+        rollup_sales_daily.apply(kwargs={"full": True})
+        self.make_order([(self.shirt, 1)])
+
+        rollup_sales_daily.apply()
+        self.assertEqual(SalesDaily.objects.count(), 2)
+
+    def test_dashboard(self):
+        self.make_order([(self.room, 2)])
+        SalesDaily.rebuild()
+        self.client.force_login(User.objects.create_superuser("admin", "a@example.com", "pw"))
+        response = self.client.get(reverse("admin:app_salesdaily_changelist"), {"group": "day"})
+        self.assertContains(response, "Gò Vấp")
+        self.assertContains(response, "6.000.000 VNĐ")
+
+    def test_dashboard_permissions(self):
+        from django.contrib.auth.models import Permission
+
+        url = reverse("admin:app_salesdaily_changelist")
+        staff = User.objects.create_user("nv", password="pw", is_staff=True)
+        self.client.force_login(staff)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        staff.user_permissions.add(Permission.objects.get(codename="view_salesdaily"))
+        self.assertEqual(self.client.get(url).status_code, 200)
+        with mock.patch("app.tasks.run_task") as run_task:
+            self.assertEqual(self.client.post(url, {"rebuild": "1"}).status_code, 403)
+        run_task.assert_not_called()
+
+        self.client.force_login(User.objects.create_superuser("admin", "a@example.com", "pw"))
+        with mock.patch("app.tasks.run_task") as run_task:
+            self.assertRedirects(self.client.post(url, {"rebuild": "1"}), url)
+        run_task.assert_called_once_with(rollup_sales_daily, None, True, background=True)
+
+    def test_deleting_old_order_recomputes_its_day(self):
+        old = self.make_order([(self.room, 1)], days_ago=10)
+        self.make_order([(self.shirt, 1)], days_ago=10)
+        SalesDaily.rebuild()
+        day = (timezone.now() - timedelta(days=10)).date()
+        self.assertEqual(OrdersDaily.objects.get(date=day).orders, 2)
+
+        self.customer.user = User.objects.create_user("khach", password="pw")
+        self.customer.save()
+        self.client.force_login(self.customer.user)
+        with mock.patch("app.tasks.run_task", side_effect=lambda task, *args: task.apply(args=args)):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(reverse("delete_order", args=[old.pk]))
+
+        self.assertEqual(OrdersDaily.objects.get(date=day).orders, 1)
+        self.assertFalse(SalesDaily.objects.filter(date=day, district="Gò Vấp").exists())
+
+    def test_dashboard_counts_each_order_once(self):
+        self.make_order([(self.room, 1), (self.shirt, 2)])
+        self.make_order([(self.shirt, 1)], days_ago=1)
+        SalesDaily.rebuild()
+        self.client.force_login(User.objects.create_superuser("admin", "a@example.com", "pw"))
+        response = self.client.get(reverse("admin:app_salesdaily_changelist"), {"group": "week", "days": 7})
+        self.assertEqual(response.context["totals"]["orders"], 2)
+        self.assertEqual(sum(row["orders"] for row in response.context["series"]), 2)
+        lines = {c["category"]: c["order_lines"] for c in response.context["categories"]}
+        self.assertEqual(lines, {"rental": 1, "shop": 2})
+
+
+class ImageVariantTests(TestCase):
+    """Sinh ảnh responsive: Pillow + filesystem storage, hoặc URL transformation của Cloudinary."""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media_root)
+        self.override.enable()
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def test_pillow_variants_on_local_storage(self):
+        product = Product.objects.create(name="Phòng", image=make_image_file())
+        result = generate_image_variants.apply(args=("app.Product", product.pk)).get()
+        self.assertTrue(result["ok"])
+
+        product.refresh_from_db()
+        self.assertEqual(set(product.image_variants), {"webp", "jpeg"})
+        self.assertEqual(set(product.image_variants["webp"]), {"320", "640", "1280"})
+
+        response = self.client.get(reverse("product"))
+        self.assertContains(response, 'type="image/webp"')
+        self.assertContains(response, " 320w, ")
+
+    def test_dimensions_and_lqip_stored_at_upload(self):
+        product = Product.objects.create(name="Phòng", image=make_image_file(size=(1600, 1000)))
+        generate_image_variants.apply(args=("app.Product", product.pk))
+        product.refresh_from_db()
+
+        self.assertEqual((product.image_width, product.image_height), (1600, 1000))
+        self.assertTrue(product.image_lqip.startswith("data:image/jpeg;base64,"))
+        self.assertLess(len(product.image_lqip), 1000)
+
+        response = self.client.get(reverse("product"))
+        self.assertContains(response, 'loading="lazy"')
+        self.assertContains(response, 'width="1600" height="1000"')
+        self.assertContains(response, "background-image:url(data:image/jpeg;base64,")
+
+    def test_cloudinary_image_uses_transformation_urls(self):
+        product = Product.objects.create(
+            name="Phòng", image="https://res.cloudinary.com/demo/image/upload/v1/products/a.jpg"
+        )
+        self.assertEqual(
+            product.image_variants["webp"]["640"],
+            "https://res.cloudinary.com/demo/image/upload/w_640,c_limit,q_auto,f_webp/v1/products/a.jpg",
+        )
+
+
+class MediaBlobDedupTests(TestCase):
+    """Upload trùng nội dung chỉ ghi storage 1 lần, các bản ghi dùng chung file."""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media_root)
+        self.override.enable()
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def test_duplicate_upload_reuses_stored_file(self):
+        product = Product.objects.create(name="Phòng")
+        a = ProductImage.objects.create(product=product, image=make_image_file("a.jpg"))
+        b = ProductImage.objects.create(product=product, image=make_image_file("b.jpg"))
+        c = ProductImage.objects.create(product=product, image=make_image_file("c.jpg", color="red"))
+
+        self.assertEqual(a.image.name, b.image.name)
+        self.assertNotEqual(a.image.name, c.image.name)
+        self.assertEqual(MediaBlob.objects.count(), 2)
+        self.assertEqual(len(os.listdir(os.path.join(self.media_root, "products"))), 2)
+
+    def test_missing_file_is_written_again(self):
+        product = Product.objects.create(name="Phòng")
+        a = ProductImage.objects.create(product=product, image=make_image_file("a.jpg"))
+        os.remove(a.image.path)
+        b = ProductImage.objects.create(product=product, image=make_image_file("b.jpg"))
+        self.assertTrue(os.path.exists(b.image.path))
+        self.assertEqual(MediaBlob.objects.get().name, b.image.name)
+
+    def test_variants_are_shared(self):
+        product = Product.objects.create(name="Phòng", image=make_image_file())
+        generate_image_variants.apply(args=("app.Product", product.pk))
+        product.refresh_from_db()
+
+        self.assertEqual(MediaBlob.objects.get().image_data["image_lqip"], product.image_lqip)
+
+        with self.captureOnCommitCallbacks() as callbacks, CaptureQueriesContext(connection) as ctx:
+            img = ProductImage.objects.create(product=product, image=make_image_file("copy.jpg"))
+        self.assertEqual(callbacks, [])  # không cần resize lại
+        self.assertEqual(img.image_variants, product.image_variants)
+        self.assertEqual((img.image_width, img.image_lqip), (product.image_width, product.image_lqip))
+        # dữ liệu ảnh lấy từ MediaBlob, không quét bảng Product / ProductImage theo cột image
+        lookups = [
+            q["sql"] for q in ctx.captured_queries
+            if q["sql"].startswith("SELECT") and '"image" =' in q["sql"]
+        ]
+        self.assertEqual(lookups, [])
+
+    def test_blob_lookup_uses_name_index(self):
+        if connection.vendor != "sqlite":
+            self.skipTest("EXPLAIN QUERY PLAN của SQLite")
+        plan = MediaBlob.objects.filter(name="products/a.jpg").values("image_data").explain()
+        self.assertIn("mediablob_name_idx", plan)
+
+
+def mp4_box(kind, payload=b""):
+    return (8 + len(payload)).to_bytes(4, "big") + kind + payload
+
+
+def make_mp4(duration_ms=12500, size=(1280, 720), rotated=False):
+    """File MP4 tối giản (ftyp, mdat, moov ở cuối như file quay từ điện thoại)."""
+    mvhd = bytes(4) + bytes(8) + (1000).to_bytes(4, "big") + duration_ms.to_bytes(4, "big") + bytes(80)
+    a, b = (0, 0x10000) if rotated else (0x10000, 0)
+    matrix = a.to_bytes(4, "big") + b.to_bytes(4, "big", signed=True) + bytes(28)
+    tkhd = (
+        bytes(4) + bytes(20) + bytes(16) + matrix
+        + (size[0] << 16).to_bytes(4, "big") + (size[1] << 16).to_bytes(4, "big")
+    )
+    audio = bytes(4) + bytes(20) + bytes(16) + bytes(36) + bytes(8)
+    moov = mp4_box(b"moov", mp4_box(b"mvhd", mvhd)
+                   + mp4_box(b"trak", mp4_box(b"tkhd", audio))
+                   + mp4_box(b"trak", mp4_box(b"tkhd", tkhd)))
+    return mp4_box(b"ftyp", b"isom" + bytes(4)) + mp4_box(b"mdat", bytes(4096)) + moov
+
+
+class VideoMetadataTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media_root, FFMPEG_BINARY="ffmpeg-not-installed")
+        self.override.enable()
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def test_mp4_parser(self):
+        self.assertEqual(mp4_metadata(BytesIO(make_mp4())), {"duration": 12.5, "width": 1280, "height": 720})
+        self.assertEqual(mp4_metadata(BytesIO(make_mp4(rotated=True)))["width"], 720)
+
+    def test_task_stores_metadata(self):
+        product = Product.objects.create(name="Phòng")
+        video = ProductVideo.objects.create(
+            product=product, video=SimpleUploadedFile("a.mp4", make_mp4(), content_type="video/mp4")
+        )
+        result = extract_video_meta.apply(args=("app.ProductVideo", video.pk, "video")).get()
+        self.assertTrue(result["ok"])
+
+        video.refresh_from_db()
+        self.assertEqual((video.duration, video.width, video.height), (12.5, 1280, 720))
+        self.assertFalse(video.poster)  # không có ffmpeg -> không có poster, không lỗi
+
+    def test_cloudinary_poster_and_static_admin_list(self):
+        Video.objects.create(
+            title="Giới thiệu", file="https://res.cloudinary.com/demo/video/upload/v1/videos/intro.mp4"
+        )
+        video = Video.objects.get()
+        self.assertEqual(
+            video.poster_url,
+            "https://res.cloudinary.com/demo/video/upload/so_1,w_640,c_limit,q_auto/v1/videos/intro.jpg",
+        )
+
+        admin_user = User.objects.create_superuser("admin", "a@example.com", "pw")
+        self.client.force_login(admin_user)
+        response = self.client.get(reverse("admin:app_video_changelist"))
+        self.assertContains(response, video.poster_url)
+        self.assertNotContains(response, "<video")
+
+
+class FakeUploader:
+    """Thay Cloudinary trong test: đếm số lần upload, trả về secure_url giả."""
+
+    def __init__(self):
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def __call__(self, path, resource_type):
+        with self.lock:
+            self.calls.append(str(path))
+            n = len(self.calls)
+        return {"secure_url": f"https://res.cloudinary.com/demo/{resource_type}/upload/v1/f{n}.jpg"}
+
+
+class SyncCloudinaryCommandTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media_root)
+        self.override.enable()
+        self.manifest = os.path.join(self.media_root, "manifest.sqlite3")
+
+        self.product = Product.objects.create(name="Phòng", image=make_image_file("a.jpg", color="red"))
+        # 2 ảnh phụ cùng nội dung -> chỉ upload 1 lần
+        ProductImage.objects.create(product=self.product, image=make_image_file("b.jpg", color="blue"))
+        ProductImage.objects.create(product=self.product, image=make_image_file("c.jpg", color="blue"))
+        # đã ở trên cloud -> bỏ qua
+        Product.objects.create(name="Cloud", image="https://res.cloudinary.com/demo/image/upload/x.jpg")
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def sync(self, uploader, **options):
+        call_command(
+            "sync_cloudinary", uploader=uploader, manifest=self.manifest,
+            workers=2, batch_size=1, stdout=StringIO(), **options,
+        )
+
+    def test_uploads_once_per_content_and_updates_rows(self):
+        uploader = FakeUploader()
+        self.sync(uploader)
+
+        self.assertEqual(len(uploader.calls), 2)
+        self.product.refresh_from_db()
+        self.assertTrue(self.product.image.name.startswith("https://res.cloudinary.com/"))
+        self.assertEqual(self.product.image_url, self.product.image.name)
+        urls = set(ProductImage.objects.values_list("image_src", flat=True))
+        self.assertEqual(len(urls), 1)
+
+    def test_rerun_resumes_from_manifest(self):
+        self.sync(FakeUploader())
+        # giả lập lần chạy trước bị ngắt sau khi upload nhưng trước khi ghi DB
+        ProductImage.objects.update(image="products/b.jpg", image_src="")
+        uploader = FakeUploader()
+        self.sync(uploader)
+        self.assertEqual(uploader.calls, [])
+        self.assertFalse(ProductImage.objects.filter(image_src="").exists())
+
+    def test_interrupted_run_keeps_finished_uploads(self):
+        colors = ["green", "yellow", "white", "black", "purple", "orange"]
+        for i, color in enumerate(colors):
+            Product.objects.create(name=f"P{i}", image=make_image_file(f"p{i}.jpg", color=color))
+
+        seen = []
+
+        def interrupting_sha256(path):
+            seen.append(path)
+            if len(seen) > len(colors):
+                raise KeyboardInterrupt
+            return file_sha256(path)
+
+        first = FakeUploader()
+        out = StringIO()
+        with mock.patch("app.management.commands.sync_cloudinary.file_sha256", interrupting_sha256):
+            with self.assertRaises(CommandError):
+                call_command(
+                    "sync_cloudinary", uploader=first, manifest=self.manifest,
+                    workers=1, stdout=out,
+                )
+        self.assertIn("[đã dừng giữa chừng] uploaded=", out.getvalue())
+
+        # mọi upload đã gửi đi (kể cả đang chạy lúc Ctrl+C) đều được chờ xong và ghi manifest
+        with sqlite3.connect(self.manifest) as conn:
+            recorded = {row[0] for row in conn.execute("SELECT source FROM uploads")}
+        self.assertEqual(recorded, set(first.calls))
+        self.assertEqual(len(recorded), len(colors))
+        # và DB của các file đó đã trỏ sang URL mới
+        self.assertEqual(
+            Product.objects.filter(image__startswith="https://res.cloudinary.com/demo/image/upload/v1/").count(),
+            len(recorded),
+        )
+
+        second = FakeUploader()
+        self.sync(second)
+        self.assertFalse(recorded & set(second.calls))
+        self.assertFalse(Product.objects.exclude(image__startswith="https://").exists())
+
+    def test_dry_run_changes_nothing(self):
+        uploader = FakeUploader()
+        self.sync(uploader, dry_run=True)
+        self.assertEqual(uploader.calls, [])
+        self.product.refresh_from_db()
+        self.assertFalse(self.product.image.name.startswith("http"))
+
+
+class StreamFixtureCommandTests(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, "fixture.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_parser_reads_array_and_jsonl_in_small_chunks(self):
+        objs = [{"model": "app.contact", "pk": i, "fields": {"name": "Tên, [x] {y}" * i}} for i in range(1, 6)]
+        for text in (json.dumps(objs, indent=2), "\n".join(json.dumps(o) for o in objs) + "\n"):
+            self.assertEqual(list(iter_json_objects(StringIO(text), chunk_size=7)), objs)
+
+    def test_dump_then_load_roundtrip_with_m2m(self):
+        group = Group.objects.create(name="Chủ trọ")
+        user = User.objects.create_user("host", password="x")
+        user.groups.add(group)
+        product = Product.objects.create(name="Phòng A", price=1000000)
+        Comment.objects.create(product=product, name="Lan", content="Đẹp")
+
+        for fmt in ("json", "jsonl"):
+            call_command(
+                "streamdump", "auth.Group", "auth.User", "app.Product", "app.Comment",
+                output=self.path, format=fmt, batch_size=1, stdout=StringIO(),
+            )
+            Comment.objects.all().delete()
+            user.groups.clear()
+            Product.objects.filter(pk=product.pk).update(name="Đã sửa")
+
+            call_command("streamload", self.path, batch_size=1, stdout=StringIO())
+            self.assertEqual(Product.objects.get(pk=product.pk).name, "Phòng A")
+            self.assertEqual(list(user.groups.all()), [group])
+            self.assertEqual(Comment.objects.get().content, "Đẹp")
+
+    def test_load_rebuilds_media_src_and_conversations(self):
+        user = User.objects.create_user("khach", password="x")
+        product = Product.objects.create(name="Phòng B", image="https://res.cloudinary.com/demo/image/upload/b.jpg")
+        DirectChatMessage.objects.create(user=user, sender="user", message="Còn phòng không?")
+        DirectChatMessage.objects.create(user=user, sender="admin", message="Còn ạ", is_read=True)
+        call_command(
+            "streamdump", "auth.User", "app.Product", "app.DirectChatMessage",
+            output=self.path, batch_size=1, stdout=StringIO(),
+        )
+        # fixture cũ / xuất từ DB khác: chưa có cột src, chưa có bảng hội thoại
+        Product.objects.filter(pk=product.pk).update(image_src="")
+        Conversation.objects.all().delete()
+        with open(self.path, encoding="utf-8") as fp:
+            objs = json.load(fp)
+        for obj in objs:
+            obj["fields"].pop("image_src", None)
+        with open(self.path, "w", encoding="utf-8") as fp:
+            json.dump(objs, fp)
+
+        call_command("streamload", self.path, stdout=StringIO())
+
+        product.refresh_from_db()
+        self.assertEqual(product.image_src, "https://res.cloudinary.com/demo/image/upload/b.jpg")
+        conv = Conversation.objects.get(user=user)
+        self.assertEqual((conv.total_messages, conv.unread_count, conv.last_sender), (2, 1, "admin"))
+
+    def test_truncated_fixture_rolls_back(self):
+        with open(self.path, "w", encoding="utf-8") as fp:
+            fp.write('[{"model": "app.contact", "pk": 1, "fields": {"name": "A", "email": "a@x.vn",'
+                     ' "message": "m", "created_at": "2025-11-15T14:21:51.728Z"}}, {"model": ')
+
+        with self.assertRaises(CommandError):
+            call_command("streamload", self.path, stdout=StringIO())
+        self.assertFalse(Contact.objects.exists())
+
+
+class SeedAndBenchmarkTests(TestCase):
+    def test_seed_data_is_deterministic_and_consistent(self):
+        counts = seed_data(customers=5, products=20, seed=1)
+        self.assertEqual(counts["Product"], 20)
+        self.assertEqual(counts["Customer"], 5)
+        self.assertEqual(Order.objects.filter(complete=True, completed_at__isnull=True).count(), 0)
+        self.assertEqual(
+            sorted(Conversation.objects.values_list("total_messages", flat=True)),
+            [8] * 5,
+        )
+        names = list(Product.objects.order_by("id").values_list("name", "district", "price"))
+        Product.objects.all().delete()
+        seed_data(customers=5, products=20, seed=1)
+        self.assertEqual(list(Product.objects.order_by("id").values_list("name", "district", "price")), names)
+
+    def test_benchmark_report_covers_key_views_and_restores_cart(self):
+        seed_data(customers=3, products=15, open_cart_ratio=1, seed=3)
+        cart = OrderItem.objects.filter(order__complete=False).values_list("order_id", "product_id", "quantity")
+        cart_before = sorted(cart)
+
+        report = run_benchmark(requests=3, warmup=1)
+
+        self.assertEqual(
+            set(report["results"]),
+            {"home", "product_page", "product_page_filtered", "product_detail", "update_item", "get_direct_messages"},
+        )
+        for row in report["results"].values():
+            self.assertEqual(row["status"], [200])
+            self.assertLessEqual(row["p50_ms"], row["p95_ms"])
+            self.assertGreater(row["queries_max"], 0)
+        json.dumps(report)
+        self.assertEqual(sorted(cart.all()), cart_before)
+
+    def test_percentile_nearest_rank(self):
+        values = list(range(1, 21))
+        self.assertEqual(percentile(values, 50), 10)
+        self.assertEqual(percentile(values, 95), 19)
+        self.assertEqual(percentile([7], 95), 7)
+
+
+class URLQueryBudgetTests(TestCase):
+    """
+    Ngân sách số query cho từng URL trong app/urls.py trên dữ liệu seed_data.
+    Thêm URL mới -> phải thêm ngân sách vào BUDGETS (test_every_url_has_a_budget).
+    Tăng ngân sách chỉ khi đã hiểu vì sao view cần thêm query.
+
+    Thời gian SQL phụ thuộc máy chạy test nên mặc định không kiểm tra; muốn đo thì bật
+    QUERY_BUDGET_SQL_MS=<ms> (biến môi trường), áp cho mọi URL.
+    """
+
+    # tên URL -> (user đăng nhập: None / "user" / "staff", max query)
+    # số query gồm cả session + auth user (2 query) khi đã đăng nhập
+    BUDGETS = {
+        "home": ("user", 10),
+        "product": ("user", 8),
+        "product_detail": ("user", 12),
+        "add_comment": ("user", 4),
+        "cart": ("user", 9),
+        "checkout": ("user", 6),
+        "update_item": ("user", 12),
+        "wishlist": ("user", 7),
+        "toggle_wishlist": ("user", 8),
+        "login": (None, 0),
+        "signup": (None, 0),
+        "logout": ("user", 4),
+        "chatbot_ai": ("user", 4),
+        "direct_chat": ("user", 2),
+        "direct_chat_admin": ("staff", 3),
+        "send_direct_message": ("user", 4),
+        "get_direct_messages": ("user", 3),
+        "get_direct_messages_for_user": ("staff", 4),
+        "order_success": ("user", 9),
+        "contact": (None, 0),
+        "video_list": (None, 1),
+        "video_detail": (None, 1),
+        "process_order": ("user", 6),
+        "order_detail": ("user", 10),
+        "order_history": ("user", 9),
+        "delete_order": ("user", 5),
+        "profiling_stats": ("staff", 2),
+        "metrics": ("staff", 2),
+    }
+    # view render template chưa có trong repo -> chưa đo được
+    MISSING_TEMPLATES = {
+        "direct_chat_admin": "app/direct_chat_admin.html",
+        "video_list": "app/video_list.html",
+        "video_detail": "app/video_detail.html",
+        "order_detail": "app/order_detail.html",
+    }
+    # không có name hoặc không phải view của app
+    UNBUDGETED = {"admin/", "debug/run-task/"}
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_data(customers=4, products=30, open_cart_ratio=1, seed=5)
+        cls.user = User.objects.filter(customer__order__complete=False).order_by("pk").first()
+        cls.staff = User.objects.create_superuser("budget_admin", "admin@example.com", "pw")
+        cls.product = Product.objects.order_by("pk").first()
+        cls.order = Order.objects.filter(customer__user=cls.user, complete=True).order_by("pk").first()
+        cls.video = Video.objects.create(title="Review phòng", url="https://example.com/v.mp4")
+
+    def request_for(self, name):
+        """(method, url, kwargs cho client) của 1 request tiêu biểu cho URL `name`."""
+        def json_post(body):
+            return {"data": json.dumps(body), "content_type": "application/json"}
+
+        requests = {
+            "product_detail": ("get", [self.product.pk], {}),
+            "add_comment": ("post", [self.product.pk], json_post({"content": "Phòng đẹp"})),
+            "update_item": ("post", [], json_post({"productId": self.product.pk, "action": "add"})),
+            "toggle_wishlist": ("post", [], json_post({"product_id": self.product.pk})),
+            "chatbot_ai": ("post", [], json_post({"message": "Phòng trọ"})),
+            "send_direct_message": ("post", [], {"data": {"message": "Xin chào"}}),
+            "get_direct_messages_for_user": ("get", [self.user.pk], {}),
+            "order_success": ("get", [self.order.pk], {}),
+            "contact": ("post", [], {"data": {"name": "A", "email": "a@example.com", "message": "Hỏi phòng"}}),
+            "video_detail": ("get", [self.video.pk], {}),
+            "process_order": ("post", [], {"data": {"address": "1 Lê Lợi", "city": "HCM", "state": "Quận 1"}}),
+            "order_detail": ("get", [self.order.pk], {}),
+            "delete_order": ("post", [self.order.pk], {}),
+            "logout": ("post", [], {}),
+        }
+        method, args, kwargs = requests.get(name, ("get", [], {}))
+        return method, reverse(name, args=args), kwargs
+
+    def measure(self, name):
+        login, max_queries = self.BUDGETS[name]
+        max_sql_ms = float(os.environ.get("QUERY_BUDGET_SQL_MS") or 0) or None
+        if login:
+            self.client.force_login(self.staff if login == "staff" else self.user)
+        method, url, kwargs = self.request_for(name)
+        with mock.patch("app.services.ask_gemini", return_value="Gợi ý phòng"), \
+                mock.patch("app.views.send_contact_email"):
+            with QueryBudget(f"{method.upper()} {url}", max_queries, max_sql_ms) as budget:
+                response = getattr(self.client, method)(url, **kwargs)
+        self.assertLess(response.status_code, 400, f"{name}: {response.status_code}")
+        return budget
+
+    def test_every_url_has_a_budget(self):
+        for pattern in app_urls.urlpatterns:
+            if isinstance(pattern, URLPattern) and pattern.name:
+                self.assertIn(pattern.name, self.BUDGETS, f"Thiếu ngân sách query cho URL '{pattern.name}'")
+            else:
+                self.assertIn(str(pattern.pattern), self.UNBUDGETED)
+
+    def test_url_budgets(self):
+        failures = []
+        for name in self.BUDGETS:
+            with self.subTest(name):
+                if name in self.MISSING_TEMPLATES:
+                    self.skipTest(f"thiếu template {self.MISSING_TEMPLATES[name]}")
+                sid = transaction.savepoint()
+                try:
+                    self.measure(name).check()
+                except QueryBudgetExceeded as e:
+                    failures.append(str(e))
+                finally:
+                    transaction.savepoint_rollback(sid)
+                    self.client.logout()
+        if failures:
+            self.fail("Vượt ngân sách query:\n\n" + "\n\n".join(failures))
+
+    def test_budget_report_groups_repeated_queries(self):
+        products = list(Product.objects.order_by("pk")[:3])
+        with QueryBudget("ít", max_queries=1) as small:
+            Product.objects.get(pk=products[0].pk)
+        with QueryBudget("nhiều", max_queries=1) as large:
+            for p in products:
+                Product.objects.get(pk=p.pk)
+
+        small.check()
+        with self.assertRaises(QueryBudgetExceeded) as ctx:
+            large.check()
+        self.assertIn("3 query (ngân sách 1, vượt 2)", str(ctx.exception))
+        self.assertIn("⚠️ ×3", str(ctx.exception))
+        self.assertEqual(small.diff(large).count("\n+SELECT"), 2)
+        self.assertEqual(
+            normalize_sql("SELECT * FROM t WHERE id IN (1, 2, 3) AND name = 'O''Brien' LIMIT 21"),
+            "SELECT * FROM t WHERE id IN (...) AND name = ? LIMIT ?",
+        )
+
+
+class ProfilingMiddlewareTests(TestCase):
+    def setUp(self):
+        self.profile_dir = tempfile.mkdtemp()
+        profile_store.reset()
+        Product.objects.create(name="Phòng A", price=2_500_000)
+
+    def tearDown(self):
+        profile_store.reset()
+        shutil.rmtree(self.profile_dir, ignore_errors=True)
+
+    def test_disabled_by_default(self):
+        response = self.client.get(reverse("home"))
+        self.assertNotIn("Server-Timing", response)
+        self.assertEqual(profile_store.summary(), [])
+
+    def test_records_sql_template_and_samples_cprofile(self):
+        with override_settings(PROFILING_ENABLED=True, PROFILING_SAMPLE_RATE=1, PROFILING_DIR=self.profile_dir):
+            response = self.client.get(reverse("home"))
+            self.assertIn("sql;dur=", response["Server-Timing"])
+
+            self.client.force_login(User.objects.create_user("staff", password="pw", is_staff=True))
+            stats = self.client.get(reverse("profiling_stats")).json()
+
+        home = next(row for row in stats["views"] if row["view"] == "home")
+        self.assertEqual(home["requests"], 1)
+        self.assertGreater(home["avg_sql_queries"], 0)
+        self.assertGreater(home["avg_template_ms"], 0)
+        self.assertTrue(any(name.endswith(".prof") and "-home-" in name for name in os.listdir(self.profile_dir)))
+
+    def test_stats_endpoint_is_staff_only(self):
+        self.client.force_login(User.objects.create_user("khach", password="pw"))
+        response = self.client.get(reverse("profiling_stats"))
+        self.assertEqual(response.status_code, 302)
+
+
+class MetricsTests(TestCase):
+    def sample(self, text, line_prefix):
+        for line in text.splitlines():
+            if line.startswith(line_prefix + " "):
+                return float(line.rsplit(" ", 1)[1])
+        return 0.0
+
+    def scrape(self):
+        return self.client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer s3cret").content.decode()
+
+    @override_settings(METRICS_TOKEN="s3cret")
+    def test_exposition_format_and_view_metrics(self):
+        Product.objects.create(name="Phòng A", price=2_500_000)
+        before = self.sample(self.scrape(), 'http_requests_total{view="home",method="GET",status="200"}')
+        self.client.get(reverse("home"))
+        text = self.scrape()
+
+        self.assertIn("# TYPE http_request_duration_seconds histogram", text)
+        self.assertEqual(
+            self.sample(text, 'http_requests_total{view="home",method="GET",status="200"}'), before + 1
+        )
+        self.assertGreater(self.sample(text, 'db_queries_total{view="home"}'), 0)
+        self.assertEqual(
+            self.sample(text, 'http_request_duration_seconds_bucket{view="home",le="+Inf"}'),
+            self.sample(text, 'http_request_duration_seconds_count{view="home"}'),
+        )
+
+    @override_settings(METRICS_TOKEN="s3cret", PROFILING_ENABLED=True)
+    def test_shares_sql_recorder_with_profiling(self):
+        from .request_sql import record_sql
+
+        # 2 middleware chỉ gắn 1 execute_wrapper / connection
+        with record_sql() as outer, record_sql(on_query=lambda seconds: None) as inner:
+            self.assertIs(outer, inner)
+            self.assertEqual(len(connection.execute_wrappers), 1)
+            Product.objects.count()
+        self.assertEqual((outer.count, outer.listeners, connection.execute_wrappers), (1, [], []))
+
+        profile_store.reset()
+        self.addCleanup(profile_store.reset)
+        before = self.sample(self.scrape(), 'db_queries_total{view="home"}')
+        self.client.get(reverse("home"))
+        queries = self.sample(self.scrape(), 'db_queries_total{view="home"}') - before
+        home = next(row for row in profile_store.summary() if row["view"] == "home")
+        self.assertGreater(queries, 0)
+        self.assertEqual(home["avg_sql_queries"], queries)
+
+    @override_settings(METRICS_TOKEN="s3cret", DEBUG=False)
+    def test_requires_token_or_staff(self):
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 403)
+        self.assertEqual(self.client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer sai").status_code, 403)
+        self.client.force_login(User.objects.create_user("staff", password="pw", is_staff=True))
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 200)
+
+    @override_settings(METRICS_TOKEN="s3cret")
+    def test_worker_http_server_is_local_and_requires_token(self):
+        from urllib.error import HTTPError
+        from urllib.request import Request, urlopen
+
+        server = metrics.start_http_server(0)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        host, port = server.server_address[:2]
+        self.assertEqual(host, "127.0.0.1")
+
+        url = f"http://127.0.0.1:{port}/metrics"
+        with self.assertRaises(HTTPError) as ctx:
+            urlopen(Request(url, headers={"Authorization": "Bearer sai"}), timeout=5)
+        self.assertEqual(ctx.exception.code, 403)
+        with urlopen(Request(url, headers={"Authorization": "Bearer s3cret"}), timeout=5) as resp:
+            self.assertIn("# TYPE", resp.read().decode())
+
+    def test_histogram_buckets_and_label_escaping(self):
+        registry = metrics.Registry()
+        hist = metrics.Histogram("x_seconds", "X.", ("name",), buckets=(0.1, 1), registry=registry)
+        hist.labels('a"b').observe(0.1)
+        hist.labels('a"b').observe(5)
+        text = registry.expose()
+        self.assertIn('x_seconds_bucket{name="a\\"b",le="0.1"} 1', text)
+        self.assertIn('x_seconds_bucket{name="a\\"b",le="+Inf"} 2', text)
+        self.assertIn('x_seconds_sum{name="a\\"b"} 5.1', text)
+
+    def test_gemini_and_celery_task_metrics(self):
+        from .tasks import send_contact_email
+        from .utils import ask_gemini
+
+        with mock.patch("app.utils.genai.GenerativeModel", side_effect=Exception("429 quota")):
+            ask_gemini("xin chào")
+        self.assertGreaterEqual(metrics.gemini_requests.labels("quota").value, 1)
+
+        task = send_contact_email.name
+        before = metrics.celery_tasks.labels(task, "SUCCESS").value
+        send_contact_email.apply(args=("Chủ đề", "Nội dung", "a@example.com"))
+        self.assertEqual(metrics.celery_tasks.labels(task, "SUCCESS").value, before + 1)
+        self.assertGreaterEqual(sum(metrics.celery_task_duration.labels(task).counts), 1)
+
+
+class HotQueryIndexTests(TestCase):
+    """
+    Các truy vấn nóng (views.py / admin.py) phải dùng được index của migration 0040.
+    PostgreSQL: tắt seq scan để kiểm tra planner *có thể* dùng index (bảng test nhỏ, seq scan luôn rẻ hơn).
+    SQLite: đọc EXPLAIN QUERY PLAN.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_data(customers=20, products=300, seed=11)
+        cls.user = User.objects.filter(username__startswith="seed_user_").order_by("pk").first()
+        cls.customer = cls.user.customer
+
+    def setUp(self):
+        if connection.vendor not in ("postgresql", "sqlite"):
+            self.skipTest("chỉ kiểm tra trên PostgreSQL / SQLite")
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+            if connection.vendor == "postgresql":
+                cursor.execute("SET LOCAL enable_seqscan = off")
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan, f"{index_name} không được dùng:\n{plan}")
+
+    def test_product_filters(self):
+        self.assertUsesIndex(
+            Product.objects.filter(district="Quận 1").order_by("-id")[:12], "product_district_cat_id_idx"
+        )
+        self.assertUsesIndex(
+            Product.objects.filter(district="Quận 1", category="rental").order_by("-id")[:12],
+            "product_district_cat_id_idx",
+        )
+        self.assertUsesIndex(
+            Product.objects.filter(category="rental", price__gte=2_000_000, price__lt=4_000_000).order_by("price"),
+            "product_category_price_idx",
+        )
+        self.assertUsesIndex(
+            Product.objects.filter(price__gte=6_000_000).order_by("price")[:12], "product_price_idx"
+        )
+        self.assertUsesIndex(
+            Product.objects.filter(discount_percent__gt=0).order_by("-id")[:8], "product_on_sale_idx"
+        )
+
+    def test_open_cart_and_order_history(self):
+        self.assertUsesIndex(
+            Order.objects.filter(customer=self.customer, complete=False)[:1], "one_open_order_per_customer"
+        )
+        self.assertUsesIndex(
+            Order.objects.filter(customer=self.customer, complete=True).order_by("-date_order"),
+            "order_customer_complete_idx",
+        )
+
+    def test_chat_and_wishlist(self):
+        self.assertUsesIndex(
+            DirectChatMessage.objects.filter(user=self.user).order_by("-id")[:50], "directchat_user_id_idx"
+        )
+        self.assertUsesIndex(
+            DirectChatMessage.objects.filter(user=self.user).order_by("created_at"), "directchat_user_created_idx"
+        )
+        self.assertUsesIndex(
+            DirectChatMessage.objects.filter(user=self.user, sender="user", is_read=False),
+            "directchat_unread_idx",
+        )
+        self.assertUsesIndex(
+            Wishlist.objects.filter(user=self.user).order_by("-date_added"), "wishlist_user_added_idx"
+        )
+
+    def test_comments_use_composite_index(self):
+        product = Product.objects.order_by("pk").first()
+        self.assertUsesIndex(
+            Comment.objects.filter(product=product).order_by("-created_at"), "comment_product_created_idx"
+        )
+
+    def test_no_redundant_fk_indexes(self):
+        # FK đã là cột đầu của index ghép -> không còn index riêng 1 cột (trừ index partial)
+        partial = {"directchat_unread_idx"}
+        for model, column in ((Order, "customer_id"), (Comment, "product_id"), (DirectChatMessage, "user_id")):
+            with connection.cursor() as cursor:
+                constraints = connection.introspection.get_constraints(cursor, model._meta.db_table)
+            single = {
+                name for name, c in constraints.items()
+                if c["index"] and not c["unique"] and c["columns"] == [column]
+            }
+            self.assertEqual(single - partial, set(), model._meta.db_table)
+
+
+class OpenCartTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("khach", password="pw")
+        self.customer = Customer.objects.create(user=self.user, name="Khách")
+        self.product = Product.objects.create(name="Phòng", price=3_000_000, category="rental", district="Quận 1")
+        self.client.force_login(self.user)
+
+    def add(self, action="add"):
+        return self.client.post(
+            reverse("update_item"), json.dumps({"productId": self.product.pk, "action": action}),
+            content_type="application/json",
+        )
+
+    def test_one_open_order_per_customer(self):
+        Order.objects.create(customer=self.customer)
+        Order.objects.create(customer=self.customer, complete=True)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Order.objects.create(customer=self.customer)
+        # đơn không gắn customer không bị ràng buộc
+        Order.objects.create()
+        Order.objects.create()
+
+    def test_open_cart_single_query(self):
+        cart = Order.objects.create(customer=self.customer)
+        with self.assertNumQueries(1):
+            self.assertEqual(Order.objects.open_cart(self.customer), cart)
+        cart.complete = True
+        cart.save()
+        self.assertIsNone(Order.objects.open_cart(self.customer, create=False))
+        self.assertNotEqual(Order.objects.open_cart(self.customer), cart)
+
+    def test_concurrent_create_reuses_existing_cart(self):
+        existing = Order.objects.create(customer=self.customer)
+        real_get = OrderQuerySet.get
+        calls = []
+
+        def racing_get(queryset, *args, **kwargs):
+            # lần đọc đầu chưa thấy giỏ: request khác tạo giỏ ngay sau đó
+            calls.append(kwargs)
+            if len(calls) == 1:
+                raise Order.DoesNotExist
+            return real_get(queryset, *args, **kwargs)
+
+        with mock.patch.object(OrderQuerySet, "get", racing_get):
+            self.assertEqual(Order.objects.open_cart(self.customer), existing)
+        self.assertEqual(Order.objects.filter(customer=self.customer, complete=False).count(), 1)
+
+    def test_update_item_uses_single_cart(self):
+        for expected in (1, 2, 3):
+            self.assertEqual(self.add().json()["total_quantity"], expected)
+        data = self.add("remove").json()
+        self.assertEqual((data["quantity"], data["total_quantity"], data["total_price"]), (2, 2, 6_000_000))
+        cart = Order.objects.get(customer=self.customer, complete=False)
+        self.assertEqual(cart.orderitem_set.get().quantity, 2)
+
+    def test_process_order_with_empty_cart_creates_nothing(self):
+        response = self.client.post(reverse("process_order"), {"address": "1 Lê Lợi", "city": "HCM"})
+        self.assertRedirects(response, reverse("cart"), fetch_redirect_response=False)
+        self.assertFalse(Order.objects.exists())
+
+
+class RequestCustomerTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("khach", password="pw", email="khach@example.com")
+
+    def test_customer_created_once_and_loaded_with_user(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse("cart"))
+        customer = Customer.objects.get(user=self.user)
+        self.assertEqual((customer.name, customer.email), ("khach", "khach@example.com"))
+
+        # session -> user + customer trong 1 query (JOIN), không query thêm khi đọc request.customer
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse("order_history"))
+        user_queries = [q["sql"] for q in ctx.captured_queries if 'FROM "auth_user"' in q["sql"]]
+        self.assertEqual(len(user_queries), 1)
+        self.assertIn("app_customer", user_queries[0])
+        self.assertFalse(any('FROM "app_customer"' in q["sql"] for q in ctx.captured_queries))
+        self.assertEqual(Customer.objects.filter(user=self.user).count(), 1)
+
+    def test_cart_info_uses_request_customer(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse("home"))  # user tạo ngoài signup -> request.customer tự tạo Customer
+        customer = Customer.objects.get(user=self.user)
+        order = Order.objects.create(customer=customer)
+        OrderItem.objects.create(order=order, product=Product.objects.create(name="Phòng", price=100_000), quantity=2)
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse("home"))
+        self.assertEqual((response.context["incomplete_count"], response.context["incomplete_total"]), (2, 200_000))
+        self.assertFalse(any('FROM "app_customer"' in q["sql"] for q in ctx.captured_queries))
+
+    def test_legacy_session_backend_still_logged_in(self):
+        self.client.force_login(self.user, backend="django.contrib.auth.backends.ModelBackend")
+        response = self.client.get(reverse("order_history"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.session["_auth_user_backend"], "app.accounts.CustomerBackend")
+
+    def test_signup_creates_customer(self):
+        self.client.post(reverse("signup"), {
+            "username": "moi", "email": "moi@example.com", "phone": "0900000000",
+            "password1": "Mk-rat-dai-123", "password2": "Mk-rat-dai-123",
+        })
+        customer = Customer.objects.get(user__username="moi")
+        self.assertEqual((customer.email, customer.phone), ("moi@example.com", "0900000000"))
+
+
+class ConversationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("khach", password="pw")
+
+    def send(self, sender, message="xin chào"):
+        return DirectChatMessage.objects.create(user=self.user, sender=sender, message=message)
+
+    def test_record_message(self):
+        self.send("user", "tin 1")
+        self.send("user", "tin 2")
+        self.send("admin", "x" * 200)
+        conv = Conversation.objects.get(user=self.user)
+        self.assertEqual((conv.total_messages, conv.unread_count, conv.last_sender), (3, 2, "admin"))
+        self.assertEqual(conv.last_message, "x" * 140 + "...")
+
+    def test_mark_read(self):
+        self.send("user")
+        self.send("user")
+        Conversation.mark_read(self.user)
+        self.assertEqual(Conversation.objects.get(user=self.user).unread_count, 0)
+        self.assertFalse(DirectChatMessage.objects.filter(user=self.user, is_read=False).exists())
+
+    def test_delete_recomputes_summary(self):
+        first = self.send("user", "tin 1")
+        last = self.send("user", "tin 2")
+        with self.captureOnCommitCallbacks(execute=True):
+            last.delete()
+        conv = Conversation.objects.get(user=self.user)
+        self.assertEqual((conv.total_messages, conv.unread_count, conv.last_message), (1, 1, "tin 1"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            DirectChatMessage.objects.filter(pk=first.pk).delete()
+        conv.refresh_from_db()
+        self.assertEqual((conv.total_messages, conv.unread_count, conv.last_message, conv.last_time), (0, 0, "", None))
+
+        self.send("user")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.delete()
+        self.assertFalse(Conversation.objects.exists())
+
+    def test_bulk_delete_refreshes_each_conversation_once(self):
+        other = User.objects.create_user("khach2", password="pw")
+        for i in range(10):
+            self.send("user", f"tin {i}")
+            DirectChatMessage.objects.create(user=other, sender="user", message=f"tin {i}")
+        keep = self.send("admin", "còn lại")
+
+        with mock.patch.object(Conversation, "refresh", wraps=Conversation.refresh) as refresh:
+            with self.captureOnCommitCallbacks(execute=True):
+                DirectChatMessage.objects.exclude(pk=keep.pk).delete()
+        self.assertEqual(sorted(c.args[0] for c in refresh.call_args_list), [self.user.pk, other.pk])
+        conv = Conversation.objects.get(user=self.user)
+        self.assertEqual((conv.total_messages, conv.last_message), (1, "còn lại"))
+
+        # xóa user hàng loạt (admin) -> không tính lại hội thoại của user đã bị xóa
+        with mock.patch.object(Conversation, "refresh") as refresh:
+            with self.captureOnCommitCallbacks(execute=True):
+                User.objects.filter(pk__in=[self.user.pk, other.pk]).delete()
+        refresh.assert_not_called()
+
+    def test_admin_changelist_redirects_to_inbox(self):
+        self.client.force_login(User.objects.create_superuser("admin", "a@example.com", "pw"))
+        response = self.client.get(reverse("admin:app_directchatmessage_changelist"))
+        self.assertRedirects(response, reverse("admin:app_conversation_changelist"))
+
+
+@override_settings(CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}})
+class DirectChatConsumerTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("khach", password="pw")
+        self.admin = User.objects.create_user("admin", password="pw", is_staff=True)
+        presence._store = None
+        patches = [
+            mock.patch.object(consumers, "_presence", consumers.PresenceBroadcaster(0.2)),
+            mock.patch.object(consumers, "_sweep_throttle", consumers.Throttle(0)),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        self.addCleanup(setattr, presence, "_store", None)
+
+    async def connect(self, user, room_id=None):
+        communicator = WebsocketCommunicator(
+            URLRouter(websocket_urlpatterns), f"/ws/chat/{room_id or self.user.id}/",
+        )
+        communicator.scope["user"] = user
+        connected, code = await communicator.connect()
+        return communicator, connected, code
+
+    async def receive_event(self, communicator, event_type, timeout=1):
+        while True:
+            event = await communicator.receive_json_from(timeout=timeout)
+            if event.get("type") == event_type:
+                return event
+
+    async def test_presence_final_state_sent_after_quick_disconnect(self):
+        admin, _, _ = await self.connect(self.admin)
+        user, connected, _ = await self.connect(self.user)
+        self.assertTrue(connected)
+        self.assertEqual(await self.receive_event(admin, "presence"), {
+            "type": "presence", "user_id": str(self.user.id), "online": True,
+        })
+        # ngắt ngay trong khoảng chờ -> offline vẫn được gửi khi hết khoảng chờ
+        await user.disconnect()
+        event = await self.receive_event(admin, "presence")
+        self.assertFalse(event["online"])
+        await admin.disconnect()
+
+    async def test_heartbeat_expiry_broadcasts_offline(self):
+        admin, _, _ = await self.connect(self.admin)
+        user, _, _ = await self.connect(self.user)
+        await self.receive_event(admin, "presence")
+
+        store = presence.get_presence_store()
+        store._expiry = {member: 0 for member in store._expiry}  # heartbeat quá hạn
+        await admin.send_json_to({"type": "presence_query"})
+        self.assertEqual(await self.receive_event(admin, "presence_list"), {"type": "presence_list", "online": []})
+        self.assertFalse((await self.receive_event(admin, "presence"))["online"])
+
+        # kết nối gửi heartbeat trở lại -> online lại
+        await user.send_json_to({"type": "heartbeat"})
+        self.assertTrue((await self.receive_event(admin, "presence"))["online"])
+        await user.disconnect()
+        await admin.disconnect()
+
+    async def test_typing_is_throttled(self):
+        admin, _, _ = await self.connect(self.admin)
+        user, _, _ = await self.connect(self.user)
+        await user.send_json_to({"type": "typing"})
+        await user.send_json_to({"type": "typing"})
+        event = await self.receive_event(admin, "typing")
+        self.assertEqual((event["sender"], event["user_id"]), ("user", str(self.user.id)))
+        self.assertTrue(await admin.receive_nothing(timeout=0.3))
+        await user.disconnect()
+        await admin.disconnect()
+
+    async def test_rejects_anonymous_and_other_rooms(self):
+        from django.contrib.auth.models import AnonymousUser
+
+        other = await User.objects.acreate(username="khac")
+        for user, room_id in ((AnonymousUser(), self.user.id), (other, self.user.id), (self.admin, 999_999)):
+            communicator, connected, code = await self.connect(user, room_id)
+            self.assertFalse(connected)
+            self.assertEqual(code, consumers.CLOSE_UNAUTHORIZED)
+
+    async def test_frame_rate_limit(self):
+        with mock.patch.object(consumers, "CHAT_FRAME_RATE_LIMIT", (3, 0.001)):
+            user, _, _ = await self.connect(self.user)
+        for _ in range(3):
+            await user.send_json_to({"type": "heartbeat"})
+        await user.send_json_to({"type": "heartbeat"})
+        self.assertEqual(await user.receive_json_from(), {"error": "rate_limited"})
+        await user.disconnect()
+
+    async def test_message_rate_limit_and_image_url(self):
+        with mock.patch.object(consumers, "CHAT_MESSAGE_RATE_LIMIT", (2, 0.001)):
+            user, _, _ = await self.connect(self.user)
+        await user.send_json_to({"message": "", "image_url": "https://evil.example/x.png"})
+        self.assertEqual(await user.receive_json_from(), {"error": "image_url_not_allowed"})
+        for i in range(2):
+            await user.send_json_to({"message": f"tin {i}"})
+            self.assertEqual((await user.receive_json_from())["type"], "new_message")
+        await user.send_json_to({"message": "tin 3"})
+        self.assertEqual(await user.receive_json_from(), {"error": "rate_limited"})
+        await user.disconnect()
+
+        messages = [m async for m in DirectChatMessage.objects.filter(user=self.user).values_list("message", "image")]
+        self.assertEqual(messages, [("tin 0", ""), ("tin 1", "")])
+
+
+class ChatImagePipelineTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.staging_dir = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media_root, CHAT_UPLOAD_STAGING_DIR=self.staging_dir)
+        self.override.enable()
+        self.addCleanup(shutil.rmtree, self.staging_dir, True)
+        self.user = User.objects.create_user("khach", password="pw")
+        patcher = mock.patch("app.services.notify_chat_room")
+        self.notify = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def send_image(self):
+        from .services import create_direct_message
+
+        upload = SimpleUploadedFile("anh.jpg", make_image_file().read(), content_type="image/jpeg")
+        with mock.patch("app.tasks.run_task") as run_task:
+            with self.captureOnCommitCallbacks(execute=True):
+                msg = create_direct_message(self.user, "user", "", upload)
+        (task, message_id, staged_name), kwargs = run_task.call_args
+        self.assertEqual((task, message_id, kwargs), (process_chat_image, msg.id, {"background": True}))
+        return msg, staged_name
+
+    def staged_exists(self, staged_name):
+        return os.path.exists(os.path.join(self.staging_dir, staged_name))
+
+    def test_stages_to_local_dir_and_processes(self):
+        from django.core.files.storage import default_storage
+
+        msg, staged_name = self.send_image()
+        self.assertTrue(msg.image_pending)
+        self.assertTrue(staged_name.startswith("chat/"))
+        self.assertTrue(self.staged_exists(staged_name))
+        # request không ghi gì lên storage chính (Cloudinary trên production)
+        self.assertFalse(default_storage.exists(staged_name))
+        self.assertEqual(os.listdir(self.media_root), [])
+
+        result = process_chat_image.apply(args=(msg.id, staged_name)).get()
+        self.assertTrue(result["ok"])
+        msg.refresh_from_db()
+        self.assertFalse(msg.image_pending)
+        self.assertTrue(msg.image.name.startswith("chat_images/"))
+        self.assertTrue(msg.thumbnail)
+        self.assertFalse(self.staged_exists(staged_name))
+
+    def test_retries_then_clears_pending(self):
+        msg, staged_name = self.send_image()
+        with mock.patch("app.tasks.make_thumbnail", side_effect=OSError("storage down")) as thumb:
+            result = process_chat_image.apply(args=(msg.id, staged_name))
+        self.assertEqual(result.state, "FAILURE")
+        self.assertEqual(thumb.call_count, process_chat_image.max_retries + 1)
+
+        msg.refresh_from_db()
+        self.assertFalse(msg.image_pending)
+        self.assertFalse(msg.image)
+        self.assertFalse(self.staged_exists(staged_name))
+        self.notify.assert_called_with(self.user.id, {"type": "image_failed", "id": msg.id})
+
+    def test_run_task_background_fallback_does_not_block(self):
+        done = threading.Event()
+        task = mock.Mock()
+        task.name = "slow"
+        task.delay.side_effect = ConnectionError("no broker")
+        task.apply.side_effect = lambda args: done.wait(5)
+
+        self.assertIsNone(run_task(task, 1, background=True))  # trả về ngay, không chờ task
+        self.assertFalse(done.is_set())
+        done.set()
+        task.apply.assert_called_once_with(args=(1,))
+
+
+class DirectMessageHistoryAPITests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("khach", password="pw")
+        self.admin = User.objects.create_user("admin", password="pw", is_staff=True)
+        self.ids = [
+            DirectChatMessage.objects.create(user=self.user, sender="user", message=f"tin {i}").id
+            for i in range(7)
+        ]
+        other = User.objects.create_user("khac", password="pw")
+        DirectChatMessage.objects.create(user=other, sender="user", message="của người khác")
+        self.client.force_login(self.user)
+
+    def fetch(self, **params):
+        response = self.client.get(reverse("get_direct_messages"), params)
+        self.assertEqual(response.status_code, 200)
+        return [m["id"] for m in response.json()]
+
+    def test_latest_page_oldest_first(self):
+        with mock.patch("app.views.CHAT_PAGE_SIZE", 3):
+            self.assertEqual(self.fetch(), self.ids[-3:])
+        self.assertEqual(self.fetch(), self.ids)
+
+    def test_cursor_walks_back_without_overlap(self):
+        pages, before = [], None
+        while True:
+            params = {"limit": 3, **({"before": before} if before else {})}
+            page = self.fetch(**params)
+            if not page:
+                break
+            pages.append(page)
+            before = page[0]
+        self.assertEqual(pages, [self.ids[4:], self.ids[1:4], self.ids[:1]])
+
+    def test_limit_is_clamped_and_parsed_defensively(self):
+        self.assertEqual(self.fetch(limit=-5), self.ids[-1:])
+        self.assertEqual(self.fetch(limit=0), self.ids[-1:])
+        self.assertEqual(self.fetch(limit=""), self.ids)  # rỗng -> mặc định
+        self.assertEqual(self.fetch(limit="abc"), self.ids)
+        self.assertEqual(self.fetch(limit="2.5"), self.ids)
+        self.assertEqual(self.fetch(before="abc"), self.ids)
+        with mock.patch("app.views.CHAT_PAGE_SIZE_MAX", 2):
+            self.assertEqual(self.fetch(limit=100), self.ids[-2:])
+
+    def test_admin_reads_user_history(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse("get_direct_messages_for_user", args=[self.user.id]), {"limit": 2})
+        self.assertEqual([m["id"] for m in response.json()], self.ids[-2:])
+
+    def test_user_chat_page_pages_history(self):
+        response = self.client.get(reverse("direct_chat"))
+        self.assertContains(response, "const pageSize = 50;")
+        self.assertContains(response, 'id="load-older"')
+
+
+class MediaSrcSyncTests(TestCase):
+    ENCODED = "media/https%3A/res.cloudinary.com/demo/image/upload/v1/products/a.jpg"
+    URL = "https://res.cloudinary.com/demo/image/upload/v1/products/a.jpg"
+
+    def test_src_computed_at_write_time(self):
+        product = Product.objects.create(name="Phòng", image=self.ENCODED)
+        self.assertEqual(Product.objects.values_list("image_src", flat=True).get(pk=product.pk), self.URL)
+
+        product.image = "//res.cloudinary.com/demo/image/upload/v1/products/b.jpg"
+        with self.assertNumQueries(1):
+            self.assertTrue(_sync_media_src(product, "image", "image_src"))
+        self.assertEqual(
+            Product.objects.values_list("image_src", flat=True).get(pk=product.pk),
+            "https://res.cloudinary.com/demo/image/upload/v1/products/b.jpg",
+        )
+        with self.assertNumQueries(0):
+            self.assertFalse(_sync_media_src(product, "image", "image_src"))
+
+    def test_cleared_file_clears_src(self):
+        product = Product.objects.create(name="Phòng", image=self.URL)
+        product.image = ""
+        self.assertTrue(_sync_media_src(product, "image", "image_src"))
+        self.assertEqual(Product.objects.values_list("image_src", flat=True).get(pk=product.pk), "")
+
+    def test_migration_uses_frozen_helpers(self):
+        migration = importlib.import_module("app.migrations.0034_media_src")
+        self.assertIsNot(migration.decode_media_name, decode_media_name)
+        for name in (self.ENCODED, "/media/https%3A/x.example/a.png", "products/a.jpg", ""):
+            self.assertEqual(migration.decode_media_name(name), decode_media_name(name))
+        self.assertEqual(migration.decode_media_name(self.ENCODED), self.URL)
@@ -2,6 +2,8 @@ from django.contrib import admin
 from django.urls import path
 from django.contrib.auth import views as auth_views
 from . import views
+from .metrics import metrics_view
+from .profiling import profiling_stats
 from django.contrib.auth.views import LogoutView
 
 # -------------------
@@ -61,6 +63,7 @@ path("direct-chat/", views.direct_chat_user, name="direct_chat"),   # user chat
 path("direct-chat-admin/", views.direct_chat_admin, name="direct_chat_admin"),  # admin chat
 path("chat/send/", views.send_direct_message, name="send_direct_message"),
 path("chat/get/", views.get_direct_messages, name="get_direct_messages"),
+path("chat/get/<int:user_id>/", views.get_direct_messages, name="get_direct_messages_for_user"),
 path("order/success/<int:order_id>/", views.order_success, name="order_success"),
 path("contact/", views.contact_view, name="contact"),
   path("videos/", views.video_list, name="video_list"),
@@ -72,5 +75,7 @@ path("contact/", views.contact_view, name="contact"),
     # Django admin
     path("admin/", admin.site.urls),
     path('debug/run-task/', views.run_task_view),
+    path("debug/profiling/", profiling_stats, name="profiling_stats"),
+    path("metrics", metrics_view, name="metrics"),
 
 ]
@@ -1,12 +1,16 @@
+import time
 import google.generativeai as genai
 from django.conf import settings
 import logging
+from .metrics import gemini_request_duration, gemini_requests
 
 # Cấu hình Gemini với API key trong settings
 genai.configure(api_key=settings.GEMINI_API_KEY)
 
 def ask_gemini(prompt: str) -> str:
     """Gọi Gemini model để trả lời prompt"""
+    started = time.perf_counter()
+    status = "error"
     try:
         # ⚡ Dùng model mới (ổn định hơn)
         model = genai.GenerativeModel("gemini-2.0-flash")
@@ -14,8 +18,10 @@ def ask_gemini(prompt: str) -> str:
 
         # Nếu Gemini trả về text hợp lệ
         if response and hasattr(response, "text") and response.text:
+            status = "ok"
             return response.text.strip()
 
+        status = "empty"
         return "❌ Xin lỗi, hiện tại mình chưa nhận được phản hồi từ AI. Bạn có thể thử lại sau nhé!"
     
     except Exception as e:
@@ -23,8 +29,13 @@ def ask_gemini(prompt: str) -> str:
 
         err = str(e).lower()
         if "429" in err or "quota" in err:
+            status = "quota"
             return "⚠️ Server AI đang quá tải hoặc hết lượt trong ngày. Bạn vui lòng thử lại sau nhé!"
         elif "404" in err:
+            status = "not_found"
             return "⚠️ Model AI không tồn tại hoặc không được hỗ trợ. Vui lòng kiểm tra lại tên model!"
         else:
             return "❌ Có lỗi xảy ra khi kết nối AI. Vui lòng thử lại sau!"
+    finally:
+        gemini_requests.labels(status).inc()
+        gemini_request_duration.observe(time.perf_counter() - started)
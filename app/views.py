@@ -23,14 +23,14 @@ from django.views.decorators.csrf import csrf_exempt
 from .models import ShippingAddress, Order
 
 from django.db import transaction
-from django.db.models import F, Q, Sum, FloatField, Count
+from django.db.models import F, Q, Sum, FloatField, Count, Prefetch
 from django.db.models.functions import Coalesce  # ✅ thêm để tránh NULL
 
 from .models import (
     Product, Order, OrderItem, Wishlist,
     Customer, Comment, ChatMessage, DirectChatMessage
 )
-from .services import ask_with_products
+from .services import ask_with_products, create_direct_message, is_valid_image, direct_message_data
 from .utils import ask_gemini
 # =====================
 # Config
@@ -76,44 +76,26 @@ def chatbot_ai(request):
     return JsonResponse({"answer": "Phương thức không hợp lệ"}, status=400)
 
 
-# =====================
-# Helper để đảm bảo user luôn có Customer
-# =====================
-def get_or_create_customer(user):
-    """Đảm bảo user luôn có Customer liên kết"""
-    if not hasattr(user, "customer"):
-        customer, _ = Customer.objects.get_or_create(
-            user=user,
-            defaults={
-                "name": user.username,
-                "email": user.email,
-            },
-        )
-        return customer
-    return user.customer
-
-
 # =====================
 # Helper / Utils
 # =====================
-def get_cart_info(user) -> Tuple[int, float]:
-    """Trả về tổng số lượng và tổng tiền (ưu tiên giá giảm)."""
-    if user.is_authenticated and hasattr(user, "customer"):
-        customer = user.customer
-        order = (
-            Order.objects.filter(customer=customer, complete=False)
-            .prefetch_related("orderitem_set__product")
-            .first()
-        )
-        if order:
-            total_quantity = 0
-            total_price = 0
-            for item in order.orderitem_set.all():
-                if not item.product:
-                    continue
-                total_quantity += item.quantity
-                total_price += item.product.gia_giam * item.quantity
-            return total_quantity, float(total_price)
+def get_cart_info(request, order=None) -> Tuple[int, float]:
+    """
+    Trả về tổng số lượng và tổng tiền (ưu tiên giá giảm).
+    `order`: giỏ hàng view đã nạp sẵn (kèm prefetch orderitem_set__product) -> không query lại.
+    Customer lấy từ request.customer (CustomerMiddleware, đã resolve 1 lần / request).
+    """
+    if order is None and request.user.is_authenticated:
+        order = Order.objects.prefetch_related("orderitem_set__product").open_cart(request.customer, create=False)
+    if order:
+        total_quantity = 0
+        total_price = 0
+        for item in order.orderitem_set.all():
+            if not item.product:
+                continue
+            total_quantity += item.quantity
+            total_price += item.product.gia_giam * item.quantity
+        return total_quantity, float(total_price)
     return 0, 0
 
 
@@ -135,8 +117,8 @@ def extract_district_from_location(location: str) -> str:
     return location.strip()
 
 
-def get_base_context(request) -> dict:
-    incomplete_count, incomplete_total = get_cart_info(request.user)
+def get_base_context(request, cart=None) -> dict:
+    incomplete_count, incomplete_total = get_cart_info(request, cart)
     wishlist_count = get_wishlist_count(request.user)
     return {
         "incomplete_count": incomplete_count,
@@ -284,9 +266,16 @@ def product_page(request):
 # Chi tiết sản phẩm
 # =====================
 def product_detail(request, product_id):
-    product = get_object_or_404(Product, id=product_id)
-    Product.objects.filter(pk=product.pk).update(views=F("views") + 1)
-    product.refresh_from_db()
+    # tăng lượt xem trước rồi mới load (1 lần, kèm prefetch) -> không cần refresh_from_db
+    Product.objects.filter(pk=product_id).update(views=F("views") + 1)
+    product = get_object_or_404(
+        Product.objects.prefetch_related(
+            "images",
+            "videos",
+            Prefetch("comments", queryset=Comment.objects.select_related("user")),
+        ),
+        id=product_id,
+    )
     related_products = Product.objects.filter(
         category=product.category
     ).exclude(id=product.id)[:8]
@@ -304,12 +293,10 @@ def product_detail(request, product_id):
 # =====================
 @login_required
 def cart_view(request):
-    customer = get_or_create_customer(request.user)
-    order = Order.objects.filter(customer=customer, complete=False).first()
-    if not order:
-        order = Order.objects.create(customer=customer, complete=False)
+    customer = request.customer
+    order = Order.objects.prefetch_related("orderitem_set__product").open_cart(customer)
 
-    items = order.orderitem_set.select_related("product")
+    items = order.orderitem_set.all()
 
     cart_products = []
     for item in items:
@@ -332,7 +319,7 @@ def cart_view(request):
         .order_by("-date_order")   # 🔥 sửa lại ở đây
     )
 
-    context = get_base_context(request)
+    context = get_base_context(request, cart=order)
     context.update({
         "cart_products": cart_products,
         "incomplete_items": items,
@@ -346,7 +333,7 @@ def cart_view(request):
 # =====================
 @login_required
 def order_history(request):
-    customer = get_or_create_customer(request.user)
+    customer = request.customer
     orders = (
         Order.objects.filter(customer=customer, complete=True)
         .prefetch_related("orderitem_set__product")
@@ -364,25 +351,17 @@ def order_history(request):
 # =====================
 from django.contrib.auth.decorators import login_required
 
-# Helper đảm bảo luôn có Customer
-def get_or_create_customer(user):
-    if not hasattr(user, "customer"):
-        customer, _ = Customer.objects.get_or_create(
-            user=user,
-            defaults={
-                "name": user.username,
-                "email": user.email,
-            },
-        )
-        return customer
-    return user.customer
-
-
 from django.http import JsonResponse
 from django.views.decorators.http import require_POST
 from django.db import transaction
 from django.shortcuts import get_object_or_404
 
+def _cart_totals(order):
+    """Tổng số lượng + tổng tiền giỏ hàng trong 1 query (trước đây 2 lượt + 1 query / sản phẩm)."""
+    items = list(order.orderitem_set.select_related("product"))
+    return sum(i.quantity for i in items), sum(i.thanh_tien for i in items)
+
+
 @require_POST
 def update_item(request):
     """
@@ -406,8 +385,7 @@ def update_item(request):
         return JsonResponse({"error": "Missing productId or action"}, status=400)
 
     product = get_object_or_404(Product, id=product_id)
-    customer = get_or_create_customer(request.user)
-    order, _ = Order.objects.get_or_create(customer=customer, complete=False)
+    order = Order.objects.open_cart(request.customer)
 
     with transaction.atomic():
         order_item, created = OrderItem.objects.select_for_update().get_or_create(
@@ -420,8 +398,7 @@ def update_item(request):
             order_item.quantity -= 1
         elif action == "delete":
             order_item.delete()
-            total_quantity = sum(i.quantity for i in order.orderitem_set.all())
-            total_price = sum(i.thanh_tien for i in order.orderitem_set.all())
+            total_quantity, total_price = _cart_totals(order)
             return JsonResponse({
                 "status": "deleted",
                 "product_id": product.id,
@@ -436,8 +413,7 @@ def update_item(request):
         else:
             order_item.save()
 
-    total_quantity = sum(i.quantity for i in order.orderitem_set.all())
-    total_price = sum(i.thanh_tien for i in order.orderitem_set.all())
+    total_quantity, total_price = _cart_totals(order)
 
     return JsonResponse({
         "status": "ok",
@@ -455,12 +431,10 @@ def update_item(request):
 # =====================
 @login_required
 def checkout_view(request):
-    customer = get_or_create_customer(request.user)
-    order = Order.objects.filter(customer=customer, complete=False).first()
-    if not order:
-        order = Order.objects.create(customer=customer, complete=False)
+    customer = request.customer
+    order = Order.objects.prefetch_related("orderitem_set__product").open_cart(customer)
 
-    items = order.orderitem_set.select_related("product")
+    items = order.orderitem_set.all()
 
     cart_products = []
     for item in items:
@@ -475,7 +449,7 @@ def checkout_view(request):
             "unit_price": unit_price,
         })
 
-    context = get_base_context(request)
+    context = get_base_context(request, cart=order)
     context.update({
         "cart_products": cart_products,
         "incomplete_items": items,
@@ -532,16 +506,9 @@ def signup_view(request):
     if request.method == "POST":
         form = SignupForm(request.POST)
         if form.is_valid():
-            user = form.save()
-            # Tạo Customer nếu chưa có
-            Customer.objects.get_or_create(
-                user=user,
-                defaults={
-                    "name": user.username,
-                    "email": user.email,
-                    "phone": getattr(user, "phone", None)
-                }
-            )
+            # SignupForm.save() tạo luôn Customer: user + customer cùng 1 transaction
+            with transaction.atomic():
+                user = form.save()
             login(request, user)
             messages.success(request, "🎉 Đăng ký thành công! Chào mừng bạn.")
             return redirect("home")
@@ -596,8 +563,8 @@ def add_comment(request, product_id):
 
     product = get_object_or_404(Product, id=product_id)
 
-    if request.user.is_authenticated and hasattr(request.user, "customer"):
-        customer = request.user.customer
+    if request.user.is_authenticated:
+        customer = request.customer
         # ✅ Dùng fallback nếu Customer chưa có tên
         name = customer.name.strip() if customer.name else request.user.username
     else:
@@ -628,11 +595,14 @@ def tu_van(request):
 # =====================
 from django.contrib.auth.models import User
 
+CHAT_PAGE_SIZE = getattr(settings, "CHAT_PAGE_SIZE", 50)
+CHAT_PAGE_SIZE_MAX = 200
+
 @login_required
 def direct_chat_user(request):
     """User xem & gửi tin nhắn với admin"""
     chat_messages = DirectChatMessage.objects.filter(user=request.user).order_by("created_at")
-    return render(request, "app/direct_chat_user.html", {"messages": chat_messages})
+    return render(request, "app/direct_chat_user.html", {"messages": chat_messages, "page_size": CHAT_PAGE_SIZE})
 
 
 @login_required
@@ -650,6 +620,8 @@ def send_direct_message(request):
     msg = (request.POST.get("message") or "").strip()
 
     img = request.FILES.get("image")
+    if img and not is_valid_image(img):
+        return JsonResponse({"error": "File không phải ảnh hợp lệ"}, status=400)
 
     from django.contrib.auth import get_user_model
     User = get_user_model()
@@ -661,47 +633,55 @@ def send_direct_message(request):
             return JsonResponse({"error": "Thiếu user_id"}, status=400)
         target_user = get_object_or_404(User, id=user_id)
 
+        chat = None
         if msg or img:
-            DirectChatMessage.objects.create(
-                user=target_user,
-                sender="admin",
-                message=msg or "",
-                image=img if img else None
-            )
+            chat = create_direct_message(target_user, "admin", msg, img)
+        if request.headers.get("x-requested-with") == "XMLHttpRequest":
+            # trang chat admin gửi bằng fetch, không reload cả trang
+            return JsonResponse({"success": True, "message": direct_message_data(chat) if chat else None})
         return redirect(f"/admin/app/directchatmessage/{target_user.id}/")
 
     else:
         # 👤 User gửi → chỉ cần gắn user hiện tại
+        # ảnh được upload + tạo thumbnail ở Celery, trả về ngay không chờ upload
+        chat = None
         if msg or img:
-            DirectChatMessage.objects.create(
-                user=request.user,
-                sender="user",
-                message=msg or "",
-                image=img if img else None
-            )
-        return JsonResponse({"success": True})
+            chat = create_direct_message(request.user, "user", msg, img)
+        return JsonResponse({
+            "success": True,
+            "id": chat.id if chat else None,
+            "image_pending": bool(chat and chat.image_pending),
+        })
 
 
     
 @login_required
 def get_direct_messages(request, user_id=None):
-    """API lấy tin nhắn"""
+    """
+    API lấy tin nhắn (phân trang theo cursor, mới nhất trước khi cắt):
+    - ?limit=N       : số tin nhắn tối đa (mặc định CHAT_PAGE_SIZE)
+    - ?before=<id>   : chỉ lấy tin nhắn cũ hơn id này ("tải tin nhắn cũ hơn")
+    Kết quả vẫn sắp xếp cũ → mới để frontend append trực tiếp.
+    """
     if request.user.is_staff:
         if not user_id:
             return JsonResponse([], safe=False)
         target_user = get_object_or_404(User, id=user_id)
-        messages = DirectChatMessage.objects.filter(user=target_user).order_by("created_at")
+        messages = DirectChatMessage.objects.filter(user=target_user)
     else:
-        messages = DirectChatMessage.objects.filter(user=request.user).order_by("created_at")
-
-    data = []
-    for m in messages:
-        data.append({
-            "sender": m.sender,
-            "message": m.message or "",
-            "image": m.image.url if m.image else None,  # ✅ gửi url ảnh về frontend
-            "created_at": m.created_at.isoformat(),    # gửi chuẩn ISO -> JS parse được
-        })
+        messages = DirectChatMessage.objects.filter(user=request.user)
+
+    try:
+        limit = int(request.GET.get("limit") or CHAT_PAGE_SIZE)
+    except (TypeError, ValueError):
+        limit = CHAT_PAGE_SIZE
+    limit = max(1, min(limit, CHAT_PAGE_SIZE_MAX))
+    before = request.GET.get("before")
+    if before and before.isdigit():
+        messages = messages.filter(id__lt=int(before))
+
+    page = list(messages.order_by("-id")[:limit])
+    data = [direct_message_data(m) for m in reversed(page)]
     return JsonResponse(data, safe=False)
 # =====================
 # Danh sách video
@@ -737,16 +717,13 @@ def process_order(request):
         country = request.POST.get("country")
         payment = request.POST.get("payment", "COD")
 
-        # ✅ Đảm bảo user luôn có Customer
-        customer = get_or_create_customer(request.user)
+        customer = request.customer
 
-        # Lấy order chưa hoàn thành
-        order = Order.objects.filter(customer=customer, complete=False).first()
-        if not order:
-            order = Order.objects.create(customer=customer, complete=False)
+        # Lấy order chưa hoàn thành (không có thì thôi, khỏi tạo giỏ rỗng)
+        order = Order.objects.open_cart(customer, create=False)
 
         # Nếu giỏ hàng trống thì quay lại cart
-        if not order.orderitem_set.exists():
+        if order is None or not order.orderitem_set.exists():
             return redirect("cart")
 
         # Tạo địa chỉ giao hàng
@@ -770,9 +747,7 @@ def process_order(request):
 
 @login_required
 def order_success(request, order_id):
-    # ✅ dùng get_or_create_customer thay vì request.user.customer
-    customer = get_or_create_customer(request.user)
-    order = get_object_or_404(Order, id=order_id, customer=customer)
+    order = get_object_or_404(Order, id=order_id, customer=request.customer)
     return render(request, "app/order_success.html", {"order": order})
 
 
@@ -795,7 +770,7 @@ def contact_view(request):
 
 @login_required
 def order_detail(request, order_id):
-    order = get_object_or_404(Order, id=order_id, customer__user=request.user)
+    order = get_object_or_404(Order, id=order_id, customer=request.customer)
     return render(request, "app/order_detail.html", {"order": order})
 
 from django.contrib.auth.decorators import login_required
@@ -805,7 +780,7 @@ from django.contrib import messages
 @login_required
 def delete_order(request, order_id):
     """Xóa đơn hàng đã hoàn tất (chỉ của user hiện tại)"""
-    order = get_object_or_404(Order, id=order_id, customer=request.user.customer)
+    order = get_object_or_404(Order, id=order_id, customer=request.customer)
 
     if request.method == "POST":
         if order.complete:  # chỉ cho xoá đơn đã hoàn tất
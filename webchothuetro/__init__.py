@@ -0,0 +1,4 @@
+# nạp Celery app khi Django khởi động để @shared_task dùng đúng cấu hình
+from .celery import app as celery_app
+
+__all__ = ("celery_app",)
@@ -8,21 +8,21 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
 
 import os
-import django
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "webchothuetro.settings")
+# khởi tạo Django trước khi import consumer/model
+django_asgi_app = get_asgi_application()
+
 from channels.routing import ProtocolTypeRouter, URLRouter
 from channels.auth import AuthMiddlewareStack
-from django.core.asgi import get_asgi_application
 import app.routing
 
-os.environ.setdefault("DJANGO_SETTINGS_MODULE", "yourproject.settings")
-django.setup()
-
 application = ProtocolTypeRouter({
-    "http": get_asgi_application(),
+    "http": django_asgi_app,
     "websocket": AuthMiddlewareStack(
         URLRouter(
             app.routing.websocket_urlpatterns
         )
     ),
 })
-
@@ -0,0 +1,11 @@
+# webchothuetro/celery.py
+import os
+
+from celery import Celery
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "webchothuetro.settings")
+
+app = Celery("webchothuetro")
+# đọc các biến CELERY_* trong settings.py
+app.config_from_object("django.conf:settings", namespace="CELERY")
+app.autodiscover_tasks()
@@ -97,20 +97,62 @@ CELERY_TIMEZONE = "Asia/Ho_Chi_Minh"
 # --- Cấu hình Celery kết nối Redis ---
 CELERY_BROKER_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
 CELERY_RESULT_BACKEND = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+# Chạy task ngay trong process (dev không có Redis / test)
+CELERY_TASK_ALWAYS_EAGER = os.getenv("CELERY_TASK_ALWAYS_EAGER", "False").lower() in ("1", "true", "yes")
+# Celery beat (chạy: celery -A webchothuetro beat)
+CELERY_BEAT_SCHEDULE = {
+    # bảng tổng hợp doanh thu cho dashboard admin: tính lại 2 ngày gần nhất mỗi 15 phút
+    "rollup-sales-daily": {
+        "task": "app.tasks.rollup_sales_daily",
+        "schedule": 15 * 60,
+    },
+    # lưới an toàn cho thay đổi ngoài cửa sổ 2 ngày mà không qua signal (sửa dòng đơn cũ trong admin...)
+    "rollup-sales-daily-full": {
+        "task": "app.tasks.rollup_sales_daily",
+        "schedule": 24 * 60 * 60,
+        "kwargs": {"full": True},
+    },
+}
+SALES_ROLLUP_DAYS = 2
 # remove None entries if cloudinary not configured
 INSTALLED_APPS = [a for a in INSTALLED_APPS if a]
 
+# nạp user kèm customer trong 1 query (xem app/accounts.py)
+AUTHENTICATION_BACKENDS = ["app.accounts.CustomerBackend"]
+
 MIDDLEWARE = [
+    # chỉ hoạt động khi PROFILING_ENABLED = True (xem app/profiling.py)
+    "app.profiling.ProfilingMiddleware",
+    # metrics Prometheus theo view (xem app/metrics.py, endpoint /metrics)
+    "app.metrics.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    # request.customer (xem app/accounts.py)
+    "app.accounts.CustomerMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
+# Đo thời gian request theo view: SQL / template / cache, xem ở /debug/profiling/ (staff)
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "False").lower() in ("1", "true", "yes")
+# tỉ lệ request chạy dưới cProfile (0.01 = 1%), file .prof ghi vào PROFILING_DIR
+PROFILING_SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE", "0"))
+PROFILING_DIR = os.getenv("PROFILING_DIR", os.path.join(BASE_DIR, "profiles"))
+
+# ảnh chat chờ Celery xử lý: thư mục local, web và worker phải cùng đọc được (chạy cùng máy / chung volume)
+CHAT_UPLOAD_STAGING_DIR = os.getenv("CHAT_UPLOAD_STAGING_DIR", os.path.join(BASE_DIR, "media_staging"))
+
+# /metrics: Prometheus gửi "Authorization: Bearer <METRICS_TOKEN>" (không đặt token -> chỉ staff / DEBUG)
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+# celery worker mở HTTP /metrics riêng từ port này (mỗi process con 1 port), để trống -> không mở
+METRICS_WORKER_PORT = os.getenv("METRICS_WORKER_PORT", "")
+# địa chỉ bind của HTTP /metrics trên worker: mặc định chỉ localhost, "0.0.0.0" khi Prometheus scrape từ máy khác
+METRICS_WORKER_ADDR = os.getenv("METRICS_WORKER_ADDR", "127.0.0.1")
+
 ROOT_URLCONF = "webchothuetro.urls"
 
 TEMPLATES = [